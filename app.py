@@ -1,27 +1,68 @@
 import os
-from flask import Flask, jsonify
-from flask_jwt_extended import JWTManager
+import logging
+from flask import Flask, jsonify, request, g
+from flask_jwt_extended import JWTManager, jwt_required
 from datetime import timedelta
 from flasgger import Swagger
 from dotenv import load_dotenv
 
+# Carregando variáveis de ambiente do arquivo .env (antes das rotas e
+# serviços, que leem a configuração ao serem importados)
+load_dotenv()
+
 # Importando rotas
 from routes.users import user_route
 from routes.projects import projects_route
 from routes.lists import list_route
 from routes.tasks import tasks_route
 from routes.comments import comments_route
+from routes.batch import batch_route
+from routes.jobs import jobs_route
+from routes.archive import archive_route
+from services.http_cache import response_cache
+from services.idempotency import idempotency_store
+from services.csv_service import (
+    begin_snapshot, end_snapshot, single_flight_stats, migrate_row_versions, migrate_to_shards, publish_shared_tables, shared_tables_stats,
+    SOFT_DELETE, SHARDED_STORAGE, CSV_READ_MODE
+)
+from services.write_queue import write_queue
+from services.generations import generations
+from services.warmup import WARMUP_ON_START, start_warmup, warmup_status
+from services.purger import start_purger, purger_status, note_activity
+from services.jobs import job_queue
 
 app = Flask(__name__)
 jwt = JWTManager(app)
 
-# Carregando variáveis de ambiente do arquivo .env
-load_dotenv()
-
 app.json.sort_keys = False
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(days=1)
 
+logging.basicConfig(level=logging.INFO)
+
+# Acrescenta a coluna de versão às tabelas gravadas antes dela (só na primeira vez)
+migrate_row_versions()
+
+# Move tarefas e comentários para os shards por projeto (só na primeira vez)
+if SHARDED_STORAGE:
+    migrate_to_shards()
+
+# Publica as tabelas em memória compartilhada uma vez, antes dos workers
+# (com gunicorn --preload isso roda no processo mestre)
+if CSV_READ_MODE == "shared":
+    publish_shared_tables()
+
+# Carrega e indexa as tabelas em segundo plano (ver /ready)
+if WARMUP_ON_START:
+    start_warmup()
+
+# Sobe os workers de jobs e retoma os jobs interrompidos
+job_queue.start()
+
+# Remove em segundo plano os dados marcados como excluídos (soft delete)
+if SOFT_DELETE:
+    start_purger()
+
 # Rota raiz para verificar se a API está funcionando
 @app.route("/")
 def api_status():
@@ -38,12 +79,86 @@ def api_status():
     
     return jsonify({"message": "Api funcionando."})
 
+# Rota de prontidão: 503 até o warm-up dos caches terminar (sem warm-up, 200)
+@app.route("/ready")
+def readiness():
+    """
+    Indica se o worker já carregou as tabelas e pode receber tráfego.
+    ---
+    tags:
+        - Root
+    operationId: "readiness"
+    responses:
+        200:
+            description: Warm-up concluído (ou desligado com WARMUP_ON_START=False)
+        503:
+            description: Warm-up em andamento (ou com erro)
+    """
+
+    status = warmup_status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+# Métricas dos caches internos
+# Métricas internas (caches, filas, jobs, caminhos): desligadas por padrão e,
+# quando ligadas, só para usuários autenticados
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False") == "True"
+
+@app.route("/metrics")
+@jwt_required()
+def metrics():
+    """
+    Métricas dos caches internos da API (com METRICS_ENABLED=True).
+    ---
+    tags:
+        - Root
+    operationId: "metrics"
+    security:
+        - Bearer: []
+    responses:
+        200:
+            description: Métricas de uso dos caches
+        401:
+            description: Token ausente ou inválido
+        404:
+            description: Métricas desligadas (METRICS_ENABLED=False)
+    """
+
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Métricas desligadas"}), 404
+
+    return jsonify({
+        "response_cache": response_cache.stats(),
+        "idempotency": idempotency_store.stats(),
+        "single_flight": single_flight_stats(),
+        "write_queue": write_queue.stats(),
+        "purger": purger_status(),
+        "jobs": job_queue.stats(),
+        "invalidation": generations.stats(),
+        "shared_tables": shared_tables_stats(),
+    })
+
 # Registrando blueprints
 app.register_blueprint(user_route)
 app.register_blueprint(projects_route, url_prefix='/user/projects')
 app.register_blueprint(list_route, url_prefix='/user/projects/<project_id>/lists')
 app.register_blueprint(tasks_route, url_prefix='/user/projects/<project_id>/lists/<list_id>/tasks')
 app.register_blueprint(comments_route, url_prefix='/user/projects/<project_id>/lists/<list_id>/tasks/<task_id>/comments')
+app.register_blueprint(batch_route, url_prefix='/batch')
+app.register_blueprint(jobs_route, url_prefix='/jobs')
+app.register_blueprint(archive_route, url_prefix='/user/projects/<project_id>/archive')
+
+# Snapshot de leitura por requisição: cada CSV é lido no máximo uma vez por
+# requisição (as sub-requisições de um /batch compartilham o mesmo snapshot)
+@app.before_request
+def open_storage_snapshot():
+    note_activity()
+    if not request.environ.get("batch.subrequest"):
+        g.storage_snapshot = begin_snapshot()
+
+@app.teardown_request
+def close_storage_snapshot(error=None):
+    if not request.environ.get("batch.subrequest") and "storage_snapshot" in g:
+        end_snapshot(g.pop("storage_snapshot"))
 
 # Tratamento de token expirado
 @jwt.expired_token_loader
@@ -84,4 +199,4 @@ swagger = Swagger(app, template=swagger_template)
 # Executa a aplicação
 if __name__ == '__main__':
     debug = os.getenv("FLASK_DEBUG", "False") == "True"
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True, port=int(os.getenv("PORT", 5000)))
\ No newline at end of file
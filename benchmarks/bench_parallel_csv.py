@@ -0,0 +1,68 @@
+# Benchmark do parse paralelo de CSV (services.csv_service.parse_csv_parallel)
+#
+# Gera um comments.csv sintetico (com quebras de linha e aspas dentro do
+# conteudo) e compara o parse sequencial com o paralelo para 1..N processos.
+#
+# uso: python benchmarks/bench_parallel_csv.py [linhas] [max_processos]
+
+import os
+import sys
+import csv
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.csv_service import COMMENTS_FIELDNAMES, parse_csv_parallel
+
+
+def generate(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(COMMENTS_FIELDNAMES)
+        for i in range(1, rows + 1):
+            content = f'Comentario {i}\nsegunda linha com "aspas", virgula e texto extra para o tamanho'
+            writer.writerow([i, i % 5000, content, "2025-11-25 20:25:57", 1])
+
+
+def sequential(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def measure(fn, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "comments.csv")
+        generate(path, rows)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"{rows} linhas, {size_mb:.1f} MB, {os.cpu_count()} CPUs")
+
+        base, expected = measure(lambda: sequential(path))
+        print(f"sequencial (csv.DictReader): {base:.3f}s")
+
+        workers = 1
+        while workers <= max_workers:
+            # a primeira chamada sobe o pool; so as seguintes sao medidas
+            parse_csv_parallel(path, workers=workers)
+            elapsed, result = measure(lambda: parse_csv_parallel(path, workers=workers))
+            status = "ok" if result == expected else "DIFERENTE"
+            print(f"paralelo com {workers} processo(s): {elapsed:.3f}s ({base / elapsed:.2f}x) {status}")
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
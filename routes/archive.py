@@ -0,0 +1,258 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.csv_service import (
+    find_user_by_id, find_project_by_id, find_list_by_id, find_task_by_id,
+    find_archived_tasks, find_archived_task, find_archived_comments, restore_archived_task
+)
+from services.jobs import job_queue
+
+archive_route = Blueprint('archive', __name__)
+
+
+def _check_project(project_id):
+    # mesmas verificações das outras rotas do projeto; devolve a resposta de erro ou None
+    current_user_id = get_jwt_identity()
+    if not find_user_by_id(current_user_id):
+        return jsonify({"error": "Usuário não encontrado. Por favor, efetuar o login novamente"}), 401
+
+    project = find_project_by_id(project_id)
+    if not project:
+        return jsonify({"error": "Projeto não encontrado"}), 404
+
+    if current_user_id != project.get('user_id'):
+        return jsonify({"error": "Você não tem permissão para acessar este projeto"}), 403
+
+    return None
+
+
+# ARQUIVAR AS TASKS CONCLUÍDAS ANTIGAS DO PROJETO (EM SEGUNDO PLANO)
+
+@archive_route.route('/', methods=['POST'])
+@jwt_required()
+def archive_project_tasks(project_id):
+    """
+    Move para o arquivo morto as tasks concluídas antigas do projeto (e seus comentários)
+    ---
+    tags:
+      - Archive
+    operationId: "archive_project_tasks"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            older_than_days:
+              type: integer
+              description: Idade mínima (pela data de criação) das tasks concluídas. Padrão ARCHIVE_AFTER_DAYS.
+    responses:
+      202:
+        description: Arquivamento agendado como job (acompanhe em /jobs/{job_id})
+        examples:
+          application/json:
+            message: "Arquivamento agendado"
+            data:
+              job_id: "3f2c0e5a9b7d4e1f8a6c2b0d9e7f5a3c"
+              kind: "archive_tasks"
+              status: "queued"
+      400:
+        description: Idade inválida
+        examples:
+          application/json:
+            error: "older_than_days deve ser um número inteiro maior ou igual a zero"
+      403:
+        description: Sem permissão
+      404:
+        description: Projeto não encontrado
+    """
+    error = _check_project(project_id)
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    older_than_days = data.get("older_than_days")
+    if older_than_days is not None and (not isinstance(older_than_days, int) or isinstance(older_than_days, bool) or older_than_days < 0):
+        return jsonify({"error": "older_than_days deve ser um número inteiro maior ou igual a zero"}), 400
+
+    job = job_queue.submit("archive_tasks", {"project_id": str(project_id), "older_than_days": older_than_days}, user_id=get_jwt_identity())
+    response = jsonify({"message": "Arquivamento agendado", "data": job})
+    response.headers["Location"] = f"/jobs/{job['job_id']}"
+    return response, 202
+
+
+# VER AS TASKS ARQUIVADAS DO PROJETO
+
+@archive_route.route('/tasks', methods=['GET'])
+@jwt_required()
+def get_archived_tasks(project_id):
+    """
+    Lista as tasks arquivadas do projeto
+    ---
+    tags:
+      - Archive
+    operationId: "get_archived_tasks"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: query
+        name: list_id
+        required: false
+        type: string
+        description: Filtra pelas tasks de uma lista
+    responses:
+      200:
+        description: Tasks arquivadas
+        examples:
+          application/json:
+            message: "Tasks arquivadas recuperadas com sucesso"
+            data:
+              - task_id: "3"
+                title: "Task A"
+                description: "..."
+                completed: "True"
+                created_at: "2025-01-10 12:00:00"
+                list_id: "1"
+      403:
+        description: Sem permissão
+      404:
+        description: Projeto não encontrado
+    """
+    error = _check_project(project_id)
+    if error:
+        return error
+
+    tasks = find_archived_tasks(project_id, request.args.get("list_id"))
+    return jsonify({"message": "Tasks arquivadas recuperadas com sucesso", "data": tasks}), 200
+
+
+# VER UMA TASK ARQUIVADA E SEUS COMENTÁRIOS
+
+@archive_route.route('/tasks/<task_id>', methods=['GET'])
+@jwt_required()
+def get_archived_task(project_id, task_id):
+    """
+    Mostra uma task arquivada com seus comentários
+    ---
+    tags:
+      - Archive
+    operationId: "get_archived_task"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: path
+        name: task_id
+        required: true
+        type: string
+    responses:
+      200:
+        description: Task arquivada
+        examples:
+          application/json:
+            message: "Task arquivada recuperada com sucesso"
+            data:
+              task_id: "3"
+              title: "Task A"
+              completed: "True"
+              list_id: "1"
+              comments:
+                - comment_id: "7"
+                  task_id: "3"
+                  content: "Feito!"
+                  created_at: "2025-01-11 09:00:00"
+      404:
+        description: Task não encontrada no arquivo morto
+        examples:
+          application/json:
+            error: "Task arquivada não encontrada"
+    """
+    error = _check_project(project_id)
+    if error:
+        return error
+
+    task = find_archived_task(project_id, task_id)
+    if not task:
+        return jsonify({"error": "Task arquivada não encontrada"}), 404
+
+    task["comments"] = find_archived_comments(project_id, task_id)
+    return jsonify({"message": "Task arquivada recuperada com sucesso", "data": task}), 200
+
+
+# RESTAURAR UMA TASK ARQUIVADA
+
+@archive_route.route('/tasks/<task_id>/restore', methods=['POST'])
+@jwt_required()
+def restore_task(project_id, task_id):
+    """
+    Devolve uma task arquivada (e seus comentários) para a lista de origem
+    ---
+    tags:
+      - Archive
+    operationId: "restore_task"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: path
+        name: task_id
+        required: true
+        type: string
+    responses:
+      200:
+        description: Task restaurada
+        examples:
+          application/json:
+            message: "Task restaurada com sucesso"
+            data:
+              task_id: "3"
+              title: "Task A"
+              completed: "True"
+              list_id: "1"
+      404:
+        description: Task não encontrada no arquivo morto
+        examples:
+          application/json:
+            error: "Task arquivada não encontrada"
+      409:
+        description: A lista de origem não existe mais (ou a task já está ativa)
+        examples:
+          application/json:
+            error: "A lista de origem da task não existe mais"
+    """
+    error = _check_project(project_id)
+    if error:
+        return error
+
+    task = find_archived_task(project_id, task_id)
+    if not task:
+        return jsonify({"error": "Task arquivada não encontrada"}), 404
+
+    lista = find_list_by_id(task.get("list_id"))
+    if not lista or str(lista.get("project_id")) != str(project_id):
+        return jsonify({"error": "A lista de origem da task não existe mais"}), 409
+
+    if find_task_by_id(task_id):
+        return jsonify({"error": "Já existe uma task ativa com este id"}), 409
+
+    task = restore_archived_task(project_id, task_id)
+    if not task:
+        return jsonify({"error": "Task arquivada não encontrada"}), 404
+
+    return jsonify({"message": "Task restaurada com sucesso", "data": task}), 200
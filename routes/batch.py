@@ -0,0 +1,196 @@
+import os
+from flask import Blueprint, jsonify, request, current_app
+from flask_jwt_extended import jwt_required
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from services.csv_service import transaction
+
+batch_route = Blueprint('batch', __name__)
+
+# limite de sub-requisições por lote
+BATCH_MAX_REQUESTS = 100
+
+# limite do modo atomic, menor: o lote inteiro roda dentro de uma transação,
+# que segura a trava de escrita do processo (nenhuma outra escrita deste
+# worker anda) e as travas das tabelas que tocar (as escritas dos outros
+# workers nelas esperam) até a última operação terminar
+BATCH_ATOMIC_MAX_REQUESTS = int(os.getenv("BATCH_ATOMIC_MAX_REQUESTS", 20))
+
+# blueprints que podem ser chamados dentro de um lote
+BATCH_BLUEPRINTS = ("users", "projects", "lists", "tasks", "comments")
+
+# rotas que não fazem sentido (ou não seriam seguras) dentro de um lote:
+# cadastro/login não usam o access token, refresh exige o refresh token
+# e o stream de eventos nunca termina
+BATCH_BLOCKED_ENDPOINTS = ("users.create_user", "users.user_login", "users.refresh_token", "projects.project_events")
+
+# rotas que enfileiram jobs, barradas no modo atomic: o job roda fora da
+# transação (um rollback não o desfaria) e esperaria pela trava de escrita
+# que ela segura. O valor diz, pelos parâmetros, quando a rota enfileira.
+BATCH_ATOMIC_BLOCKED_ENDPOINTS = {
+    "users.delete_user": lambda args: args.get("async", "").lower() == "true",
+    "archive.archive_project_tasks": lambda args: True,
+}
+
+
+def _response_body(response):
+    if response.is_json:
+        return response.get_json()
+    data = response.get_data(as_text=True)
+    return data or None
+
+
+def dispatch_subrequest(item, atomic=False):
+    method = str(item.get("method", "GET")).upper()
+    path = item.get("path", "")
+    body = item.get("body")
+    headers = item.get("headers") or {}
+
+    builder = EnvironBuilder(
+        path=path,
+        method=method,
+        json=body,
+        headers=headers,
+        environ_overrides={"batch.subrequest": True},
+    )
+
+    # o contexto da aplicação (e o `g` com o JWT já verificado) é o mesmo
+    # da requisição /batch, só a requisição muda
+    ctx = current_app.request_context(builder.get_environ())
+    ctx.push()
+    try:
+        if request.routing_exception is not None:
+            raise request.routing_exception
+
+        endpoint = request.url_rule.endpoint
+        if request.blueprint not in BATCH_BLUEPRINTS or endpoint in BATCH_BLOCKED_ENDPOINTS:
+            response = jsonify({"error": "Rota não permitida em lote"})
+            response.status_code = 400
+            return response
+
+        enqueues_job = BATCH_ATOMIC_BLOCKED_ENDPOINTS.get(endpoint)
+        if atomic and enqueues_job and enqueues_job(request.args):
+            response = jsonify({"error": "Rota não permitida em lote atomic (ela agenda um job)"})
+            response.status_code = 400
+            return response
+
+        # pula apenas o @jwt_required da rota: o token já foi verificado
+        # uma vez na requisição /batch
+        view = current_app.view_functions[endpoint]
+        view = getattr(view, "__wrapped__", view)
+
+        return current_app.make_response(view(**request.view_args))
+    except HTTPException as error:
+        response = jsonify({"error": error.description})
+        response.status_code = error.code
+        return response
+    finally:
+        ctx.pop()
+
+
+@batch_route.route('/', methods=['POST'])
+@jwt_required()
+def batch():
+    """
+    Executa várias operações da API em uma única requisição.
+    ---
+    tags:
+      - Batch
+    operationId: "batch"
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        description: As operações são executadas em ordem, com o mesmo token. Com atomic=true, a primeira falha (status >= 400) desfaz todas as escritas do lote; o lote atomic tem no máximo BATCH_ATOMIC_MAX_REQUESTS operações (as outras escritas esperam por ele) e não aceita rotas que agendam jobs (DELETE /user?async=true, arquivamento).
+        schema:
+          type: object
+          properties:
+            atomic:
+              type: boolean
+              example: false
+            requests:
+              type: array
+              items:
+                type: object
+                properties:
+                  method:
+                    type: string
+                    example: POST
+                  path:
+                    type: string
+                    example: /user/projects/1/lists/1/tasks/
+                  body:
+                    type: object
+                  headers:
+                    type: object
+    responses:
+      200:
+        description: Resultado de cada operação, na mesma ordem do envio
+        examples:
+          application/json:
+            message: "Lote executado"
+            data:
+              atomic: false
+              committed: true
+              responses:
+                - status: 201
+                  body:
+                    message: "Task criada com sucesso!"
+                - status: 404
+                  body:
+                    error: "Lista não encontrada no projeto"
+      400:
+        description: Lote inválido ou, no modo atomic, uma operação falhou e nada foi gravado
+        examples:
+          application/json:
+            error: "Envie uma lista de requisições"
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("requests")
+    atomic = bool(data.get("atomic", False))
+
+    if not isinstance(items, list) or not items:
+      return jsonify({"error": "Envie uma lista de requisições"}), 400
+
+    max_requests = BATCH_ATOMIC_MAX_REQUESTS if atomic else BATCH_MAX_REQUESTS
+    if len(items) > max_requests:
+      return jsonify({"error": f"Envie no máximo {max_requests} requisições por lote"}), 400
+
+    for item in items:
+        if not isinstance(item, dict) or not str(item.get("path", "")).startswith("/"):
+          return jsonify({"error": "Cada requisição precisa de um path absoluto (ex: /user/projects/)"}), 400
+
+    responses = []
+
+    if not atomic:
+        for item in items:
+            response = dispatch_subrequest(item)
+            responses.append({"status": response.status_code, "body": _response_body(response)})
+
+        return jsonify({
+            "message": "Lote executado",
+            "data": {"atomic": False, "committed": True, "responses": responses}
+        }), 200
+
+    failed_index = None
+    with transaction() as tx:
+        for index, item in enumerate(items):
+            response = dispatch_subrequest(item, atomic=True)
+            responses.append({"status": response.status_code, "body": _response_body(response)})
+            if response.status_code >= 400:
+                tx["rollback"] = True
+                failed_index = index
+                break
+
+    if failed_index is not None:
+        return jsonify({
+            "error": f"A requisição {failed_index} falhou; nenhuma alteração do lote foi gravada",
+            "data": {"atomic": True, "committed": False, "failed_index": failed_index, "responses": responses}
+        }), 400
+
+    return jsonify({
+        "message": "Lote executado",
+        "data": {"atomic": True, "committed": True, "responses": responses}
+    }), 200
@@ -6,13 +6,17 @@ from services.csv_service import (
     find_list_by_id,
     find_task_by_id,
     find_comments_by_task_id,
-    get_next_comment_id,
     save_comment,
+    save_comments,
     update_comment_data,
     delete_comment_data,
     find_comment_by_id,
-    find_user_by_id
+    find_user_by_id,
+    StaleVersionError,
+    BULK_MAX_ITEMS
 )
+from services.http_cache import conditional_get, if_match_versions, version_headers
+from services.idempotency import idempotent
 
 comments_route = Blueprint("comments", __name__)
 
@@ -22,6 +26,7 @@ comments_route = Blueprint("comments", __name__)
 # ============================================================
 @comments_route.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_comment(project_id, list_id, task_id):
     """
     Criar um novo comentario
@@ -32,6 +37,11 @@ def create_comment(project_id, list_id, task_id):
     security:
       - Bearer: []
     parameters:
+      - in: header
+        name: Idempotency-Key
+        required: false
+        type: string
+        description: Chave única da operação. Repetições com a mesma chave devolvem a primeira resposta sem criar duplicatas.
       - in: path
         name: project_id
         required: true
@@ -107,10 +117,8 @@ def create_comment(project_id, list_id, task_id):
     if not content:
       return jsonify({"error": "O conteudo é obrigatório"}), 400
 
-    new_comment_id = get_next_comment_id()
-
     new_comment = {
-        "comment_id": str(new_comment_id),
+        "comment_id": None,  # atribuído por save_comment, junto com a gravação
         "task_id": str(task_id),
         "content": data["content"],
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -121,11 +129,141 @@ def create_comment(project_id, list_id, task_id):
 
 
 
+# ============================================================
+# CREATE COMMENTS (BULK)
+# ============================================================
+@comments_route.route("/bulk", methods=["POST"])
+@jwt_required()
+@idempotent
+def create_comments_bulk(project_id, list_id, task_id):
+    """
+    Criar vários comentarios de uma vez em uma task
+    ---
+    tags:
+      - Comments
+    operationId: "create_comments_bulk"
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Idempotency-Key
+        required: false
+        type: string
+        description: Chave única da operação. Repetições com a mesma chave devolvem a primeira resposta sem criar duplicatas.
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: path
+        name: list_id
+        required: true
+        type: string
+      - in: path
+        name: task_id
+        required: true
+        type: string
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            comments:
+              type: array
+              items:
+                type: object
+                properties:
+                  content:
+                    type: string
+    responses:
+      201:
+        description: comentarios criados (itens inválidos são reportados em errors)
+        examples:
+          application/json:
+            message: "2 comentários criados com sucesso!"
+            data:
+              created:
+                - comment_id: "<id>"
+                  task_id: "<task_id>"
+                  content: "<conteúdo>"
+                  created_at: "2025-11-23 12:00:00"
+              errors:
+                - index: 2
+                  error: "O conteudo é obrigatório"
+      400:
+        description: sem conteudo
+        examples:
+          application/json:
+            error: "Envie uma lista de comentários"
+      404:
+        description: projeto,lista ou task não encontrada
+        examples:
+          application/json:
+            error: "Projeto não encontrado"
+      403:
+        description: sem permissão
+        examples:
+          application/json:
+            error: "Você não tem permissão para acessar esse projeto"
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    items = data.get("comments")
+
+    if not isinstance(items, list) or not items:
+      return jsonify({"error": "Envie uma lista de comentários"}), 400
+
+    if len(items) > BULK_MAX_ITEMS:
+      return jsonify({"error": f"Envie no máximo {BULK_MAX_ITEMS} comentários por requisição"}), 400
+
+    # valida projeto, lista e task uma única vez para o lote inteiro
+    project = find_project_by_id(project_id)
+    if not project:
+      return jsonify({"error": "Projeto não encontrado"}), 404
+
+    if str(project["user_id"]) != str(current_user_id):
+      return jsonify({"error": "voce nao tem permissao para acessar esse projeto"}), 403
+
+    lista = find_list_by_id(list_id)
+    if not lista or str(lista["project_id"]) != str(project_id):
+      return jsonify({"error": "Lista não encontrada no projeto"}), 404
+
+    task = find_task_by_id(task_id)
+    if not task or str(task["list_id"]) != str(list_id):
+      return jsonify({"error": "Task não encontrada na lista"}), 404
+
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    new_comments = []
+    errors = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("content"):
+            errors.append({"index": index, "error": "O conteudo é obrigatório"})
+            continue
+
+        new_comments.append({
+            "comment_id": None,  # atribuídos por save_comments, em sequência
+            "task_id": str(task_id),
+            "content": item["content"],
+            "created_at": created_at,
+        })
+
+    if not new_comments:
+      return jsonify({"error": "Nenhum comentário válido enviado", "data": {"created": [], "errors": errors}}), 400
+
+    save_comments(new_comments, project_id)
+
+    return jsonify({
+      "message": f"{len(new_comments)} comentários criados com sucesso!",
+      "data": {"created": new_comments, "errors": errors}
+    }), 201
+
+
 # ============================================================
 # LIST COMMENTS
 # ============================================================
 @comments_route.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get("project")
 def list_comments(project_id, list_id, task_id):
     """
     Listar todas os comentarios de uma task
@@ -220,6 +358,7 @@ def list_comments(project_id, list_id, task_id):
 
 @comments_route.route('/<comment_id>', methods=["GET"])
 @jwt_required()
+@conditional_get("project", row="comment")
 def get_specific_comment(project_id, list_id, task_id, comment_id):
     """
     Obter um comentário específico de uma task.
@@ -374,6 +513,11 @@ def update_comment(project_id, list_id, task_id, comment_id):
         name: comment_id
         required: true
         type: string
+      - in: header
+        name: If-Match
+        required: false
+        type: string
+        description: Versão do comentário lida pelo cliente (campo version, ex. "3"). Se o comentário tiver sido alterado depois, a atualização é recusada com 412.
       - in: body
         name: body
         schema:
@@ -383,7 +527,7 @@ def update_comment(project_id, list_id, task_id, comment_id):
               type: string
     responses:
       200:
-        description: comentario atualizado
+        description: comentario atualizado (a nova versão vem no cabeçalho ETag)
         examples:
           application/json:
             message: "Comentário atualizado com sucesso!"
@@ -397,6 +541,12 @@ def update_comment(project_id, list_id, task_id, comment_id):
         examples:
           application/json:
             error: "Comentário não encontrado"
+      412:
+        description: O comentário foi alterado depois da versão informada no If-Match
+        examples:
+          application/json:
+            error: "O comentário foi alterado por outra requisição. Recarregue e tente novamente"
+            version: 4
     """
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -425,11 +575,14 @@ def update_comment(project_id, list_id, task_id, comment_id):
     if not content:
       return jsonify({"error": "O conteudo é obrigatório"}), 400
 
-    updated = update_comment_data(comment_id, data["content"])
+    try:
+      updated = update_comment_data(comment_id, data["content"], expected_version=if_match_versions())
+    except StaleVersionError as error:
+      return jsonify({"error": "O comentário foi alterado por outra requisição. Recarregue e tente novamente", "version": error.current}), 412
     if not updated:
       return jsonify({"error": "Comentário não encontrado"}), 404
 
-    return jsonify({"message": "Comentário atualizado com sucesso!"}), 200
+    return jsonify({"message": "Comentário atualizado com sucesso!"}), 200, version_headers(updated)
 
 
 
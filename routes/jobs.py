@@ -0,0 +1,88 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.jobs import job_queue
+
+jobs_route = Blueprint('jobs', __name__)
+
+
+@jobs_route.route('/', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """
+    Lista os jobs em segundo plano do usuário (mais recentes primeiro).
+    ---
+    tags:
+      - Jobs
+    operationId: "list_jobs"
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Jobs do usuário
+        examples:
+          application/json:
+            message: "Jobs recuperados com sucesso"
+            data:
+              - job_id: "3f2c0e5a9b7d4e1f8a6c2b0d9e7f5a3c"
+                kind: "delete_user"
+                status: "succeeded"
+                attempts: 1
+                progress: 100.0
+                duration_ms: 42
+    """
+    current_user_id = get_jwt_identity()
+    return jsonify({"message": "Jobs recuperados com sucesso", "data": job_queue.list(current_user_id)}), 200
+
+
+@jobs_route.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """
+    Consulta o status de um job em segundo plano.
+    ---
+    tags:
+      - Jobs
+    operationId: "get_job"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: job_id
+        required: true
+        type: string
+        description: ID do job
+    responses:
+      200:
+        description: Status, tentativas, progresso e duração do job
+        examples:
+          application/json:
+            message: "Job recuperado com sucesso"
+            data:
+              job_id: "3f2c0e5a9b7d4e1f8a6c2b0d9e7f5a3c"
+              user_id: "1"
+              kind: "delete_user"
+              params:
+                user_id: "1"
+              status: "running"
+              attempts: 1
+              max_attempts: 3
+              progress: 40.0
+              result: null
+              error: ""
+              created_at: "2025-11-23 12:00:00"
+              started_at: "2025-11-23 12:00:01"
+              finished_at: ""
+              duration_ms: null
+      404:
+        description: Job não encontrado
+        examples:
+          application/json:
+            error: "Job não encontrado"
+    """
+    current_user_id = get_jwt_identity()
+    job = job_queue.get(job_id)
+
+    if not job or job["user_id"] != str(current_user_id):
+        return jsonify({"error": "Job não encontrado"}), 404
+
+    return jsonify({"message": "Job recuperado com sucesso", "data": job}), 200
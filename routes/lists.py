@@ -2,9 +2,12 @@ from flask import Blueprint, request, jsonify
 from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from services.csv_service import (
-    save_list, get_next_list_id, find_project_by_id, 
-    find_lists_by_project_id, find_list_by_id, delete_list_data, update_list_data, find_user_by_id
+    save_list, find_project_by_id, 
+    find_lists_by_project_id, find_list_by_id, delete_list_data, update_list_data, find_user_by_id,
+    StaleVersionError
 )
+from services.http_cache import conditional_get, cached_response, if_match_versions, version_headers
+from services.idempotency import idempotent
 
 list_route = Blueprint('lists', __name__)
 
@@ -14,6 +17,7 @@ list_route = Blueprint('lists', __name__)
 
 @list_route.route('/', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_list(project_id):
     """
     Criar uma nova lista em um projeto
@@ -24,6 +28,11 @@ def create_list(project_id):
     security:
       - Bearer: []
     parameters:
+      - in: header
+        name: Idempotency-Key
+        required: false
+        type: string
+        description: Chave única da operação. Repetições com a mesma chave devolvem a primeira resposta sem criar duplicatas.
       - in: path
         name: project_id
         required: true
@@ -91,7 +100,7 @@ def create_list(project_id):
     
     #Cria a lista
     new_list = {
-        "list_id": get_next_list_id(),
+        "list_id": None,  # atribuído por save_list, junto com a gravação
         "project_id": project_id,
         "list_name": list_name,
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -109,6 +118,7 @@ def create_list(project_id):
 
 @list_route.route('/', methods=['GET'])
 @jwt_required()
+@conditional_get("project")
 def get_project_lists(project_id):
     """
     Listar todas as listas de um projeto
@@ -190,6 +200,8 @@ def get_project_lists(project_id):
 
 @list_route.route('/<list_id>')
 @jwt_required()
+@conditional_get("project", row="list")
+@cached_response("project")
 def get_specific_list(project_id, list_id):
     """
     Obter uma lista específica de um projeto
@@ -397,6 +409,11 @@ def update_list(project_id, list_id):
         name: list_id
         required: true
         type: string
+      - in: header
+        name: If-Match
+        required: false
+        type: string
+        description: Versão da lista lida pelo cliente (campo version, ex. "3"). Se a lista tiver sido alterada depois, a atualização é recusada com 412.
       - in: body
         name: body
         schema:
@@ -406,7 +423,7 @@ def update_list(project_id, list_id):
               type: string
     responses:
       200:
-        description: Lista atualizada
+        description: Lista atualizada (a nova versão vem no cabeçalho ETag)
         examples:
           application/json:
             message: "Lista renomeada para com sucesso!"
@@ -431,6 +448,12 @@ def update_list(project_id, list_id):
         examples:
           application/json:
             error: "Lista não encontrada"
+      412:
+        description: A lista foi alterada depois da versão informada no If-Match
+        examples:
+          application/json:
+            error: "A lista foi alterada por outra requisição. Recarregue e tente novamente"
+            version: 4
     """
     # Pega o novo nome
     data = request.json
@@ -465,7 +488,13 @@ def update_list(project_id, list_id):
     if owner_user_id != current_user_id:
       return jsonify({"error": "Você não tem permissão para editar listas deste projeto"}), 403
 
-    # Atualiza
-    update_list_data(list_id, {'list_name': new_name})
+    # Atualiza (só se a lista ainda estiver na versão do If-Match, quando enviado)
+    try:
+      updated_list = update_list_data(list_id, {'list_name': new_name}, expected_version=if_match_versions())
+    except StaleVersionError as error:
+      return jsonify({"error": "A lista foi alterada por outra requisição. Recarregue e tente novamente", "version": error.current}), 412
+    if not updated_list:
+      return jsonify({"error": "Lista não encontrada"}), 404
+
     return jsonify({"message": f"Lista renomeada com sucesso!",
-                    "data": new_name}), 200
+                    "data": new_name}), 200, version_headers(updated_list)
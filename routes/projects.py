@@ -1,12 +1,16 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from services.csv_service import find_user_by_id, get_next_project_id, save_project, find_projects_by_user_id, find_project_by_id, update_project_data, delete_project_data, find_lists_by_project_id
+from services.csv_service import find_user_by_id, save_project, find_projects_by_user_id, find_project_by_id, update_project_data, delete_project_data, find_lists_by_project_id, find_project_changes_since, get_change_horizon, find_tasks_by_ids, update_tasks_bulk, StaleVersionError, BULK_MAX_ITEMS
+from services.http_cache import conditional_get, cached_response, if_match_versions, version_headers
+from services.idempotency import idempotent
+from services.events import hub, project_event_stream
 from datetime import datetime
 
 projects_route = Blueprint('projects', __name__)
 
 @projects_route.route('/', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_project():
     """
     criacao de um projeto
@@ -17,6 +21,11 @@ def create_project():
     security:
       - Bearer: []
     parameters:
+      - in: header
+        name: Idempotency-Key
+        required: false
+        type: string
+        description: Chave única da operação. Repetições com a mesma chave devolvem a primeira resposta sem criar duplicatas.
       - in: body
         name: body
         required: true
@@ -69,10 +78,8 @@ def create_project():
     if not title:
       return jsonify({"error": "Nome do projeto é obrigatório"}), 400
 
-    new_project_id = get_next_project_id()
-
     new_project = {
-        "project_id": new_project_id,
+        "project_id": None,  # atribuído por save_project, junto com a gravação
         "user_id": current_user_id,
         "project_title": title,
         "project_description": description,
@@ -85,6 +92,7 @@ def create_project():
 
 @projects_route.route("/")
 @jwt_required()
+@conditional_get("user")
 def get_my_projects():
     """
     Listar todos os meus projetos
@@ -132,6 +140,8 @@ def get_my_projects():
 
 @projects_route.route("/<project_id>")
 @jwt_required()
+@conditional_get("user", "project", row="project")
+@cached_response("user", "project")
 def get_specific_project(project_id):
     """
     Obter um projeto específico
@@ -209,6 +219,11 @@ def updated_project(project_id):
         name: project_id
         required: true
         type: string
+      - in: header
+        name: If-Match
+        required: false
+        type: string
+        description: Versão do projeto lida pelo cliente (campo version, ex. "3"). Se o projeto tiver sido alterado depois, a atualização é recusada com 412.
       - in: body
         name: body
         schema:
@@ -220,7 +235,7 @@ def updated_project(project_id):
               type: string
     responses:
       200:
-        description: Projeto atualizado
+        description: Projeto atualizado (a nova versão vem no cabeçalho ETag)
         examples:
           application/json:
             message: "Projeto atualizado com sucesso!"
@@ -263,6 +278,12 @@ def updated_project(project_id):
         examples:
           application/json:
             error: "Projeto não encontrado"
+      412:
+        description: O projeto foi alterado depois da versão informada no If-Match
+        examples:
+          application/json:
+            error: "O projeto foi alterado por outra requisição. Recarregue e tente novamente"
+            version: 4
     """
     current_user_id = get_jwt_identity()
     user = find_user_by_id(current_user_id)
@@ -296,9 +317,14 @@ def updated_project(project_id):
         "project_description": new_description,
     }
 
-    update_project_data(project_id, new_data_to_update)
+    try:
+      updated = update_project_data(project_id, new_data_to_update, expected_version=if_match_versions())
+    except StaleVersionError as error:
+      return jsonify({"error": "O projeto foi alterado por outra requisição. Recarregue e tente novamente", "version": error.current}), 412
+    if not updated:
+      return jsonify({"error": "Projeto não encontrado"}), 404
 
-    return jsonify({"message": "Projeto atualizado com sucesso!", "data": new_data_to_update}), 200
+    return jsonify({"message": "Projeto atualizado com sucesso!", "data": new_data_to_update}), 200, version_headers(updated)
 
 @projects_route.route("/<project_id>", methods=["DELETE"])
 @jwt_required()
@@ -372,4 +398,259 @@ def delete_project(project_id):
 
     return jsonify({"message": "Projeto deletado com sucesso!"}), 200
 
+@projects_route.route("/<project_id>/tasks", methods=["PATCH"])
+@jwt_required()
+def update_project_tasks_bulk(project_id):
+    """
+    Atualizar ou mover várias tasks do projeto de uma vez
+    ---
+    tags:
+      - Projects
+    operationId: "update_project_tasks_bulk"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: body
+        name: body
+        required: true
+        description: Cada item informa o task_id e apenas os campos que deseja alterar. list_id move a task para outra lista do mesmo projeto. version (opcional) é a versão da task lida pelo cliente; se alguma task tiver sido alterada depois, nenhuma é atualizada (412).
+        schema:
+          type: object
+          properties:
+            tasks:
+              type: array
+              items:
+                type: object
+                properties:
+                  task_id:
+                    type: string
+                  title:
+                    type: string
+                  completed:
+                    type: boolean
+                  list_id:
+                    type: string
+                  version:
+                    type: string
+    responses:
+      200:
+        description: Tasks atualizadas (itens inválidos são reportados em errors)
+        examples:
+          application/json:
+            message: "2 tasks atualizadas com sucesso!"
+            data:
+              updated:
+                - task_id: "1"
+                  title: "Task A"
+                  description: ""
+                  completed: true
+                  created_at: "2025-11-23 12:00:00"
+                  list_id: "2"
+              errors:
+                - index: 2
+                  task_id: "99"
+                  error: "Task não encontrada no projeto"
+      400:
+        description: Dados inválidos ou nenhuma alteração válida
+        examples:
+          application/json:
+            error: "Envie uma lista de tasks"
+      401:
+        description: Usuário não encontrado (token inválido/usuário removido)
+        examples:
+          application/json:
+            error: "Usuário não encontrado. Por favor, efetuar o login novamente"
+      403:
+        description: Sem permissão para acessar este projeto
+        examples:
+          application/json:
+            error: "Você não tem permissão para acessar este projeto."
+      404:
+        description: Projeto não encontrado
+        examples:
+          application/json:
+            error: "Projeto não encontrado"
+      412:
+        description: Alguma task foi alterada depois da versão informada (nenhuma é atualizada)
+        examples:
+          application/json:
+            error: "A task 1 foi alterada por outra requisição. Recarregue e tente novamente"
+            task_id: "1"
+            version: 4
+    """
+    current_user_id = get_jwt_identity()
+    user = find_user_by_id(current_user_id)
+
+    if not user:
+      return jsonify({"error": "Usuário não encontrado. Por favor, efetuar o login novamente"}), 401
+
+    data = request.get_json(silent=True) or {}
+    items = data.get("tasks")
+
+    if not isinstance(items, list) or not items:
+      return jsonify({"error": "Envie uma lista de tasks"}), 400
+
+    if len(items) > BULK_MAX_ITEMS:
+      return jsonify({"error": f"Envie no máximo {BULK_MAX_ITEMS} tasks por requisição"}), 400
+
+    # permissão verificada uma única vez para o lote inteiro
+    project = find_project_by_id(project_id)
+    if not project:
+      return jsonify({"error": "Projeto não encontrado"}), 404
+
+    if project.get("user_id") != current_user_id:
+      return jsonify({"error": "Você não tem permissão para acessar este projeto."}), 403
+
+    project_list_ids = {l.get("list_id") for l in find_lists_by_project_id(project_id)}
+    task_ids = [str(item.get("task_id")) for item in items if isinstance(item, dict)]
+    tasks = find_tasks_by_ids(task_ids)
+
+    changes = {}
+    versions = {}
+    errors = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("task_id"):
+            errors.append({"index": index, "error": "task_id é obrigatório"})
+            continue
+
+        task_id = str(item["task_id"])
+        task = tasks.get(task_id)
+
+        if not task or task.get("list_id") not in project_list_ids:
+            errors.append({"index": index, "task_id": task_id, "error": "Task não encontrada no projeto"})
+            continue
+
+        if task_id in changes:
+            errors.append({"index": index, "task_id": task_id, "error": "Task repetida no lote"})
+            continue
+
+        new_data = {}
+
+        if "title" in item:
+            if not item["title"] or not str(item["title"]).strip():
+                errors.append({"index": index, "task_id": task_id, "error": "O novo nome da task é obrigatório"})
+                continue
+            new_data["title"] = item["title"]
+
+        if "description" in item:
+            new_data["description"] = item["description"]
+
+        if "completed" in item:
+            if not isinstance(item["completed"], bool):
+                errors.append({"index": index, "task_id": task_id, "error": "completed deve ser true ou false"})
+                continue
+            new_data["completed"] = item["completed"]
+
+        if "list_id" in item:
+            if str(item["list_id"]) not in project_list_ids:
+                errors.append({"index": index, "task_id": task_id, "error": "Lista de destino não encontrada no projeto"})
+                continue
+            new_data["list_id"] = str(item["list_id"])
+
+        if not new_data:
+            errors.append({"index": index, "task_id": task_id, "error": "Nenhuma alteração informada"})
+            continue
+
+        changes[task_id] = new_data
+        if item.get("version") is not None:
+            versions[task_id] = item["version"]
+
+    if not changes:
+      return jsonify({"error": "Nenhuma alteração válida enviada", "data": {"updated": [], "errors": errors}}), 400
+
+    try:
+      updated_tasks = update_tasks_bulk(changes, project_id, expected_versions=versions)
+    except StaleVersionError as error:
+      return jsonify({
+        "error": f"A task {error.entity_id} foi alterada por outra requisição. Recarregue e tente novamente",
+        "task_id": error.entity_id,
+        "version": error.current
+      }), 412
+
+    return jsonify({
+      "message": f"{len(updated_tasks)} tasks atualizadas com sucesso!",
+      "data": {"updated": updated_tasks, "errors": errors}
+    }), 200
+
+@projects_route.route("/<project_id>/events")
+@jwt_required(locations=["headers", "query_string"])
+def project_events(project_id):
+    """
+    Stream de eventos (Server-Sent Events) com as alterações do quadro
+    ---
+    tags:
+      - Projects
+    operationId: "project_events"
+    security:
+      - Bearer: []
+    produces:
+      - text/event-stream
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: query
+        name: jwt
+        required: false
+        type: string
+        description: Access token, para clientes EventSource que não enviam o header Authorization.
+      - in: header
+        name: Last-Event-ID
+        required: false
+        type: string
+        description: Último evento recebido; as alterações posteriores são reenviadas antes do stream ao vivo.
+    responses:
+      200:
+        description: Stream de eventos (list.*, task.*, comment.*, project.*) com heartbeat periódico. Se o Last-Event-ID for anterior às alterações mantidas pela API, o stream começa com o evento reset (recarregue o quadro).
+      401:
+        description: Usuário não encontrado (token inválido/usuário removido)
+        examples:
+          application/json:
+            error: "Usuário não encontrado. Por favor, efetuar o login novamente"
+      403:
+        description: Sem permissão para acessar este projeto
+        examples:
+          application/json:
+            error: "Você não tem permissão para acessar este projeto."
+      404:
+        description: Projeto não encontrado
+        examples:
+          application/json:
+            error: "Projeto não encontrado"
+    """
+    current_user_id = get_jwt_identity()
+    user = find_user_by_id(current_user_id)
+
+    if not user:
+      return jsonify({"error": "Usuário não encontrado. Por favor, efetuar o login novamente"}), 401
+
+    project = find_project_by_id(project_id)
+    if not project:
+      return jsonify({"error": "Projeto não encontrado"}), 404
+
+    if project.get("user_id") != current_user_id:
+      return jsonify({"error": "Você não tem permissão para acessar este projeto."}), 403
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+      return jsonify({"error": "Last-Event-ID inválido"}), 400
+
+    # inscreve antes do replay para não perder nada entre os dois
+    subscriber = hub.subscribe(project_id)
+    replay = find_project_changes_since(project_id, last_event_id) if last_event_id is not None else []
+    # parte do que o cliente perdeu já saiu do histórico em memória
+    reset = last_event_id is not None and last_event_id < get_change_horizon()
 
+    return Response(
+        project_event_stream(subscriber, replay, reset),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
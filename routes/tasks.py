@@ -4,15 +4,20 @@ from datetime import datetime
 
 from services.csv_service import (
     save_task,
-    get_next_task_id,
+    save_tasks,
     find_task_by_id,
     update_task_data,
     delete_task_data,
+    delete_tasks_data,
     find_tasks_by_list_id,
     find_project_by_id,
     find_list_by_id,
-    find_user_by_id
+    find_user_by_id,
+    StaleVersionError,
+    BULK_MAX_ITEMS
 )
+from services.http_cache import conditional_get, cached_response, if_match_versions, version_headers
+from services.idempotency import idempotent
 
 
 tasks_route = Blueprint("tasks", __name__)
@@ -20,6 +25,7 @@ tasks_route = Blueprint("tasks", __name__)
 
 @tasks_route.route("/", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_task(project_id, list_id):
     """
     Criar uma nova task
@@ -30,6 +36,11 @@ def create_task(project_id, list_id):
     security:
       - Bearer: []
     parameters:
+      - in: header
+        name: Idempotency-Key
+        required: false
+        type: string
+        description: Chave única da operação. Repetições com a mesma chave devolvem a primeira resposta sem criar duplicatas.
       - in: path
         name: project_id
         required: true
@@ -94,10 +105,8 @@ def create_task(project_id, list_id):
     if not title:
       return jsonify({"error": "O nome da task é obrigatório"}), 400
 
-    new_task_id = get_next_task_id()
-
     new_task = {
-        "task_id": str(new_task_id),
+        "task_id": None,  # atribuído por save_task, junto com a gravação
         "title": data.get("title", ""),
         "description": data.get("description", ""),
         "completed": False,
@@ -110,8 +119,133 @@ def create_task(project_id, list_id):
 
 
 
+@tasks_route.route("/bulk", methods=["POST"])
+@jwt_required()
+@idempotent
+def create_tasks_bulk(project_id, list_id):
+    """
+    Criar várias tasks de uma vez em uma lista
+    ---
+    tags:
+      - Tasks
+    operationId: "create_tasks_bulk"
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Idempotency-Key
+        required: false
+        type: string
+        description: Chave única da operação. Repetições com a mesma chave devolvem a primeira resposta sem criar duplicatas.
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: path
+        name: list_id
+        required: true
+        type: string
+      - in: body
+        name: body
+        schema:
+          type: object
+          properties:
+            tasks:
+              type: array
+              items:
+                type: object
+                properties:
+                  title:
+                    type: string
+                  description:
+                    type: string
+    responses:
+      201:
+        description: Tasks criadas (itens inválidos são reportados em errors)
+        examples:
+          application/json:
+            message: "2 tasks criadas com sucesso!"
+            data:
+              created:
+                - task_id: "<id>"
+                  title: "<titulo>"
+                  description: "<descricao>"
+                  completed: false
+                  created_at: "2025-11-23 12:00:00"
+                  list_id: "<list_id>"
+              errors:
+                - index: 2
+                  error: "O nome da task é obrigatório"
+      400:
+        description: Erro nos dados enviados ou nenhuma task válida
+        examples:
+          application/json:
+            error: "Envie uma lista de tasks"
+      403:
+        description: Sem permissão
+        examples:
+          application/json:
+            error: "Você não tem permissão para criar tasks neste projeto"
+      404:
+        description: Projeto ou lista não encontrada
+        examples:
+          application/json:
+            error: "Projeto não encontrado"
+    """
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    items = data.get("tasks")
+
+    if not isinstance(items, list) or not items:
+      return jsonify({"error": "Envie uma lista de tasks"}), 400
+
+    if len(items) > BULK_MAX_ITEMS:
+      return jsonify({"error": f"Envie no máximo {BULK_MAX_ITEMS} tasks por requisição"}), 400
+
+    # valida projeto e lista uma única vez para o lote inteiro
+    project = find_project_by_id(project_id)
+    if not project:
+      return jsonify({"error": "Projeto não encontrado"}), 404
+
+    if str(project["user_id"]) != str(current_user_id):
+        return jsonify({"error": "Você não tem permissão para criar tasks neste projeto"}), 403
+
+    lista = find_list_by_id(list_id)
+    if not lista or str(lista["project_id"]) != str(project_id):
+      return jsonify({"error": "Lista não encontrada no projeto"}), 404
+
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    new_tasks = []
+    errors = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("title"):
+            errors.append({"index": index, "error": "O nome da task é obrigatório"})
+            continue
+
+        new_tasks.append({
+            "task_id": None,  # atribuídos por save_tasks, em sequência
+            "title": item.get("title", ""),
+            "description": item.get("description", ""),
+            "completed": False,
+            "created_at": created_at,
+            "list_id": str(list_id),
+        })
+
+    if not new_tasks:
+      return jsonify({"error": "Nenhuma task válida enviada", "data": {"created": [], "errors": errors}}), 400
+
+    save_tasks(new_tasks, project_id)
+
+    return jsonify({
+      "message": f"{len(new_tasks)} tasks criadas com sucesso!",
+      "data": {"created": new_tasks, "errors": errors}
+    }), 201
+
+
 @tasks_route.route("/", methods=["GET"])
 @jwt_required()
+@conditional_get("project")
 def list_tasks(project_id, list_id):
     """
     Listar todas as tasks de uma lista
@@ -222,6 +356,8 @@ def list_tasks(project_id, list_id):
 
 @tasks_route.route('/<task_id>', methods=["GET"])
 @jwt_required()
+@conditional_get("project", row="task")
+@cached_response("project")
 def get_specific_task(project_id, list_id, task_id):
     """
     Obter uma task específica de uma lista
@@ -361,6 +497,11 @@ def update_task(project_id, list_id, task_id):
         name: task_id
         required: true
         type: string
+      - in: header
+        name: If-Match
+        required: false
+        type: string
+        description: Versão da task lida pelo cliente (campo version, ex. "3"). Se a task tiver sido alterada depois, a atualização é recusada com 412.
       - in: body
         name: body
         schema:
@@ -374,7 +515,7 @@ def update_task(project_id, list_id, task_id):
               type: boolean
     responses:
       200:
-        description: Task atualizada
+        description: Task atualizada (a nova versão vem no cabeçalho ETag)
         examples:
           application/json:
             message: "Task atualizada com sucesso!"
@@ -388,6 +529,12 @@ def update_task(project_id, list_id, task_id):
         examples:
           application/json:
             error: "Task não encontrada"
+      412:
+        description: A task foi alterada depois da versão informada no If-Match
+        examples:
+          application/json:
+            error: "A task foi alterada por outra requisição. Recarregue e tente novamente"
+            version: 4
     """
 
     current_user_id = get_jwt_identity()
@@ -421,8 +568,14 @@ def update_task(project_id, list_id, task_id):
         "completed": data.get("completed", task["completed"]),
     }
 
-    update_task_data(task_id, new_data)
-    return jsonify({"message": "Task atualizada com sucesso!"}), 200
+    try:
+      updated_task = update_task_data(task_id, new_data, expected_version=if_match_versions())
+    except StaleVersionError as error:
+      return jsonify({"error": "A task foi alterada por outra requisição. Recarregue e tente novamente", "version": error.current}), 412
+    if not updated_task:
+      return jsonify({"error": "Task não encontrada"}), 404
+
+    return jsonify({"message": "Task atualizada com sucesso!"}), 200, version_headers(updated_task)
 
 
 @tasks_route.route("/<task_id>", methods=["DELETE"])
@@ -482,3 +635,81 @@ def delete_task(project_id, list_id, task_id):
 
     delete_task_data(task_id)
     return jsonify({"message": "Task deletada com sucesso!"}), 200
+
+
+@tasks_route.route("/", methods=["DELETE"])
+@jwt_required()
+def delete_tasks_bulk(project_id, list_id):
+    """
+    Deletar de uma vez as tasks de uma lista que atendem ao filtro
+    ---
+    tags:
+      - Tasks
+    operationId: "delete_tasks_bulk"
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: project_id
+        required: true
+        type: string
+      - in: path
+        name: list_id
+        required: true
+        type: string
+      - in: query
+        name: completed
+        required: true
+        type: string
+        enum: ["true", "false"]
+        description: Deleta as tasks com esse status (ex. "true" para limpar as concluídas). Os comentários das tasks também são removidos.
+    responses:
+      200:
+        description: Tasks deletadas
+        examples:
+          application/json:
+            message: "3 tasks deletadas com sucesso!"
+            data:
+              deleted_task_ids: ["1", "2", "5"]
+      400:
+        description: Filtro inválido
+        examples:
+          application/json:
+            error: "Informe o filtro completed (true ou false)"
+      403:
+        description: Sem permissão
+        examples:
+          application/json:
+            error: "Você não tem permissão para acessar esta task"
+      404:
+        description: Projeto ou lista não encontrada
+        examples:
+          application/json:
+            error: "Lista não encontrada"
+    """
+    current_user_id = get_jwt_identity()
+
+    completed_param = request.args.get("completed", "").lower()
+    if completed_param not in ["true", "false"]:
+      return jsonify({"error": "Informe o filtro completed (true ou false)"}), 400
+
+    project = find_project_by_id(project_id)
+    if not project:
+      return jsonify({"error": "Projeto não encontrado"}), 404
+    if str(project["user_id"]) != str(current_user_id):
+      return jsonify({"error": "Você não tem permissão para acessar esta task"}), 403
+
+    lista = find_list_by_id(list_id)
+    if not lista or str(lista["project_id"]) != str(project_id):
+      return jsonify({"error": "Lista não encontrada"}), 404
+
+    tasks = [t for t in find_tasks_by_list_id(list_id) if str(t.get("completed")).lower() == completed_param]
+    task_ids = [t["task_id"] for t in tasks]
+
+    if task_ids:
+        delete_tasks_data(task_ids, project_id)
+
+    return jsonify({
+      "message": f"{len(task_ids)} tasks deletadas com sucesso!",
+      "data": {"deleted_task_ids": task_ids}
+    }), 200
@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify,request
-from services.csv_service import save_user, find_user_by_email, get_next_user_id, find_user_by_id, update_user_data, delete_user_data
+from services.csv_service import save_user, find_user_by_email, find_user_by_id, update_user_data, delete_user_data, find_tasks_by_user_id, find_changes_since, StaleVersionError
+from services.http_cache import if_match_versions, version_headers
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
 from datetime import datetime
+from services.jobs import job_queue
 
 user_route = Blueprint('users', __name__)
 
@@ -62,10 +64,8 @@ def create_user():
       return jsonify({"error": 'Email ja cadastrado'}), 400
     
     password_hash = generate_password_hash(password)
-    new_id = get_next_user_id()
-
     new_user = {
-        "user_id": new_id,
+        "user_id": None,  # atribuído por save_user, junto com a gravação
         "name": name,
         "password_hash": password_hash,
         "email": email,
@@ -217,8 +217,196 @@ def user_info():
     
     user.pop('password_hash')
 
-    return jsonify({"message": "Perfil recuperado com sucesso" ,"data": user}), 200
+    return jsonify({"message": "Perfil recuperado com sucesso" ,"data": user}), 200, version_headers(user)
+
+
+
+@user_route.route('/user/tasks')
+@jwt_required()
+def user_tasks():
+    """
+    Lista as tasks do usuário em todos os seus projetos.
+    ---
+    tags:
+      - Users
+    operationId: "user_tasks"
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: completed
+        required: false
+        type: string
+        enum: ["true", "false"]
+        description: Filtrar tasks por status. Use "false" para ver apenas as tarefas em aberto.
+      - in: query
+        name: order
+        required: false
+        type: string
+        enum: ["asc", "desc"]
+        description: Ordenação pela data de criação (padrão "asc").
+      - in: query
+        name: page
+        required: false
+        type: integer
+        description: Página desejada (padrão 1).
+      - in: query
+        name: per_page
+        required: false
+        type: integer
+        description: Quantidade de tasks por página (padrão 20, máximo 100).
+    responses:
+      200:
+        description: Tasks do usuário
+        examples:
+          application/json:
+            message: "Tasks recuperadas com sucesso"
+            data:
+              tasks:
+                - task_id: "1"
+                  title: "Task A"
+                  description: ""
+                  completed: "False"
+                  created_at: "2025-11-23 12:00:00"
+                  list_id: "1"
+                  project_id: "1"
+                  project_title: "Projeto A"
+                  list_name: "A Fazer"
+              pagination:
+                page: 1
+                per_page: 20
+                total: 1
+                pages: 1
+      400:
+        description: Parâmetros inválidos
+        examples:
+          application/json:
+            error: "Valor inválido para completed. Use true ou false."
+      401:
+        description: Usuário não encontrado (token inválido/usuário removido)
+        examples:
+          application/json:
+            error: "Usuário não encontrado. Por favor, efetuar o login novamente"
+    """
+    current_user_id = get_jwt_identity()
+
+    user = find_user_by_id(current_user_id)
+
+    if not user:
+      return jsonify({"error": "Usuário não encontrado. Por favor, efetuar o login novamente"}), 401
+
+    completed = request.args.get('completed')
+    if completed is not None:
+        completed = completed.lower()
+        if completed not in ["true", "false"]:
+          return jsonify({"error": "Valor inválido para completed. Use true ou false."}), 400
+
+    order = request.args.get('order', 'asc').lower()
+    if order not in ["asc", "desc"]:
+      return jsonify({"error": "Valor inválido para order. Use asc ou desc."}), 400
+
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+    except ValueError:
+      return jsonify({"error": "page e per_page devem ser números inteiros"}), 400
+
+    if page < 1 or per_page < 1:
+      return jsonify({"error": "page e per_page devem ser maiores que zero"}), 400
+    per_page = min(per_page, 100)
+
+    tasks = find_tasks_by_user_id(current_user_id, completed)
+    if order == "desc":
+        tasks.reverse()
+
+    total = len(tasks)
+    start = (page - 1) * per_page
+
+    response = {
+        "tasks": tasks[start:start + per_page],
+        "pagination": {
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        },
+    }
+
+    return jsonify({"message": "Tasks recuperadas com sucesso", "data": response}), 200
+
+
+@user_route.route('/user/changes')
+@jwt_required()
+def user_changes():
+    """
+    Lista as alterações feitas nos dados do usuário desde uma sequência.
+    ---
+    tags:
+      - Users
+    operationId: "user_changes"
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: since
+        required: false
+        type: integer
+        description: Última sequência já sincronizada pelo cliente (padrão 0 = desde o início). Se ela for anterior às alterações mantidas pela API, a resposta vem com truncated=true e o cliente deve recarregar os dados antes de continuar de next_since.
+      - in: query
+        name: limit
+        required: false
+        type: integer
+        description: Quantidade máxima de alterações por página (padrão 100, máximo 1000).
+    responses:
+      200:
+        description: Alterações compactadas por entidade (apenas a mais recente de cada uma)
+        examples:
+          application/json:
+            message: "Alterações recuperadas com sucesso"
+            data:
+              changes:
+                - seq: 12
+                  entity: "task"
+                  entity_id: "3"
+                  project_id: "1"
+                  op: "update"
+                  data:
+                    task_id: "3"
+                    title: "Task A"
+                    completed: "True"
+                  created_at: "2025-11-23 12:00:00"
+                - seq: 13
+                  entity: "comment"
+                  entity_id: "7"
+                  project_id: "1"
+                  op: "delete"
+                  data: null
+                  created_at: "2025-11-23 12:01:00"
+              next_since: 13
+              has_more: false
+              last_seq: 13
+              truncated: false
+      400:
+        description: Parâmetros inválidos
+        examples:
+          application/json:
+            error: "since e limit devem ser números inteiros"
+    """
+    current_user_id = get_jwt_identity()
+
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+      return jsonify({"error": "since e limit devem ser números inteiros"}), 400
 
+    if since < 0 or limit < 1:
+      return jsonify({"error": "since deve ser maior ou igual a zero e limit maior que zero"}), 400
+    limit = min(limit, 1000)
+
+    changes = find_changes_since(current_user_id, since, limit)
+
+    return jsonify({"message": "Alterações recuperadas com sucesso", "data": changes}), 200
 
 @user_route.route('/user', methods=['PUT'])
 @jwt_required()
@@ -234,6 +422,11 @@ def update_user():
     consumes:
       - application/json
     parameters:
+      - in: header
+        name: If-Match
+        required: false
+        type: string
+        description: Versão do cadastro lida pelo cliente (campo version, ex. "3"). Se o cadastro tiver sido alterado depois, a atualização é recusada com 412.
       - in: body
         name: body
         description: Envie apenas os campos que deseja alterar (delete as linhas dos outros no JSON)
@@ -248,7 +441,7 @@ def update_user():
               type: string
     responses:
       200:
-        description: Dados atualizados com sucesso
+        description: Dados atualizados com sucesso (a nova versão vem no cabeçalho ETag)
         examples:
           application/json:
             message: "Cadastro atualizado com sucesso!"
@@ -266,6 +459,12 @@ def update_user():
         examples:
           application/json:
             error: "Informe o que deseja atualizar corretamente"
+      412:
+        description: O cadastro foi alterado depois da versão informada no If-Match
+        examples:
+          application/json:
+            error: "Seu cadastro foi alterado por outra requisição. Recarregue e tente novamente"
+            version: 4
     """
     current_user_id = get_jwt_identity()
 
@@ -286,10 +485,15 @@ def update_user():
             data.pop('password')
             data['password_hash'] = new_password_hash
 
-        updated_data = update_user_data(current_user_id, data)
+        try:
+            updated_data = update_user_data(current_user_id, data, expected_version=if_match_versions())
+        except StaleVersionError as error:
+            return jsonify({"error": "Seu cadastro foi alterado por outra requisição. Recarregue e tente novamente", "version": error.current}), 412
+        if not updated_data:
+            return jsonify({"error": "Usuário não encontrado. Por favor, efetuar o login novamente"}), 401
         updated_data.pop('password_hash')
 
-        return jsonify({"message": 'Cadastro atualizado com sucesso!', "data": updated_data}), 200
+        return jsonify({"message": 'Cadastro atualizado com sucesso!', "data": updated_data}), 200, version_headers(updated_data)
 
 
     return jsonify({"error": 'Informe o que deseja atualizar corretamente'}), 400
@@ -309,6 +513,11 @@ def delete_user():
     consumes:
       - application/json
     parameters:
+      - in: query
+        name: async
+        required: false
+        type: boolean
+        description: Se true, a exclusão roda como job em segundo plano (acompanhe em /jobs/{job_id})
       - in: body
         name: body
         required: true
@@ -325,6 +534,15 @@ def delete_user():
         examples:
           application/json:
             message: "Usuario deletado!"
+      202:
+        description: Exclusão agendada como job (async=true)
+        examples:
+          application/json:
+            message: "Exclusão do usuário agendada"
+            data:
+              job_id: "3f2c0e5a9b7d4e1f8a6c2b0d9e7f5a3c"
+              kind: "delete_user"
+              status: "queued"
       400:
         description: Senha não informada
         examples:
@@ -355,6 +573,12 @@ def delete_user():
     
     password_hash = user.get('password_hash')
     if check_password_hash(password_hash, password):
+        if request.args.get('async', '').lower() == 'true':
+            job = job_queue.submit("delete_user", {"user_id": str(current_user_id)}, user_id=current_user_id)
+            response = jsonify({"message": "Exclusão do usuário agendada", "data": job})
+            response.headers["Location"] = f"/jobs/{job['job_id']}"
+            return response, 202
+
         delete_user_data(current_user_id)
         return jsonify({"message": 'Usuario deletado!'}), 200
 
@@ -1,5 +1,29 @@
 import os
 import csv
+import io
+import json
+import mmap
+import gzip
+import glob
+import zlib
+import pickle
+import bisect
+from array import array
+import threading
+import contextvars
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from services.versions import bump, get_version, user_scope, project_scope
+from services.generations import generations
+from services.write_queue import write_queue
+from services.shard_map import shard_map
+from services.shared_tables import Segment, write_segment, segment_name
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # caminho da pasta atual
 current_path = os.path.dirname(os.path.abspath(__file__))
@@ -7,8 +31,8 @@ current_path = os.path.dirname(os.path.abspath(__file__))
 # caminho da pasta raiz
 main_path = os.path.dirname(current_path)
 
-# pasta db
-db_path = os.path.join(main_path, "db")
+# pasta db (DB_PATH permite um no por pasta, ver services/shard_map.py)
+db_path = os.getenv("DB_PATH") or os.path.join(main_path, "db")
 
 # cria a pasta db se não existir
 if not os.path.exists(db_path):
@@ -20,51 +44,1736 @@ PROJECTS = os.path.join(db_path, "projects.csv")
 LISTS = os.path.join(db_path, "lists.csv")
 TASKS = os.path.join(db_path, "tasks.csv")
 COMMENTS = os.path.join(db_path, "comments.csv")
+CHANGES = os.path.join(db_path, "changes.csv")
+TOMBSTONES = os.path.join(db_path, "tombstones.csv")
+# trava (db/transaction.lock) que serializa as transacoes entre processos
+TRANSACTION_LOCK = os.path.join(db_path, "transaction")
+ARCHIVE_PATH = os.path.join(db_path, "archive")
+ARCHIVE_MAX_IDS = os.path.join(ARCHIVE_PATH, "max_ids.json")
 
 # fieldnames
-USER_FIELDNAMES = ['user_id', 'name', 'email', 'password_hash', 'created_at']
-PROJECT_FIELDNAMES = ['project_id', 'user_id', 'project_title', 'project_description', 'created_at']
-LIST_FIELDNAMES = ['list_id', 'project_id', 'list_name', 'created_at']
-TASKS_FIELDNAMES = ['task_id', 'title', 'description', 'completed', 'created_at', 'list_id']
-COMMENTS_FIELDNAMES =['comment_id','task_id','content','created_at']
+USER_FIELDNAMES = ['user_id', 'name', 'email', 'password_hash', 'created_at', 'version']
+PROJECT_FIELDNAMES = ['project_id', 'user_id', 'project_title', 'project_description', 'created_at', 'version']
+LIST_FIELDNAMES = ['list_id', 'project_id', 'list_name', 'created_at', 'version']
+TASKS_FIELDNAMES = ['task_id', 'title', 'description', 'completed', 'created_at', 'list_id', 'version']
+COMMENTS_FIELDNAMES =['comment_id','task_id','content','created_at', 'version']
+CHANGES_FIELDNAMES = ['seq', 'user_id', 'entity', 'entity_id', 'project_id', 'op', 'data', 'created_at']
+TOMBSTONE_FIELDNAMES = ['entity', 'entity_id', 'deleted_at']
+
+# versao de cada linha das tabelas principais (controle de concorrencia
+# otimista): comeca em 1 e e incrementada a cada alteracao da linha
+VERSION_FIELD = 'version'
+
+# soft delete: o DELETE so marca a entidade como removida (ela e sua
+# subarvore somem das consultas) e o purger apaga os dados depois
+SOFT_DELETE = os.getenv("SOFT_DELETE", "False") == "True"
+
+# limite de itens por requisicao nas rotas em lote (tasks, comentarios e o
+# PATCH de tasks do projeto)
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 1000))
+
+# alteracoes mantidas em memoria (historico por usuario e replay dos eventos
+# SSE); as mais antigas saem primeiro e quem pede desde antes delas e avisado
+JOURNAL_MAX_ENTRIES = int(os.getenv("JOURNAL_MAX_ENTRIES", 50000))
+
+# arquivo morto: tasks concluidas ha mais de N dias (pela data de criacao)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+
+# snapshots binarios das tabelas (carga rapida na inicializacao)
+CSV_SNAPSHOTS = os.getenv("CSV_SNAPSHOTS", "True") == "True"
+SNAPSHOT_MIN_ROWS = int(os.getenv("SNAPSHOT_MIN_ROWS", 1000))
+# depois de escritas, o snapshot e regravado em segundo plano no maximo uma
+# vez a cada N segundos por tabela (0: so na primeira carga do processo)
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", 30))
+SNAPSHOT_MAGIC = b"GPSNAP1\n"
+
+# modo de leitura: "memory" mantem as tabelas inteiras em memoria; "mmap"
+# nao guarda as linhas e busca por id direto no arquivo via indice de offsets;
+# "shared" le as tabelas de segmentos em memoria compartilhada por todos os
+# workers (ver services/shared_tables.py)
+CSV_READ_MODE = os.getenv("CSV_READ_MODE", "memory")
+
+# modo shared: pasta dos segmentos (ex.: /dev/shm/<no> para ficar em tmpfs)
+# e linhas acrescentadas ao CSV que um segmento aceita antes de ser republicado
+SHARED_TABLES_PATH = os.getenv("SHARED_TABLES_PATH") or os.path.join(db_path, "shared")
+SHARED_OVERLAY_MAX_ROWS = int(os.getenv("SHARED_OVERLAY_MAX_ROWS", 1000))
+
+# parse paralelo de arquivos grandes (em pedacos, num pool de processos)
+PARALLEL_PARSE_MIN_BYTES = int(os.getenv("PARALLEL_PARSE_MIN_BYTES", 16 * 1024 * 1024))
+PARALLEL_PARSE_WORKERS = int(os.getenv("PARALLEL_PARSE_WORKERS", os.cpu_count() or 1))
+
+# shards por projeto: tasks e comentarios de cada projeto ficam em
+# db/shards/project-<id>/{tasks,comments}.csv, entao uma escrita so reescreve
+# os dados de um projeto. O diretorio (task/comentario -> projeto) so cresce
+# por append; na primeira vez os arquivos globais sao migrados para os shards.
+SHARDED_STORAGE = os.getenv("SHARDED_STORAGE", "False") == "True"
+SHARDS_PATH = os.path.join(db_path, "shards")
+SHARD_DIRECTORY = os.path.join(SHARDS_PATH, "directory.csv")
+SHARD_DIRECTORY_FIELDNAMES = ['entity', 'entity_id', 'project_id']
+
+# chave primaria de cada tabela
+FIELDNAMES_BY_TABLE = {
+    USERS: USER_FIELDNAMES,
+    PROJECTS: PROJECT_FIELDNAMES,
+    LISTS: LIST_FIELDNAMES,
+    TASKS: TASKS_FIELDNAMES,
+    COMMENTS: COMMENTS_FIELDNAMES,
+}
+
+ID_FIELDS = {
+    USERS: "user_id",
+    PROJECTS: "project_id",
+    LISTS: "list_id",
+    TASKS: "task_id",
+    COMMENTS: "comment_id",
+}
+
+# nos shards a chave primaria vem do nome do arquivo (tasks.csv, comments.csv)
+ID_FIELDS_BY_NAME = {os.path.basename(arq): id_field for arq, id_field in ID_FIELDS.items()}
 
 
 # funcoes gerais de manipulação de CSV
 
-def save_csv(arq, fieldnames, data):
-    with open(arq, "a", encoding="utf-8", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+# todas as escritas deste processo passam por esta trava (reentrante para
+# que uma transacao possa segurar a trava durante varias escritas)
+_write_lock = threading.RLock()
 
-        if os.path.getsize(arq) == 0:
-            writer.writeheader()
+# snapshot de leitura da requisicao atual: cada arquivo e lido uma unica vez
+# e compartilhado por todas as consultas da requisicao (ver begin_snapshot)
+_snapshot = contextvars.ContextVar("csv_snapshot", default=None)
 
-        writer.writerow(data)
 
-
-def overwrite_csv(arq, fieldnames, data_list):
-    with open(arq, "w", encoding="utf-8", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data_list)
+def save_csv(arq, fieldnames, data):
+    save_csv_rows(arq, fieldnames, [data])
+
+
+def save_csv_rows(arq, fieldnames, data_list):
+    # acrescenta as linhas pela fila de escrita (group commit). A trava so
+    # cobre o enfileiramento, para que appends de varias threads entrem no
+    # mesmo lote; a espera pela confirmacao fica fora dela.
+    #
+    # Nas tabelas, a trava compartilhada do arquivo (varios appends ao mesmo
+    # tempo) espera a transacao de outro worker que tocou a tabela terminar,
+    # para que um rollback dela nao apague estas linhas. Ela e pega sob a
+    # trava de escrita, como nas reescritas, e solta depois da confirmacao.
+    with ExitStack() as locks:
+        with _write_lock:
+            _keep_for_rollback(arq)
+            if _id_field(arq):
+                locks.enter_context(locked_file(arq, shared=True))
+            entry = write_queue.submit("append", arq, fieldnames, data_list)
+        write_queue.wait(entry)
+        # ainda sob a trava: quem pegar a trava depois (ex.: para numerar
+        # linhas novas) ja enxerga estas
+        _written(arq, appended=True)
 
 
-def read_csv(arq):
+def overwrite_csv(arq, fieldnames, data_list):
+    with _write_lock:
+        _keep_for_rollback(arq)
+        if _shared(arq):
+            _overwrite_shared(arq, fieldnames, data_list)
+        else:
+            write_queue.write("overwrite", arq, fieldnames, data_list)
+            if _id_field(arq):
+                _drop_segment(arq)
+        _written(arq)
+
+        # o arquivo acabou de ser reescrito: a tabela em memoria ja nasce
+        # atualizada (sem reler o CSV); o snapshot binario fica para depois
+        if _id_field(arq) and CSV_READ_MODE == "memory":
+            rows = [{f: "" if row.get(f) is None else str(row.get(f)) for f in fieldnames} for row in data_list]
+            _tables[arq] = _build_table(arq, _file_key(arq), rows)
+            _schedule_snapshot(arq)
+
+
+def _parse_csv_file(arq):
     try:
+        if PARALLEL_PARSE_WORKERS > 1 and os.path.getsize(arq) >= PARALLEL_PARSE_MIN_BYTES:
+            try:
+                return parse_csv_parallel(arq)
+            except Exception:
+                # pool indisponivel (ou quebrado): segue no parse sequencial
+                pass
+
         with open(arq, "r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
             return list(reader)
+    # so a ausencia do arquivo vale como tabela vazia. Outros erros (arquivo
+    # corrompido, utf-8 invalido) sobem: uma tabela ilegivel nao pode parecer
+    # vazia, senao a proxima regravacao apaga tudo. Use python -m services.fsck
+    # para verificar/reparar o banco.
+    except FileNotFoundError:
+        return []
+
+
+# parse paralelo: o arquivo e dividido em pedacos que comecam e terminam em
+# limites de registro (quebras de linha dentro de aspas nao contam), cada
+# pedaco e interpretado por um processo e os resultados sao juntados na
+# ordem original.
+
+_parse_pools = {}
+_parse_pools_lock = threading.Lock()
+
+
+def _get_parse_pool(workers):
+    with _parse_pools_lock:
+        pool = _parse_pools.get(workers)
+        if pool is None:
+            pool = _parse_pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+def _chunk_boundaries(data, start, size, parts):
+    # offsets de inicio de cada pedaco. Cada limite e um inicio de registro,
+    # entao a paridade das aspas contadas desde ele diz se uma quebra de
+    # linha esta dentro de um campo.
+    boundaries = [start]
+    step = max(1, (size - start) // parts)
+    while len(boundaries) < parts:
+        pos = boundaries[-1] + step
+        if pos >= size:
+            break
+
+        quotes = data[boundaries[-1]:pos].count(b'"')
+        newline = data.find(b"\n", pos, size)
+        while newline != -1:
+            quotes += data[pos:newline].count(b'"')
+            pos = newline + 1
+            if quotes % 2 == 0:
+                break
+            newline = data.find(b"\n", pos, size)
+
+        if newline == -1 or pos >= size:
+            break
+        boundaries.append(pos)
+    return boundaries
+
+
+def _parse_chunk(arq, start, end):
+    # roda no processo do pool: devolve listas de valores (mais baratas de
+    # transferir que dicts)
+    with open(arq, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+    return list(csv.reader(io.StringIO(text, newline=None)))
+
+
+def _rows_to_dicts(header, records, rows):
+    # mesmo resultado do csv.DictReader: ignora linhas vazias, completa as
+    # curtas com None e guarda o excesso das longas na chave None
+    size = len(header)
+    for values in records:
+        if not values:
+            continue
+        if len(values) == size:
+            rows.append(dict(zip(header, values)))
+            continue
+        row = dict(zip(header, values))
+        if len(values) > size:
+            row[None] = values[size:]
+        else:
+            for field in header[len(values):]:
+                row[field] = None
+        rows.append(row)
+
+
+def parse_csv_parallel(arq, workers=None):
+    workers = workers or PARALLEL_PARSE_WORKERS
+    with open(arq, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = _record_end(data, 0, size)
+            if header_end is None:
+                header_end = size
+            header = next(csv.reader(io.StringIO(data[:header_end].decode("utf-8"), newline=None)), [])
+            boundaries = _chunk_boundaries(data, header_end, size, workers)
+
+    boundaries.append(size)
+    rows = []
+    if len(boundaries) == 2:
+        _rows_to_dicts(header, _parse_chunk(arq, header_end, size), rows)
+        return rows
+
+    pool = _get_parse_pool(workers)
+    futures = [pool.submit(_parse_chunk, arq, start, end) for start, end in zip(boundaries, boundaries[1:])]
+    for future in futures:
+        _rows_to_dicts(header, future.result(), rows)
+    return rows
+
+
+# snapshot binario: a tabela ja indexada (linhas, indice por id e maior id)
+# em pickle protocolo 5, ao lado do CSV. So e usado enquanto o CSV tiver o
+# mesmo mtime e tamanho registrados no snapshot.
+
+def _snapshot_path(arq):
+    return arq + ".snapshot"
+
+
+def _save_snapshot(arq, table, stat):
+    if not CSV_SNAPSHOTS or len(table["rows"]) < SNAPSHOT_MIN_ROWS:
+        return
+
+    payload = pickle.dumps({
+        "csv_mtime_ns": stat.st_mtime_ns,
+        "csv_size": stat.st_size,
+        "rows": table["rows"],
+        "by_id": table["by_id"],
+        "max_id": table["max_id"],
+    }, protocol=5)
+
+    # grava em um arquivo temporario (um por thread) e troca, para nunca
+    # deixar um snapshot pela metade. O snapshot e so uma otimizacao: se nao
+    # der para grava-lo, a proxima carga le o CSV.
+    tmp_path = f"{_snapshot_path(arq)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(zlib.crc32(payload).to_bytes(4, "big"))
+            file.write(payload)
+        os.replace(tmp_path, _snapshot_path(arq))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_snapshot(arq, key, stat):
+    # devolve a tabela do snapshot ou None se ele nao existir / nao bater com o CSV
+    try:
+        with open(_snapshot_path(arq), "rb") as file:
+            content = file.read()
+    except FileNotFoundError:
+        return None
+
+    header_size = len(SNAPSHOT_MAGIC) + 4
+    if not content.startswith(SNAPSHOT_MAGIC) or len(content) < header_size:
+        return None
+
+    payload = memoryview(content)[header_size:]
+    if zlib.crc32(payload) != int.from_bytes(content[len(SNAPSHOT_MAGIC):header_size], "big"):
+        return None
+
+    try:
+        snapshot = pickle.loads(payload)
+    except Exception:
+        return None
+
+    if snapshot["csv_mtime_ns"] != stat.st_mtime_ns or snapshot["csv_size"] != stat.st_size:
+        return None
+
+    return {"key": key, "rows": snapshot["rows"], "by_id": snapshot["by_id"], "max_id": snapshot["max_id"]}
+
+
+def _load_table_data(arq, key):
+    try:
+        stat = os.stat(arq)
+    except FileNotFoundError:
+        return _build_table(arq, key, [])
+
+    if CSV_SNAPSHOTS and _id_field(arq):
+        table = _load_snapshot(arq, key, stat)
+        if table is not None:
+            return table
+
+    table = _build_table(arq, key, _parse_csv_file(arq))
+
+    # sem snapshot valido: na primeira carga do processo grava um para a
+    # proxima; depois disso a tabela so e relida por causa de escritas, e
+    # regravar o snapshot a cada uma delas custaria mais do que economiza
+    if CSV_SNAPSHOTS and _id_field(arq) and len(table["rows"]) >= SNAPSHOT_MIN_ROWS:
+        if arq in _snapshot_loaded:
+            _schedule_snapshot(arq)
+        else:
+            _snapshot_loaded.add(arq)
+            _save_snapshot_if_unchanged(arq, table, stat)
+
+    return table
+
+
+def _save_snapshot_if_unchanged(arq, table, stat):
+    # grava o snapshot de uma tabela lida do CSV, desde que o arquivo nao
+    # tenha mudado durante a leitura
+    try:
+        after = os.stat(arq)
+    except FileNotFoundError:
+        return
+    if (after.st_mtime_ns, after.st_size) == (stat.st_mtime_ns, stat.st_size):
+        _save_snapshot(arq, table, after)
+
+
+# regravacao dos snapshots depois de escritas: um timer por tabela (e por
+# processo: depois de um fork os timers do pai nao existem no filho)
+_snapshot_loaded = set()
+_snapshot_timers = {}
+_snapshot_timers_lock = threading.Lock()
+
+
+def _schedule_snapshot(arq):
+    if not CSV_SNAPSHOTS or SNAPSHOT_INTERVAL_SECONDS <= 0:
+        return
+    with _snapshot_timers_lock:
+        if _snapshot_timers.get(arq) == os.getpid():
+            return
+        _snapshot_timers[arq] = os.getpid()
+    timer = threading.Timer(SNAPSHOT_INTERVAL_SECONDS, _refresh_snapshot, args=(arq,))
+    timer.daemon = True
+    timer.start()
+
+
+def _refresh_snapshot(arq):
+    # le o CSV de novo, fora das requisicoes: a tabela em memoria pode nao
+    # corresponder ao arquivo (escritas de outros workers ou em andamento)
+    with _snapshot_timers_lock:
+        _snapshot_timers.pop(arq, None)
+    try:
+        stat = os.stat(arq)
+        table = _build_table(arq, None, _parse_csv_file(arq))
     except Exception:
+        # o snapshot e so uma otimizacao; um CSV ilegivel aparece na leitura
+        return
+    _save_snapshot_if_unchanged(arq, table, stat)
+
+
+# modo mmap: para cada CSV, um indice compacto id -> offset do registro no
+# arquivo (dois array('q'), em ordem de gravacao). Como os ids sao gravados
+# em ordem crescente, a busca e um bisect; se o arquivo estiver fora de
+# ordem cai para uma busca linear no array. Em appends o indice e estendido
+# lendo so o trecho novo do arquivo.
+
+_offset_indexes = {}
+_offset_lock = threading.Lock()
+
+# bytes do fim do trecho ja indexado usados para conferir, quando outro
+# processo altera o arquivo, se foi apenas um append
+OFFSET_TAIL_BYTES = 64
+
+
+def _record_end(mm, pos, size):
+    # fim do registro que comeca em pos (quebras de linha dentro de aspas
+    # fazem parte do campo); None se o registro ainda estiver incompleto
+    quotes = 0
+    while True:
+        newline = mm.find(b"\n", pos, size)
+        if newline == -1:
+            return None
+        quotes += mm[pos:newline].count(b'"')
+        pos = newline + 1
+        if quotes % 2 == 0:
+            return pos
+
+
+def _new_offset_index():
+    return {"key": None, "header": None, "ids": array("q"), "offsets": array("q"),
+            "end": 0, "tail_crc": 0, "sorted": True, "max_id": 0}
+
+
+def _extend_offset_index(index, mm, size):
+    pos = index["end"]
+    if index["header"] is None:
+        end = _record_end(mm, 0, size)
+        if end is None:
+            return
+        index["header"] = next(csv.reader(io.StringIO(mm[0:end].decode("utf-8"), newline=None)), [])
+        pos = end
+
+    ids, offsets = index["ids"], index["offsets"]
+    last_id = ids[-1] if ids else None
+    while pos < size:
+        end = _record_end(mm, pos, size)
+        if end is None:
+            break
+
+        # a chave primaria e sempre a primeira coluna
+        first_line = mm[pos:mm.find(b"\n", pos, size)]
+        comma = first_line.find(b",")
+        raw_id = (first_line[:comma] if comma != -1 else first_line).strip(b'\r"')
+        try:
+            entity_id = int(raw_id)
+        except ValueError:
+            entity_id = None
+
+        if entity_id is not None:
+            if last_id is not None and entity_id < last_id:
+                index["sorted"] = False
+            ids.append(entity_id)
+            offsets.append(pos)
+            last_id = entity_id
+            index["max_id"] = max(index["max_id"], entity_id)
+        pos = end
+
+    index["end"] = pos
+    index["tail_crc"] = zlib.crc32(mm[max(0, pos - OFFSET_TAIL_BYTES):pos])
+
+
+def _offset_index(arq):
+    key = _file_key(arq)
+    index = _offset_indexes.get(arq)
+    if index is not None and index["key"] == key:
+        return index
+
+    with _offset_lock:
+        index = _offset_indexes.get(arq)
+        if index is not None and index["key"] == key:
+            return index
+
+        try:
+            file = open(arq, "rb")
+        except FileNotFoundError:
+            index = _new_offset_index()
+            index["key"] = key
+            _offset_indexes[arq] = index
+            return index
+
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            if index is not None and size < index["end"]:
+                index = None
+            if size == 0:
+                index = _new_offset_index()
+            else:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # escrita de outro processo: so reaproveita o indice se o
+                    # trecho ja indexado continua igual (append)
+                    end = index["end"] if index is not None else 0
+                    if index is None or zlib.crc32(mm[max(0, end - OFFSET_TAIL_BYTES):end]) != index["tail_crc"]:
+                        index = _new_offset_index()
+                    _extend_offset_index(index, mm, size)
+
+        index["key"] = key
+        _offset_indexes[arq] = index
+        return index
+
+
+def _find_by_offset(arq, entity_id, retry=True):
+    try:
+        wanted = int(entity_id)
+    except (TypeError, ValueError):
+        return None
+
+    index = _offset_index(arq)
+    with _offset_lock:
+        ids, offsets = index["ids"], index["offsets"]
+        if index["sorted"]:
+            position = bisect.bisect_left(ids, wanted)
+            if position == len(ids) or ids[position] != wanted:
+                return None
+        else:
+            try:
+                position = ids.index(wanted)
+            except ValueError:
+                return None
+        offset = offsets[position]
+        header = index["header"]
+
+    # le e interpreta apenas o registro encontrado
+    try:
+        with open(arq, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = _record_end(mm, offset, len(mm))
+            record = mm[offset:end].decode("utf-8") if end is not None else ""
+    except (FileNotFoundError, ValueError):
+        record = ""
+
+    values = next(csv.reader(io.StringIO(record, newline=None)), [])
+    row = dict(zip(header, values))
+    for field in header[len(values):]:
+        row[field] = None
+
+    # o arquivo mudou entre o indice e a leitura: refaz o indice uma vez
+    if row.get(header[0]) != str(entity_id):
+        if retry:
+            with _offset_lock:
+                _offset_indexes.pop(arq, None)
+            return _find_by_offset(arq, entity_id, retry=False)
+        return None
+    return row
+
+
+# modo shared: cada tabela principal e publicada como um segmento imutavel
+# mapeado em memoria por todos os workers. As linhas acrescentadas ao CSV
+# depois da publicacao formam a camada de alteracoes, lida de forma
+# incremental por cada worker (como o historico); as regravacoes
+# (update/delete), que ja reescrevem o CSV inteiro, publicam um segmento
+# novo a partir das linhas gravadas. Quando a camada passa de
+# SHARED_OVERLAY_MAX_ROWS linhas, o worker que a leu republica o segmento.
+
+_shared_views = {}
+_shared_locks = {}
+
+
+def _shared(arq):
+    return CSV_READ_MODE == "shared" and _id_field(arq) is not None
+
+
+def _segment_path(arq):
+    return os.path.join(SHARED_TABLES_PATH, segment_name(os.path.relpath(arq, db_path)))
+
+
+def _remove_segment(arq):
+    try:
+        os.remove(_segment_path(arq))
+    except FileNotFoundError:
+        pass
+
+
+def _drop_segment(arq):
+    # o CSV foi reescrito sem publicar (outro modo de leitura, rollback,
+    # shard apagado): o proximo leitor publica a partir do CSV
+    if os.path.exists(_segment_path(arq)):
+        with locked_file(_segment_path(arq)):
+            _remove_segment(arq)
+
+
+def _complete_end(data):
+    # fim do ultimo registro completo (quebras de linha dentro de aspas
+    # fazem parte do campo); um append em andamento fica de fora
+    end = data.rfind(b"\n") + 1
+    while end and data.count(b'"', 0, end) % 2:
+        end = data.rfind(b"\n", 0, end - 1) + 1
+    return end
+
+
+def _csv_mark(file, size, mtime_ns):
+    # identifica o trecho [0, size) do CSV: tamanho, mtime e crc do final
+    file.seek(max(0, size - OFFSET_TAIL_BYTES))
+    return size, mtime_ns, zlib.crc32(file.read(min(size, OFFSET_TAIL_BYTES)))
+
+
+def _segment_matches(arq, segment):
+    # o CSV ainda comeca com o trecho que o segmento cobre? (depois dele so
+    # pode haver appends)
+    try:
+        with open(arq, "rb") as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size < segment.csv_size:
+                return False
+            if stat.st_size == segment.csv_size and stat.st_mtime_ns != segment.csv_mtime_ns:
+                return False
+            return _csv_mark(file, segment.csv_size, 0)[2] == segment.tail_crc
+    except FileNotFoundError:
+        return segment.csv_size == 0
+
+
+def _attach_segment(arq, current=None):
+    # segmento publicado agora (o mesmo objeto se o arquivo nao mudou)
+    path = _segment_path(arq)
+    try:
+        ino = os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+    if current is not None and current.ino == ino:
+        return current
+    try:
+        return Segment(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _publish_from_csv(arq, replacing=None):
+    # publica o CSV atual; replacing: segmento que deve ser trocado mesmo
+    # valido (camada de alteracoes grande demais)
+    os.makedirs(SHARED_TABLES_PATH, exist_ok=True)
+    with locked_file(_segment_path(arq)):
+        # outro processo pode ter publicado enquanto esperavamos a trava
+        segment = _attach_segment(arq)
+        if segment is not None and (replacing is None or segment.ino != replacing.ino) and _segment_matches(arq, segment):
+            return segment
+
+        try:
+            with open(arq, "rb") as file:
+                stat = os.fstat(file.fileno())
+                data = file.read()
+                end = _complete_end(data)
+                mark = _csv_mark(file, end, stat.st_mtime_ns)
+        except FileNotFoundError:
+            data, end, mark = b"", 0, (0, 0, zlib.crc32(b""))
+
+        reader = csv.DictReader(io.StringIO(data[:end].decode("utf-8"), newline=""))
+        rows = list(reader)
+        write_segment(_segment_path(arq), reader.fieldnames or (), rows, _id_field(arq), *mark)
+        return _attach_segment(arq)
+
+
+def _overwrite_shared(arq, fieldnames, data_list):
+    # regravacao no modo shared: o segmento novo sai das linhas gravadas,
+    # sem reler o CSV. O antigo some antes da escrita: se o processo cair
+    # no meio, o proximo leitor publica a partir do CSV.
+    rows = [{f: "" if row.get(f) is None else str(row.get(f)) for f in fieldnames} for row in data_list]
+    os.makedirs(SHARED_TABLES_PATH, exist_ok=True)
+    with locked_file(_segment_path(arq)):
+        _remove_segment(arq)
+        write_queue.write("overwrite", arq, fieldnames, data_list)
+        with open(arq, "rb") as file:
+            stat = os.fstat(file.fileno())
+            mark = _csv_mark(file, stat.st_size, stat.st_mtime_ns)
+        write_segment(_segment_path(arq), fieldnames, rows, _id_field(arq), *mark)
+
+
+def _new_shared_view(segment):
+    return {"key": None, "segment": segment, "offset": segment.csv_size, "fieldnames": segment.fieldnames,
+            "rows": [], "by_id": {}, "max_id": 0}
+
+
+def _read_overlay(arq, view):
+    # linhas acrescentadas ao CSV desde a ultima leitura
+    try:
+        with open(arq, "rb") as file:
+            file.seek(view["offset"])
+            chunk = file.read()
+    except FileNotFoundError:
+        return
+
+    end = _complete_end(chunk)
+    if not end:
+        return
+
+    id_field = _id_field(arq)
+    records = csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline=""))
+    if not view["fieldnames"]:
+        # CSV vazio na publicacao: o cabecalho veio com o primeiro append
+        view["fieldnames"] = tuple(next(records, ()))
+    fieldnames = view["fieldnames"]
+    for values in records:
+        if not values:
+            continue
+        row = dict(zip(fieldnames, values))
+        for field in fieldnames[len(values):]:
+            row[field] = None
+        view["rows"].append(row)
+        view["by_id"].setdefault(row.get(id_field), row)
+        try:
+            view["max_id"] = max(view["max_id"], int(row.get(id_field)))
+        except (TypeError, ValueError):
+            pass
+    view["offset"] += end
+
+
+def _sync_shared_view(arq, view):
+    segment = _attach_segment(arq, view["segment"] if view is not None else None)
+    if segment is None or not _segment_matches(arq, segment):
+        segment = _publish_from_csv(arq)
+    if view is None or view["segment"] is not segment:
+        view = _new_shared_view(segment)
+    _read_overlay(arq, view)
+
+    if len(view["rows"]) > SHARED_OVERLAY_MAX_ROWS:
+        view = _new_shared_view(_publish_from_csv(arq, replacing=segment))
+        _read_overlay(arq, view)
+    return view
+
+
+def _shared_view(arq):
+    # segmento + camada de alteracoes, sincronizados so quando o arquivo muda
+    key = _file_key(arq)
+    view = _shared_views.get(arq)
+    if view is not None and view["key"] == key:
+        return view
+
+    with _shared_locks.setdefault(arq, threading.Lock()):
+        view = _shared_views.get(arq)
+        if view is None or view["key"] != key:
+            view = _sync_shared_view(arq, view)
+            view["key"] = key
+            _shared_views[arq] = view
+        return view
+
+
+def _shared_rows(arq):
+    view = _shared_view(arq)
+    rows = view["segment"].rows()
+    rows.extend(dict(row) for row in view["rows"])
+    return rows
+
+
+def _shared_find(arq, entity_id):
+    view = _shared_view(arq)
+    row = view["segment"].find(entity_id)
+    if row is not None and row.get(_id_field(arq)) == str(entity_id):
+        return row
+    row = view["by_id"].get(str(entity_id))
+    return dict(row) if row is not None else None
+
+
+def publish_shared_tables():
+    # publica (ou confere) os segmentos de todas as tabelas principais. Com
+    # gunicorn --preload roda uma vez no processo mestre, antes dos workers.
+    rows = 0
+    for arq in data_files():
+        view = _shared_view(arq)
+        rows += view["segment"].count + len(view["rows"])
+    return rows
+
+
+def shared_tables_stats():
+    views = list(_shared_views.values())
+    return {
+        "enabled": CSV_READ_MODE == "shared",
+        "tables": len(views),
+        "segment_rows": sum(view["segment"].count for view in views),
+        "segment_bytes": sum(len(view["segment"].mm) for view in views),
+        "overlay_rows": sum(len(view["rows"]) for view in views),
+    }
+
+
+def _generation_key(arq):
+    key = _generation_keys.get(arq)
+    if key is None:
+        key = _generation_keys[arq] = "file:" + os.path.relpath(arq, db_path).replace(os.sep, "/")
+    return key
+
+
+def _file_key(arq):
+    # identifica o estado atual do arquivo. Com contadores compartilhados
+    # (CACHE_INVALIDATION=shared) basta a geracao, que toda escrita de
+    # qualquer worker incrementa: nenhum stat por chamada. No modo local a
+    # geracao so conta as escritas deste processo e o mtime e o tamanho
+    # pegam as dos outros.
+    generation = generations.get(_generation_key(arq))
+    if generations.shared:
+        return (generation,)
+    try:
+        stat = os.stat(arq)
+        return (generation, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return (generation, None)
+
+
+def _id_field(arq):
+    # chave primaria das tabelas principais (globais ou de um shard); None
+    # para os demais arquivos (historico, lapides, jobs...)
+    id_field = ID_FIELDS.get(arq)
+    if id_field is None and os.path.dirname(os.path.dirname(arq)) == SHARDS_PATH:
+        id_field = ID_FIELDS_BY_NAME.get(os.path.basename(arq))
+    return id_field
+
+
+def _build_table(arq, key, rows):
+    id_field = _id_field(arq)
+    by_id = {}
+    max_id = 0
+    if id_field:
+        for row in rows:
+            by_id.setdefault(row.get(id_field), row)
+            try:
+                max_id = max(max_id, int(row.get(id_field)))
+            except (TypeError, ValueError):
+                pass
+    return {"key": key, "rows": rows, "by_id": by_id, "max_id": max_id}
+
+
+def load_table(arq):
+    # tabela em memoria (linhas + indice pela chave primaria), recarregada
+    # apenas quando o arquivo muda. As linhas sao compartilhadas e nunca
+    # devem ser alteradas: quem precisa alterar recebe copias.
+    key = _file_key(arq)
+    table = _tables.get(arq)
+    if table is not None and table["key"] == key:
+        return table
+
+    def load():
+        table = _load_table_data(arq, key)
+        _tables[arq] = table
+        return table
+
+    # recargas simultaneas do mesmo arquivo compartilham um unico parse
+    return _single_flight(("table", arq, key), load, copy=False)
+
+
+def _read_csv_file(arq):
+    if _shared(arq):
+        return _shared_rows(arq)
+    if CSV_READ_MODE == "mmap":
+        # sem cache: as linhas so existem durante a requisicao
+        return _parse_csv_file(arq)
+    return [dict(row) for row in load_table(arq)["rows"]]
+
+
+def _find_by_id(arq, entity_id):
+    if _shared(arq):
+        return _shared_find(arq, entity_id)
+    if CSV_READ_MODE == "mmap":
+        return _find_by_offset(arq, entity_id)
+    row = load_table(arq)["by_id"].get(str(entity_id))
+    return dict(row) if row is not None else None
+
+
+def _last_id(arq):
+    # maior id ja usado na tabela; ids de tasks/comentarios no arquivo morto
+    # nunca sao reaproveitados
+    if _shared(arq):
+        view = _shared_view(arq)
+        max_id = max(view["segment"].max_id, view["max_id"])
+    elif CSV_READ_MODE == "mmap":
+        max_id = _offset_index(arq)["max_id"]
+    else:
+        max_id = load_table(arq)["max_id"]
+    return max(max_id, _archived_max_ids().get(os.path.basename(arq), 0))
+
+
+def _assign_ids(rows, id_field, last_id, user=False):
+    # numera as linhas novas depois de last_id, respeitando a reparticao dos
+    # ids entre os nos (ver shard_map.next_id)
+    for row in rows:
+        last_id = shard_map.next_id(last_id, user=user)
+        row[id_field] = str(last_id)
+
+
+def _create_rows(arq, fieldnames, id_field, rows, entity=None, project_id=None):
+    # grava linhas novas numerando-as na mesma secao critica: o maior id e
+    # relido sob a trava exclusiva de quem numera, e ela so e solta depois
+    # de as linhas estarem no arquivo, entao criadores concorrentes (threads
+    # ou workers) nunca recebem o mesmo id. Com shards, tasks e comentarios
+    # sao numerados pelo diretorio, comum a todos os shards: o id fica
+    # reservado pela entrada do diretorio antes da gravacao no shard.
+    _first_version(rows)
+    if entity is not None and _sharded():
+        with _rewriting(SHARD_DIRECTORY):
+            _assign_ids(rows, id_field, _shard_last_id(entity))
+            _register_shard(entity, id_field, rows, project_id)
+        save_csv_rows(arq, fieldnames, rows)
+        return
+
+    with _rewriting(arq):
+        _assign_ids(rows, id_field, _last_id(arq), user=arq == USERS)
+        save_csv_rows(arq, fieldnames, rows)
+
+
+def warm_table(arq):
+    # prepara a tabela para leitura conforme o modo e devolve o numero de linhas
+    if _shared(arq):
+        view = _shared_view(arq)
+        return view["segment"].count + len(view["rows"])
+    if CSV_READ_MODE == "mmap":
+        return len(_offset_index(arq)["ids"])
+    return len(load_table(arq)["rows"])
+
+
+def read_csv(arq, fresh=False):
+    # fresh=True: le direto do disco (usado por quem vai reescrever o arquivo),
+    # depois de gravadas as escritas que ainda estao na fila
+    if fresh:
+        write_queue.flush()
+    snapshot = _snapshot.get()
+    if snapshot is None or fresh:
+        return _read_csv_file(arq)
+
+    rows = snapshot.get(arq)
+    if rows is None:
+        rows = snapshot[arq] = _read_csv_file(arq)
+
+    # copia, porque as rotas alteram os dicts devolvidos
+    return [dict(row) for row in rows]
+
+
+def begin_snapshot():
+    return _snapshot.set({})
+
+
+def end_snapshot(token):
+    _snapshot.reset(token)
+
+
+def _forget(arq):
+    snapshot = _snapshot.get()
+    if snapshot is not None:
+        snapshot.pop(arq, None)
+
+
+def _written(arq, appended=False):
+    # chamada depois de cada escrita no arquivo (ja gravada, para que os
+    # outros workers releiam o conteudo novo). Em um append o indice de
+    # offsets continua valido e so e estendido na proxima busca.
+    generations.bump(_generation_key(arq))
+    _tables.pop(arq, None)
+    if not appended:
+        _offset_indexes.pop(arq, None)
+    _forget(arq)
+
+
+# single-flight: chamadas identicas e simultaneas esperam a que ja esta em
+# andamento em vez de repetir o trabalho. A chave inclui a geracao do
+# arquivo, entao quem chega depois de uma escrita nunca recebe dado antigo.
+
+_generation_keys = {}
+_tables = {}
+_flights = {}
+_flights_lock = threading.Lock()
+_flight_stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+
+def _single_flight(key, fn, copy=True):
+    with _flights_lock:
+        _flight_stats["calls"] += 1
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = {"event": threading.Event(), "waiters": 0, "copies": [], "error": None}
+            _flight_stats["executions"] += 1
+            leader = True
+        else:
+            flight["waiters"] += 1
+            _flight_stats["coalesced"] += 1
+            leader = False
+
+    if not leader:
+        flight["event"].wait()
+        if flight["error"] is not None:
+            raise flight["error"]
+        with _flights_lock:
+            return flight["copies"].pop()
+
+    result = None
+    try:
+        result = fn()
+        return result
+    except BaseException as error:
+        flight["error"] = error
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+            # cada chamador recebe sua propria copia (as rotas alteram os dicts)
+            if flight["error"] is None:
+                if copy:
+                    flight["copies"] = [[dict(row) for row in result] for _ in range(flight["waiters"])]
+                else:
+                    flight["copies"] = [result] * flight["waiters"]
+        flight["event"].set()
+
+
+def single_flight_stats():
+    with _flights_lock:
+        stats = dict(_flight_stats)
+        stats["in_flight"] = len(_flights)
+    return stats
+
+
+# transacao (tudo ou nada) sobre as tabelas principais
+
+_transaction = contextvars.ContextVar("csv_transaction", default=None)
+
+
+@contextmanager
+def transaction():
+    # segura a trava de escrita durante todo o bloco e guarda o conteudo
+    # de cada tabela antes da primeira escrita nela (ver _keep_for_rollback);
+    # se tx["rollback"] for marcado (ou ocorrer uma excecao), os arquivos
+    # voltam ao estado anterior. O historico de alteracoes so e gravado no
+    # commit, para que eventos de escritas desfeitas nunca cheguem aos
+    # clientes.
+    #
+    # Entre processos: uma transacao por vez (TRANSACTION_LOCK, entao duas
+    # transacoes nunca esperam uma pela outra em ordens diferentes) e cada
+    # tabela tocada fica travada ate o fim, para que o rollback nao
+    # sobrescreva escritas de outros workers feitas depois do backup.
+    # Enquanto o bloco roda, nenhuma outra escrita deste processo anda (nem
+    # as dos outros nas tabelas tocadas): ele deve ser curto (o /batch
+    # atomic limita o numero de operacoes, ver BATCH_ATOMIC_MAX_REQUESTS).
+    with _write_lock, ExitStack() as locks:
+        locks.enter_context(locked_file(TRANSACTION_LOCK))
+
+        # escritas enfileiradas antes da transacao entram no backup
+        write_queue.flush()
+
+        tx = {"rollback": False, "scopes": set(), "changes": [], "backup": {}, "locks": locks}
+        token = _transaction.set(tx)
+        try:
+            yield tx
+        except BaseException:
+            tx["rollback"] = True
+            raise
+        finally:
+            _transaction.reset(token)
+
+            if tx["rollback"]:
+                for arq, content in tx["backup"].items():
+                    if content is None:
+                        if os.path.exists(arq):
+                            os.remove(arq)
+                    else:
+                        # o shard pode ter sido apagado durante a transacao
+                        os.makedirs(os.path.dirname(arq), exist_ok=True)
+                        _restore_file(arq, content)
+                    _drop_segment(arq)
+                    _written(arq)
+                # invalida o que foi lido/cacheado durante a transacao
+                bump(*tx["scopes"])
+            else:
+                for user_id, entries in tx["changes"]:
+                    record_changes(user_id, entries)
+
+
+def _restore_file(arq, content):
+    # volta o conteudo de uma tabela trocando o arquivo inteiro, como as
+    # reescritas da fila (quem le nunca ve a tabela pela metade)
+    tmp_path = f"{arq}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(content)
+    os.replace(tmp_path, arq)
+
+
+def _keep_for_rollback(arq):
+    # dentro de uma transacao, trava a tabela (ate o fim da transacao) e
+    # guarda o seu conteudo antes da primeira escrita nela. So as tabelas
+    # tocadas sao copiadas (com shards, uma transacao nao copia os dados de
+    # todos os projetos).
+    tx = _transaction.get()
+    if tx is None or arq in tx["backup"] or not _id_field(arq):
+        return
+    tx["locks"].enter_context(locked_file(arq))
+    try:
+        with open(arq, "rb") as file:
+            tx["backup"][arq] = file.read()
+    except FileNotFoundError:
+        tx["backup"][arq] = None
+
+
+# travas de arquivo seguradas por cada thread: (arquivo, thread) -> [arquivo
+# da trava, profundidade]
+_held_locks = {}
+
+
+@contextmanager
+def locked_file(arq, shared=False):
+    # trava entre processos (quando o sistema suporta flock): exclusiva, ou
+    # compartilhada (shared=True, varios appends ao mesmo tempo). E
+    # reentrante na mesma thread: uma transacao segura as travas das tabelas
+    # que tocou e as escritas feitas dentro dela nao esperam por si mesmas.
+    key = (arq, threading.get_ident())
+    held = _held_locks.get(key)
+    if held is None:
+        lock_file = open(arq + ".lock", "a")
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        except BaseException:
+            lock_file.close()
+            raise
+        held = _held_locks[key] = [lock_file, 0]
+
+    held[1] += 1
+    try:
+        yield
+    finally:
+        held[1] -= 1
+        if not held[1]:
+            del _held_locks[key]
+            if fcntl:
+                fcntl.flock(held[0], fcntl.LOCK_UN)
+            held[0].close()
+
+
+# controle de concorrencia otimista: quem altera uma linha informa a versao
+# que leu (expected_version). A conferencia e a reescrita acontecem juntas,
+# sob a trava de escrita do processo e a trava do arquivo (entre workers):
+# de duas alteracoes da mesma versao, a segunda recebe StaleVersionError
+# (412 nas rotas) em vez de apagar a primeira. A leitura e as validacoes
+# feitas antes pelas rotas nao travam nada.
+
+class StaleVersionError(Exception):
+    # a linha mudou (ou foi removida) depois de lida por quem tenta altera-la
+
+    def __init__(self, entity, entity_id, expected, current):
+        super().__init__(f"{entity} {entity_id}: versao atual {current}, esperada {expected}")
+        self.entity = entity
+        self.entity_id = entity_id
+        self.expected = expected
+        self.current = current
+
+
+def row_version(row):
+    # linhas gravadas antes da coluna version estao na versao 1
+    try:
+        return int(row.get(VERSION_FIELD) or 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _first_version(rows):
+    for row in rows:
+        row[VERSION_FIELD] = "1"
+
+
+def _check_version(entity, entity_id, row, expected_version):
+    # expected_version: None (sem conferencia), uma versao ou varias (If-Match
+    # com mais de uma ETag). Linha inexistente nunca confere.
+    if expected_version is None:
+        return
+    if isinstance(expected_version, (list, tuple, set, frozenset)):
+        expected = {str(v) for v in expected_version}
+    else:
+        expected = {str(expected_version)}
+    current = row_version(row) if row is not None else None
+    if current is None or str(current) not in expected:
+        raise StaleVersionError(entity, entity_id, expected_version, current)
+
+
+def _apply_update(row, new_data):
+    # a nova versao sai da linha, nunca dos dados enviados
+    version = row_version(row) + 1
+    row.update(new_data)
+    row[VERSION_FIELD] = str(version)
+
+
+@contextmanager
+def _rewriting(arq):
+    # leitura + reescrita de uma tabela como uma operacao so
+    with _write_lock, locked_file(arq):
+        yield
+
+
+@contextmanager
+def _rewriting_tables(*arqs):
+    # leitura + reescrita de varias tabelas como uma operacao so. A trava
+    # das transacoes vem antes: uma transacao trava as tabelas na ordem em
+    # que as toca, entao quem segura mais de uma tabela entra na mesma fila
+    # que elas e nunca espera por uma tabela travada em outra ordem
+    with _write_lock, ExitStack() as locks:
+        for arq in (TRANSACTION_LOCK,) + arqs:
+            locks.enter_context(locked_file(arq))
+        yield
+
+
+def _table_fieldnames(arq):
+    # fieldnames de uma tabela principal (global ou de um shard)
+    return FIELDNAMES_BY_TABLE.get(arq) or FIELDNAMES_BY_TABLE[os.path.join(db_path, os.path.basename(arq))]
+
+
+def _csv_header(arq, opener=open):
+    try:
+        with opener(arq, "rt", encoding="utf-8", newline="") as file:
+            return next(csv.reader(file), None)
+    except FileNotFoundError:
+        return None
+
+
+def migrate_row_versions():
+    # bancos gravados antes da coluna version: acrescenta a coluna (versao 1)
+    # nas tabelas principais, nos shards e no arquivo morto. Roda antes de
+    # migrate_to_shards e pode ser repetida (arquivos com a coluna ficam
+    # como estao).
+    tables = [USERS, PROJECTS, LISTS, TASKS, COMMENTS]
+    for project_id in _shard_projects():
+        tables += [_shard_file(project_id, "tasks.csv"), _shard_file(project_id, "comments.csv")]
+
+    migrated = []
+    with _write_lock:
+        write_queue.flush()
+        for arq in tables:
+            if VERSION_FIELD in (_csv_header(arq) or [VERSION_FIELD]):
+                continue
+            with locked_file(arq):
+                if VERSION_FIELD in (_csv_header(arq) or [VERSION_FIELD]):
+                    continue
+                rows = _parse_csv_file(arq)
+                _first_version(rows)
+                overwrite_csv(arq, _table_fieldnames(arq), rows)
+                migrated.append(arq)
+
+        for kind, fieldnames in (("tasks", TASKS_FIELDNAMES), ("comments", COMMENTS_FIELDNAMES)):
+            for path in glob.glob(os.path.join(ARCHIVE_PATH, f"project-*-{kind}.csv.gz")):
+                if VERSION_FIELD in (_csv_header(path, gzip.open) or [VERSION_FIELD]):
+                    continue
+                with locked_file(path):
+                    if VERSION_FIELD in (_csv_header(path, gzip.open) or [VERSION_FIELD]):
+                        continue
+                    project_id = os.path.basename(path)[len("project-"):-len(f"-{kind}.csv.gz")]
+                    rows = _read_archive(project_id, kind)
+                    _first_version(rows)
+                    _rewrite_archive(project_id, kind, fieldnames, rows)
+                    migrated.append(path)
+
+    return migrated
+
+
+# pos-escrita: versoes (invalidam ETags e caches) e historico de alteracoes
+
+def in_transaction():
+    return _transaction.get() is not None
+
+
+def _bump(*scopes):
+    tx = _transaction.get()
+    if tx is not None:
+        tx["scopes"].update(scopes)
+    bump(*scopes)
+
+
+def _after_write(entity, op, entity_id, data=None, project_id=None, user_id=None):
+    scopes = []
+    if project_id is not None:
+        scopes.append(project_scope(project_id))
+    if entity in ("user", "project") and user_id is not None:
+        scopes.append(user_scope(user_id))
+    _bump(*scopes)
+
+    if user_id is None and project_id is not None:
+        user_id = _owner_of_project(project_id)
+    if user_id is not None:
+        record_change(user_id, entity, op, entity_id, project_id, data)
+
+
+def _after_write_many(entity, op, id_field, rows, project_id):
+    # mesmo que _after_write, para varias linhas do mesmo projeto
+    if not rows:
+        return
+    _bump(project_scope(project_id))
+
+    user_id = _owner_of_project(project_id)
+    if user_id is not None:
+        record_changes(user_id, [(entity, op, row.get(id_field), project_id, None if op == "delete" else row) for row in rows])
+
+
+def _owner_of_project(project_id):
+    project = find_project_by_id(project_id)
+    return project.get("user_id") if project else None
+
+
+def _project_of_list(list_id):
+    lista = find_list_by_id(list_id)
+    return lista.get("project_id") if lista else None
+
+
+def _project_of_task(task_id):
+    task = find_task_by_id(task_id)
+    return _project_of_list(task.get("list_id")) if task else None
+
+
+# shards por projeto (SHARDED_STORAGE): tasks e comentarios sao roteados
+# para os arquivos do projeto. O diretorio db/shards/directory.csv diz o
+# projeto de cada task/comentario (para as buscas por id) e e lido de forma
+# incremental, como o historico. Entradas de linhas ja apagadas sao
+# toleradas: a busca no shard simplesmente nao encontra a linha. Sem shards,
+# as funcoes abaixo devolvem as tabelas globais tasks.csv/comments.csv.
+
+_shards = {"ready": False}
+_directory = {"key": None, "ino": None, "offset": 0, "projects": {"task": {}, "comment": {}}, "max_id": {"task": 0, "comment": 0}}
+_directory_lock = threading.Lock()
+
+
+def _sharded():
+    if not SHARDED_STORAGE:
+        return False
+    if not _shards["ready"]:
+        migrate_to_shards()
+    return True
+
+
+def _shard_file(project_id, name, shards_path=SHARDS_PATH):
+    return os.path.join(shards_path, f"project-{project_id}", name)
+
+
+def _tasks_file(project_id):
+    if not _sharded():
+        return TASKS
+    return _shard_file(project_id, "tasks.csv") if project_id is not None else None
+
+
+def _comments_file(project_id):
+    if not _sharded():
+        return COMMENTS
+    return _shard_file(project_id, "comments.csv") if project_id is not None else None
+
+
+def _shard_projects(shards_path=SHARDS_PATH):
+    # projetos com shard em disco, em ordem de id
+    try:
+        names = os.listdir(shards_path)
+    except FileNotFoundError:
         return []
+    project_ids = [name[len("project-"):] for name in names if name.startswith("project-")]
+    return sorted(project_ids, key=lambda pid: int(pid) if pid.isdigit() else 0)
+
+
+def _shard_pairs(project_id=None):
+    # (tasks, comentarios) de um projeto, ou de todos sem project_id
+    if not _sharded():
+        return [(TASKS, COMMENTS)]
+    project_ids = [str(project_id)] if project_id is not None else _shard_projects()
+    return [(_shard_file(pid, "tasks.csv"), _shard_file(pid, "comments.csv")) for pid in project_ids]
+
+
+def data_files():
+    # todas as tabelas principais, das menores para as maiores
+    pairs = _shard_pairs()
+    return [USERS, PROJECTS, LISTS] + [tasks for tasks, _ in pairs] + [comments for _, comments in pairs]
+
+
+def _sync_directory():
+    # le apenas as entradas acrescentadas desde a ultima leitura; se o
+    # arquivo foi reconstruido (outro inode ou menor), rele do inicio
+    key = _file_key(SHARD_DIRECTORY)
+    if _directory["key"] == key:
+        return
+    try:
+        file = open(SHARD_DIRECTORY, "rb")
+    except FileNotFoundError:
+        return
+
+    with file:
+        stat = os.fstat(file.fileno())
+        if stat.st_ino != _directory["ino"] or stat.st_size < _directory["offset"]:
+            _directory.update({"ino": stat.st_ino, "offset": 0,
+                               "projects": {"task": {}, "comment": {}}, "max_id": {"task": 0, "comment": 0}})
+        file.seek(_directory["offset"])
+        chunk = file.read()
+
+    _directory["key"] = key
+    end = chunk.rfind(b"\n") + 1
+    if not end:
+        return
+
+    for row in csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline="")):
+        if len(row) != 3 or row == SHARD_DIRECTORY_FIELDNAMES:
+            continue
+        entity, entity_id, project_id = row
+        projects = _directory["projects"].get(entity)
+        if projects is None:
+            continue
+        projects[entity_id] = project_id
+        if entity_id.isdigit():
+            _directory["max_id"][entity] = max(_directory["max_id"][entity], int(entity_id))
+
+    _directory["offset"] += end
+
+
+def _shard_of(entity, entity_id):
+    # projeto de uma task/comentario segundo o diretorio (None se ausente)
+    with _directory_lock:
+        _sync_directory()
+        return _directory["projects"][entity].get(str(entity_id))
+
+
+def _task_file_of(task_id):
+    if not _sharded():
+        return TASKS
+    return _tasks_file(_shard_of("task", task_id))
+
+
+def _task_pair_of(task_id):
+    # (tasks, comentarios) do projeto de uma task
+    if not _sharded():
+        return TASKS, COMMENTS
+    project_id = _shard_of("task", task_id)
+    return _shard_pairs(project_id)[0] if project_id is not None else (None, None)
+
+
+def _comment_file_of(comment_id):
+    if not _sharded():
+        return COMMENTS
+    return _comments_file(_shard_of("comment", comment_id))
+
+
+def _tasks_file_of_list(list_id):
+    if not _sharded():
+        return TASKS
+    lista = _find_by_id(LISTS, list_id)
+    return _tasks_file(lista.get("project_id")) if lista else None
+
+
+def _shard_last_id(entity):
+    with _directory_lock:
+        _sync_directory()
+        max_id = _directory["max_id"][entity]
+    name = os.path.basename(TASKS if entity == "task" else COMMENTS)
+    return max(max_id, _archived_max_ids().get(name, 0))
+
+
+def _register_shard(entity, id_field, rows, project_id):
+    # acrescenta as linhas ao diretorio antes de grava-las no shard: se o
+    # processo cair no meio, sobra uma entrada sem linha (inofensiva), nunca
+    # uma linha inalcancavel
+    if not _sharded() or not rows:
+        return
+    os.makedirs(os.path.dirname(_shard_file(project_id, "tasks.csv")), exist_ok=True)
+    entries = [{"entity": entity, "entity_id": row.get(id_field), "project_id": str(project_id)} for row in rows]
+    with locked_file(SHARD_DIRECTORY):
+        save_csv_rows(SHARD_DIRECTORY, SHARD_DIRECTORY_FIELDNAMES, entries)
+
+
+def _drop_shard(project_id):
+    # cascata do delete de projeto: os arquivos do shard sao apagados direto,
+    # sem reescrever nenhuma outra tabela
+    folder = os.path.dirname(_shard_file(project_id, "tasks.csv"))
+    with _write_lock:
+        write_queue.flush()
+        for name in ("comments.csv", "tasks.csv"):
+            arq = os.path.join(folder, name)
+            _keep_for_rollback(arq)
+            with locked_file(arq):
+                # a trava do arquivo tambem sai, para a pasta poder ser
+                # removida (numa transacao ela fica ate o fim, para o rollback)
+                paths = (arq, _snapshot_path(arq)) if in_transaction() else (arq, _snapshot_path(arq), arq + ".lock")
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+            _drop_segment(arq)
+            _written(arq)
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+
+def rebuild_shard_directory(shards_path=SHARDS_PATH):
+    # reescreve o diretorio a partir dos shards em disco (descarta entradas
+    # de linhas apagadas). Usado na migracao e pelo fsck --repair.
+    entries = []
+    for project_id in _shard_projects(shards_path):
+        for entity, name in (("task", "tasks.csv"), ("comment", "comments.csv")):
+            id_field = ID_FIELDS_BY_NAME[name]
+            for row in _parse_csv_file(_shard_file(project_id, name, shards_path)):
+                entries.append({"entity": entity, "entity_id": row.get(id_field), "project_id": project_id})
+
+    os.makedirs(shards_path, exist_ok=True)
+    overwrite_csv(os.path.join(shards_path, os.path.basename(SHARD_DIRECTORY)), SHARD_DIRECTORY_FIELDNAMES, entries)
+    return len(entries)
+
+
+def migrate_to_shards():
+    # move as linhas de tasks.csv/comments.csv para os shards dos projetos.
+    # Os arquivos globais ficam como *.migrated; linhas orfas (lista ou task
+    # inexistente) so ficam neles. Pode ser repetida apos uma interrupcao.
+    os.makedirs(SHARDS_PATH, exist_ok=True)
+    with _write_lock, locked_file(SHARD_DIRECTORY):
+        if _shards["ready"]:
+            return
+        if os.path.exists(TASKS) or os.path.exists(COMMENTS):
+            write_queue.flush()
+            project_of_list = {l.get("list_id"): l.get("project_id") for l in read_csv(LISTS, fresh=True)}
+            project_of_task = {}
+            by_project = {}
+            for task in _parse_csv_file(TASKS):
+                project_id = project_of_list.get(task.get("list_id"))
+                if project_id is not None:
+                    project_of_task[task.get("task_id")] = project_id
+                    by_project.setdefault(project_id, {"tasks.csv": [], "comments.csv": []})["tasks.csv"].append(task)
+            for comment in _parse_csv_file(COMMENTS):
+                project_id = project_of_task.get(comment.get("task_id"))
+                if project_id is not None:
+                    by_project[project_id]["comments.csv"].append(comment)
+
+            for project_id, tables in by_project.items():
+                os.makedirs(os.path.dirname(_shard_file(project_id, "tasks.csv")), exist_ok=True)
+                for name, rows in tables.items():
+                    if not rows:
+                        continue
+                    arq = _shard_file(project_id, name)
+                    id_field = ID_FIELDS_BY_NAME[name]
+                    existing = read_csv(arq, fresh=True)
+                    known = {r.get(id_field) for r in existing}
+                    new_rows = [r for r in rows if r.get(id_field) not in known]
+                    overwrite_csv(arq, FIELDNAMES_BY_TABLE[TASKS if name == "tasks.csv" else COMMENTS],
+                                  _insert_by_id(existing, new_rows, id_field))
+
+            rebuild_shard_directory()
+            for arq in (TASKS, COMMENTS):
+                if os.path.exists(arq):
+                    os.replace(arq, arq + ".migrated")
+                    _drop_segment(arq)
+                    _written(arq)
+        _shards["ready"] = True
+
+
+# soft delete: lapides (tombstones) em db/tombstones.csv. Uma entidade com
+# lapide, ou cujo ancestral (usuario > projeto > lista > task > comentario)
+# tenha lapide, fica escondida de todas as funcoes find_*. O purger apaga
+# as subarvores de verdade e remove as lapides (ver purge_deleted).
+
+ENTITY_TABLES = {
+    "user": (USERS, "user_id", None),
+    "project": (PROJECTS, "project_id", ("user", "user_id")),
+    "list": (LISTS, "list_id", ("project", "project_id")),
+    "task": (TASKS, "task_id", ("list", "list_id")),
+    "comment": (COMMENTS, "comment_id", ("task", "task_id")),
+}
+
+# entidades cujas lapides podem esconder uma linha de cada tipo
+_ANCESTRY = {
+    "user": ("user",),
+    "project": ("user", "project"),
+    "list": ("user", "project", "list"),
+    "task": ("user", "project", "list", "task"),
+    "comment": ("user", "project", "list", "task", "comment"),
+}
+
+_tombstones = {"key": None, "deleted": {entity: set() for entity in ENTITY_TABLES}}
+_tombstones_lock = threading.Lock()
+
+
+def get_deleted():
+    # {entidade: ids com lapide}; relido apenas quando o arquivo muda
+    key = _file_key(TOMBSTONES)
+    if _tombstones["key"] == key:
+        return _tombstones["deleted"]
+
+    with _tombstones_lock:
+        if _tombstones["key"] != key:
+            deleted = {entity: set() for entity in ENTITY_TABLES}
+            for row in _parse_csv_file(TOMBSTONES):
+                if row.get("entity") in deleted:
+                    deleted[row["entity"]].add(row.get("entity_id"))
+            _tombstones["deleted"] = deleted
+            _tombstones["key"] = key
+        return _tombstones["deleted"]
+
+
+def _find_row(entity, entity_id):
+    # linha crua (sem filtrar lapides); tasks e comentarios podem estar em shards
+    if entity == "task":
+        arq = _task_file_of(entity_id)
+    elif entity == "comment":
+        arq = _comment_file_of(entity_id)
+    else:
+        arq = ENTITY_TABLES[entity][0]
+    return _find_by_id(arq, entity_id) if arq else None
+
+
+def _is_hidden(entity, row, deleted, memo):
+    _, id_field, parent = ENTITY_TABLES[entity]
+    if row.get(id_field) in deleted[entity]:
+        return True
+    if parent is None:
+        return False
+
+    parent_entity, parent_field = parent
+    memo_key = (parent_entity, row.get(parent_field))
+    if memo_key not in memo:
+        memo[memo_key] = False
+        if any(deleted[e] for e in _ANCESTRY[parent_entity]):
+            parent_row = _find_row(parent_entity, row.get(parent_field))
+            memo[memo_key] = parent_row is not None and _is_hidden(parent_entity, parent_row, deleted, memo)
+    return memo[memo_key]
+
+
+def _visible(entity, rows):
+    # remove as linhas escondidas por lapides (sem lapides: nao custa nada)
+    deleted = get_deleted()
+    if not any(deleted[e] for e in _ANCESTRY[entity]):
+        return rows
+    memo = {}
+    return [row for row in rows if not _is_hidden(entity, row, deleted, memo)]
+
+
+def _visible_one(entity, row):
+    if row is None:
+        return None
+    return row if _visible(entity, [row]) else None
+
+
+def _soft_delete(entity, entity_id, project_id=None, user_id=None):
+    # grava a lapide e devolve True; False quando o delete deve ser fisico
+    # (soft delete desligado ou dentro de uma transacao, que precisa poder
+    # desfazer tudo pelos arquivos)
+    if not SOFT_DELETE or in_transaction():
+        return False
+
+    with _write_lock, locked_file(TOMBSTONES):
+        save_csv(TOMBSTONES, TOMBSTONE_FIELDNAMES, {
+            "entity": entity,
+            "entity_id": str(entity_id),
+            "deleted_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+    _after_write(entity, "delete", str(entity_id), project_id=project_id, user_id=user_id)
+    return True
+
+
+def pending_purges():
+    return sum(len(ids) for ids in get_deleted().values())
+
+
+def purge_deleted(limit=100):
+    # apaga de verdade as subarvores de ate `limit` lapides, com uma unica
+    # reescrita de cada tabela, e remove essas lapides. As remocoes ja foram
+    # publicadas no historico quando as lapides foram gravadas. Devolve o
+    # numero de lapides processadas.
+    with _write_lock, locked_file(TOMBSTONES):
+        tombstones = _parse_csv_file(TOMBSTONES)
+        batch = tombstones[:limit]
+        if not batch:
+            return 0
+
+        targets = {entity: set() for entity in ENTITY_TABLES}
+        for tombstone in batch:
+            if tombstone.get("entity") in targets:
+                targets[tombstone["entity"]].add(tombstone.get("entity_id"))
+
+        # expande de pai para filho e grava de filho para pai: se o processo
+        # cair no meio, nenhuma linha fica sem o pai. Cada tabela e relida
+        # sob a sua trava na hora de ser reescrita, para nao desfazer
+        # escritas feitas por outros workers desde a expansao.
+        tables = {}
+        for entity in ("user", "project", "list"):
+            arq, id_field, parent = ENTITY_TABLES[entity]
+            rows = read_csv(arq, fresh=True)
+            removed = targets[entity]
+            if parent is not None:
+                parent_entity, parent_field = parent
+                removed.update(r.get(id_field) for r in rows if r.get(parent_field) in targets[parent_entity])
+            tables[entity] = (arq, rows, removed)
+
+        # tasks e comentarios: uma reescrita por shard afetado (ou das tabelas
+        # globais, sem shards); shards de projetos removidos sao apagados inteiros
+        for tasks_arq, comments_arq in _purge_pairs(targets, tables["list"][1]):
+            removed_tasks = targets["task"] | {t.get("task_id") for t in read_csv(tasks_arq, fresh=True)
+                                               if t.get("list_id") in targets["list"]}
+            with _rewriting(comments_arq):
+                comments = read_csv(comments_arq, fresh=True)
+                remaining_comments = [c for c in comments
+                                      if c.get("comment_id") not in targets["comment"] and c.get("task_id") not in removed_tasks]
+                if len(remaining_comments) != len(comments):
+                    overwrite_csv(comments_arq, COMMENTS_FIELDNAMES, remaining_comments)
+            with _rewriting(tasks_arq):
+                tasks = read_csv(tasks_arq, fresh=True)
+                remaining_tasks = [t for t in tasks
+                                   if t.get("task_id") not in removed_tasks and t.get("list_id") not in targets["list"]]
+                if len(remaining_tasks) != len(tasks):
+                    overwrite_csv(tasks_arq, TASKS_FIELDNAMES, remaining_tasks)
+        if _sharded():
+            for project_id in targets["project"]:
+                _drop_shard(project_id)
+
+        for entity in ("list", "project", "user"):
+            arq, _, removed = tables[entity]
+            id_field = ENTITY_TABLES[entity][1]
+            with _rewriting(arq):
+                rows = read_csv(arq, fresh=True)
+                remaining = [r for r in rows if r.get(id_field) not in removed]
+                if len(remaining) != len(rows):
+                    overwrite_csv(arq, FIELDNAMES_BY_TABLE[arq], remaining)
+
+        # tasks arquivadas das subarvores removidas
+        for project_id in targets["project"]:
+            _drop_project_archive(project_id)
+        for lista in tables["list"][1]:
+            if lista.get("list_id") in targets["list"] and lista.get("project_id") not in targets["project"]:
+                _drop_archived_lists(lista.get("project_id"), {lista.get("list_id")})
+
+        overwrite_csv(TOMBSTONES, TOMBSTONE_FIELDNAMES, tombstones[limit:])
+        return len(batch)
+
+
+def _purge_pairs(targets, lists_data):
+    # arquivos de tasks/comentarios que um lote do purge precisa reescrever
+    if not _sharded():
+        return [(TASKS, COMMENTS)]
+    project_ids = {l.get("project_id") for l in lists_data if l.get("list_id") in targets["list"]}
+    project_ids.update(_shard_of("task", task_id) for task_id in targets["task"])
+    project_ids.update(_shard_of("comment", comment_id) for comment_id in targets["comment"])
+    project_ids.discard(None)
+    return [pair for project_id in sorted(project_ids - targets["project"]) for pair in _shard_pairs(project_id)]
 
 
 # usuarios
 
 def save_user(user):
-    save_csv(USERS, USER_FIELDNAMES, user)
+    _create_rows(USERS, USER_FIELDNAMES, "user_id", [user])
+    shard_map.claim_email(user.get("email"))
+    _after_write("user", "create", user.get("user_id"), user, user_id=user.get("user_id"))
 
 
 def find_user_by_email(email):
-    users = read_csv(USERS)
+    users = _visible("user", read_csv(USERS))
     for user in users:
         if user.get("email") == email:
             return user
@@ -72,77 +1781,60 @@ def find_user_by_email(email):
 
 
 def find_user_by_id(user_id):
-    target_id = str(user_id)
-    users = read_csv(USERS)
-    for user in users:
-        if user.get("user_id") == target_id:
-            return user
-    return None
+    return _visible_one("user", _find_by_id(USERS, user_id))
 
 
-def get_next_user_id():
-    users = read_csv(USERS)
-    if not users:
-        return '1'
-    max_id = max(int(u.get("user_id", 0)) for u in users)
-    return str(max_id + 1)
-
-
-def update_user_data(user_id, new_data):
+def update_user_data(user_id, new_data, expected_version=None):
     target_id = str(user_id)
-    users = read_csv(USERS)
-    updated = []
-    updated_user = None
-    for user in users:
-        if user.get("user_id") == target_id:
-            user.update(new_data)
-            updated_user = user
-        updated.append(user)
+    with _rewriting(USERS):
+        users = read_csv(USERS, fresh=True)
+        updated_user = next((u for u in users if u.get("user_id") == target_id), None)
+        _check_version("user", target_id, updated_user, expected_version)
+        if updated_user is None:
+            return None
 
-    overwrite_csv(USERS, USER_FIELDNAMES, updated)
+        old_email = updated_user.get("email")
+        _apply_update(updated_user, new_data)
+        overwrite_csv(USERS, USER_FIELDNAMES, users)
+
+    if updated_user.get("email") != old_email:
+        shard_map.claim_email(updated_user.get("email"), old_email)
+    _after_write("user", "update", target_id, updated_user, user_id=target_id)
 
     return updated_user
 
 
 def delete_user_data(user_id):
     target_user_id = str(user_id)
-    
-    all_projects = read_csv(PROJECTS)
+    if _soft_delete("user", target_user_id, user_id=target_user_id):
+        return
+
+    all_projects = read_csv(PROJECTS, fresh=True)
     for p in all_projects:
         if str(p.get('user_id')) == target_user_id:
             delete_project_data(p['project_id'])
 
-    users = read_csv(USERS)
-    remaining_users = [u for u in users if str(u.get("user_id")) != target_user_id]
-    overwrite_csv(USERS, USER_FIELDNAMES, remaining_users)
+    with _rewriting(USERS):
+        users = read_csv(USERS, fresh=True)
+        remaining_users = [u for u in users if str(u.get("user_id")) != target_user_id]
+        overwrite_csv(USERS, USER_FIELDNAMES, remaining_users)
+    _after_write("user", "delete", target_user_id, user_id=target_user_id)
 
 
 # projetos
 
 def save_project(project):
-    save_csv(PROJECTS, PROJECT_FIELDNAMES, project)
-
-
-def get_next_project_id():
-    projects = read_csv(PROJECTS)
-    if not projects:
-        return '1'
-    max_id = max(int(p.get("project_id", 0)) for p in projects)
-    return str(max_id + 1)
+    _create_rows(PROJECTS, PROJECT_FIELDNAMES, "project_id", [project])
+    _after_write("project", "create", project.get("project_id"), project, project.get("project_id"), project.get("user_id"))
 
 
 def find_project_by_id(project_id):
-    target_id = str(project_id)
-    projects = read_csv(PROJECTS)
-    for project in projects:
-        if project.get("project_id") == target_id:
-            return project
-    return None
+    return _visible_one("project", _find_by_id(PROJECTS, project_id))
 
 
 def find_projects_by_user_id(user_id):
     target_user_id = str(user_id)
-    projects = read_csv(PROJECTS)
+    projects = _visible("project", read_csv(PROJECTS))
     user = find_user_by_id(user_id)
 
     my_projects = []
@@ -155,186 +1847,857 @@ def find_projects_by_user_id(user_id):
     return my_projects
 
 
-def update_project_data(project_id, new_data):
+def update_project_data(project_id, new_data, expected_version=None):
     target_id = str(project_id)
-    projects = read_csv(PROJECTS)
-    updated = []
+    with _rewriting(PROJECTS):
+        projects = read_csv(PROJECTS, fresh=True)
+        updated_project = next((p for p in projects if p.get("project_id") == target_id), None)
+        _check_version("project", target_id, updated_project, expected_version)
+        if updated_project is None:
+            return None
 
-    for project in projects:
-        if project.get("project_id") == target_id:
-            project.update(new_data)
-        updated.append(project)
+        _apply_update(updated_project, new_data)
+        overwrite_csv(PROJECTS, PROJECT_FIELDNAMES, projects)
 
-    overwrite_csv(PROJECTS, PROJECT_FIELDNAMES, updated)
+    _after_write("project", "update", target_id, updated_project, target_id, updated_project.get("user_id"))
+    return updated_project
 
 def delete_project_data(project_id):
     target_proj_id = str(project_id)
-    all_lists = read_csv(LISTS)
+    if _soft_delete("project", target_proj_id, target_proj_id, _owner_of_project(target_proj_id)):
+        return
+
+    all_lists = read_csv(LISTS, fresh=True)
 
     lists_to_remove = [l for l in all_lists if str(l.get('project_id')) == target_proj_id]
-    
-    for lista in lists_to_remove:
-        delete_list_data(lista['list_id'])
 
-    projects = read_csv(PROJECTS)
-    remaining_projects = [p for p in projects if str(p.get("project_id")) != target_proj_id]
-    overwrite_csv(PROJECTS, PROJECT_FIELDNAMES, remaining_projects)
+    if _sharded():
+        # com shards, as tasks e comentarios do projeto somem com o shard
+        _drop_project_shard(target_proj_id, lists_to_remove)
+    else:
+        for lista in lists_to_remove:
+            delete_list_data(lista['list_id'])
 
+    with _rewriting(PROJECTS):
+        projects = read_csv(PROJECTS, fresh=True)
+        owner_id = next((p.get("user_id") for p in projects if str(p.get("project_id")) == target_proj_id), None)
+        remaining_projects = [p for p in projects if str(p.get("project_id")) != target_proj_id]
+        overwrite_csv(PROJECTS, PROJECT_FIELDNAMES, remaining_projects)
+    _drop_project_archive(target_proj_id)
+    _after_write("project", "delete", target_proj_id, project_id=target_proj_id, user_id=owner_id)
 
-# listas
 
-def get_next_list_id():
-    lists_data = read_csv(LISTS)
-    if not lists_data:
-        return '1'
-    max_id = max(int(l.get("list_id", 0)) for l in lists_data)
-    return str(max_id + 1)
+def _drop_project_shard(project_id, lists_to_remove):
+    tasks_arq, comments_arq = _shard_pairs(project_id)[0]
+    removed_comments = read_csv(comments_arq, fresh=True)
+    removed_tasks = read_csv(tasks_arq, fresh=True)
+
+    _drop_shard(project_id)
+    if lists_to_remove:
+        removed_ids = {l.get("list_id") for l in lists_to_remove}
+        with _rewriting(LISTS):
+            all_lists = read_csv(LISTS, fresh=True)
+            overwrite_csv(LISTS, LIST_FIELDNAMES, [l for l in all_lists if l.get("list_id") not in removed_ids])
+
+    _after_write_many("comment", "delete", "comment_id", removed_comments, project_id)
+    _after_write_many("task", "delete", "task_id", removed_tasks, project_id)
+    _after_write_many("list", "delete", "list_id", lists_to_remove, project_id)
+
+
+# listas
 
 def save_list(lista):
-    save_csv(LISTS, LIST_FIELDNAMES, lista)
+    _create_rows(LISTS, LIST_FIELDNAMES, "list_id", [lista])
+    _after_write("list", "create", lista.get("list_id"), lista, lista.get("project_id"))
 
 
 def find_lists_by_project_id(project_id):
     target_id = str(project_id)
     lists_data = read_csv(LISTS)
-    return [l for l in lists_data if l.get("project_id") == target_id]
+    return _visible("list", [l for l in lists_data if l.get("project_id") == target_id])
 
 
 def find_list_by_id(list_id):
-    target_id = str(list_id)
-    lists_data = read_csv(LISTS)
-    for lista in lists_data:
-        if lista.get("list_id") == target_id:
-            return lista
-    return None
+    return _visible_one("list", _find_by_id(LISTS, list_id))
 
 
-def update_list_data(list_id, new_data):
+def update_list_data(list_id, new_data, expected_version=None):
     target_id = str(list_id)
-    lists_data = read_csv(LISTS)
-    updated = []
+    with _rewriting(LISTS):
+        lists_data = read_csv(LISTS, fresh=True)
+        updated_list = next((l for l in lists_data if l.get("list_id") == target_id), None)
+        _check_version("list", target_id, updated_list, expected_version)
+        if updated_list is None:
+            return None
 
-    for lista in lists_data:
-        if lista.get("list_id") == target_id:
-            lista.update(new_data)
-        updated.append(lista)
+        _apply_update(updated_list, new_data)
+        overwrite_csv(LISTS, LIST_FIELDNAMES, lists_data)
 
-    overwrite_csv(LISTS, LIST_FIELDNAMES, updated)
+    _after_write("list", "update", target_id, updated_list, updated_list.get("project_id"))
+    return updated_list
 
 def delete_list_data(list_id):
     target_list_id = str(list_id)
-    all_tasks = read_csv(TASKS)
-    
-    tasks_in_list = [t for t in all_tasks if str(t.get('list_id')) == target_list_id]
-    
-    for task in tasks_in_list:
-        delete_task_data(task['task_id'])
+    if _soft_delete("list", target_list_id, _project_of_list(target_list_id)):
+        return
 
-    lists_data = read_csv(LISTS)
-    remaining_lists = [l for l in lists_data if str(l.get("list_id")) != target_list_id]
-    overwrite_csv(LISTS, LIST_FIELDNAMES, remaining_lists)
+    lists_data = read_csv(LISTS, fresh=True)
+    project_id = next((l.get("project_id") for l in lists_data if str(l.get("list_id")) == target_list_id), None)
+    tasks_arq = _tasks_file(project_id)
+    all_tasks = read_csv(tasks_arq, fresh=True) if tasks_arq else []
 
+    tasks_in_list = [t for t in all_tasks if str(t.get('list_id')) == target_list_id]
 
-# tarefas
+    if tasks_in_list:
+        delete_tasks_data([t['task_id'] for t in tasks_in_list], project_id)
 
-def get_next_task_id():
-    tasks = read_csv(TASKS)
-    if not tasks:
-        return '1'
-    max_id = max(int(t.get("task_id",0)) for t in tasks)
+    with _rewriting(LISTS):
+        lists_data = read_csv(LISTS, fresh=True)
+        remaining_lists = [l for l in lists_data if str(l.get("list_id")) != target_list_id]
+        overwrite_csv(LISTS, LIST_FIELDNAMES, remaining_lists)
+    if project_id is not None:
+        _drop_archived_lists(project_id, {target_list_id})
+        _after_write("list", "delete", target_list_id, project_id=project_id)
 
-    return str(max_id + 1)
 
+# tarefas
 
 def save_task(task):
-    save_csv(TASKS, TASKS_FIELDNAMES, task)
+    project_id = _project_of_list(task.get("list_id"))
+    _create_rows(_tasks_file(project_id), TASKS_FIELDNAMES, "task_id", [task], "task", project_id)
+    _after_write("task", "create", task.get("task_id"), task, project_id)
+
+
+def save_tasks(tasks, project_id):
+    # todas as tasks devem pertencer a listas do projeto informado; os ids
+    # sao atribuidos em sequencia, na ordem da lista
+    _create_rows(_tasks_file(project_id), TASKS_FIELDNAMES, "task_id", tasks, "task", project_id)
+    _after_write_many("task", "create", "task_id", tasks, str(project_id))
 
 
 def find_tasks_by_list_id(list_id):
     target_id = str(list_id)
-    tasks = read_csv(TASKS)
-    return [t for t in tasks if t.get("list_id") == target_id]
+    arq = _tasks_file_of_list(target_id)
+    if arq is None:
+        return []
 
+    def load():
+        tasks = read_csv(arq)
+        return [t for t in tasks if t.get("list_id") == target_id]
 
-def find_task_by_id(task_id):
-    target_id = str(task_id)
-    tasks = read_csv(TASKS)
-    for task in tasks:
-        if task.get("task_id") == target_id:
-            return task
-    return None
+    return _visible("task", _single_flight(("tasks_by_list", target_id, arq, _file_key(arq)), load))
 
 
-def update_task_data(task_id, new_data):
-    target_id = str(task_id)
-    tasks = read_csv(TASKS)
-    updated = []
+def find_task_by_id(task_id):
+    arq = _task_file_of(task_id)
+    return _visible_one("task", _find_by_id(arq, task_id)) if arq else None
 
-    for task in tasks:
-        if task.get("task_id") == target_id:
-            task.update(new_data)
-        updated.append(task)
 
-    overwrite_csv(TASKS, TASKS_FIELDNAMES, updated)
+def update_task_data(task_id, new_data, expected_version=None):
+    target_id = str(task_id)
+    arq = _task_file_of(target_id)
+    if arq is None:
+        _check_version("task", target_id, None, expected_version)
+        return None
+
+    with _rewriting(arq):
+        tasks = read_csv(arq, fresh=True)
+        updated_task = next((t for t in tasks if t.get("task_id") == target_id), None)
+        _check_version("task", target_id, updated_task, expected_version)
+        if updated_task is None:
+            return None
+
+        _apply_update(updated_task, new_data)
+        overwrite_csv(arq, TASKS_FIELDNAMES, tasks)
+
+    _after_write("task", "update", target_id, updated_task, _project_of_list(updated_task.get("list_id")))
+    return updated_task
+
+
+def find_tasks_by_ids(task_ids):
+    target_ids = {str(t) for t in task_ids}
+    if _sharded():
+        files = {_task_file_of(task_id) for task_id in target_ids} - {None}
+    else:
+        files = {TASKS}
+    tasks = [t for arq in sorted(files) for t in read_csv(arq) if t.get("task_id") in target_ids]
+    return {t.get("task_id"): t for t in _visible("task", tasks)}
+
+
+def update_tasks_bulk(changes, project_id, expected_versions=None):
+    # changes: {task_id: new_data}; todas as tasks do mesmo projeto,
+    # gravadas com uma unica reescrita do arquivo. expected_versions
+    # ({task_id: versao}): se alguma task estiver em outra versao, nenhuma
+    # e alterada (StaleVersionError)
+    changes = {str(k): v for k, v in changes.items()}
+    expected_versions = {str(k): v for k, v in (expected_versions or {}).items()}
+    arq = _tasks_file(str(project_id))
+
+    with _rewriting(arq):
+        tasks = read_csv(arq, fresh=True)
+        by_id = {t.get("task_id"): t for t in tasks if t.get("task_id") in changes}
+        for task_id, expected_version in expected_versions.items():
+            _check_version("task", task_id, by_id.get(task_id), expected_version)
+
+        updated_tasks = []
+        for task in tasks:
+            new_data = changes.get(task.get("task_id"))
+            if new_data is not None:
+                _apply_update(task, new_data)
+                updated_tasks.append(task)
+
+        if updated_tasks:
+            overwrite_csv(arq, TASKS_FIELDNAMES, tasks)
+
+    _after_write_many("task", "update", "task_id", updated_tasks, str(project_id))
+    return updated_tasks
 
 
 def delete_task_data(task_id):
     target_task_id = str(task_id)
-    all_comments = read_csv(COMMENTS)
+    if _soft_delete("task", target_task_id, _project_of_task(target_task_id)):
+        return
+
+    tasks_arq, comments_arq = _task_pair_of(target_task_id)
+    if tasks_arq is None:
+        return
+
+    all_comments = read_csv(comments_arq, fresh=True)
     
     comments_to_remove = [c for c in all_comments if str(c.get('task_id')) == target_task_id]
     
     for comment in comments_to_remove:
         delete_comment_data(comment['comment_id'])
 
-    all_tasks = read_csv(TASKS)
-    remaining_tasks = [t for t in all_tasks if str(t.get("task_id")) != target_task_id]
-    overwrite_csv(TASKS, TASKS_FIELDNAMES, remaining_tasks)
+    with _rewriting(tasks_arq):
+        all_tasks = read_csv(tasks_arq, fresh=True)
+        list_id = next((t.get("list_id") for t in all_tasks if str(t.get("task_id")) == target_task_id), None)
+        remaining_tasks = [t for t in all_tasks if str(t.get("task_id")) != target_task_id]
+        overwrite_csv(tasks_arq, TASKS_FIELDNAMES, remaining_tasks)
+    if list_id is not None:
+        _after_write("task", "delete", target_task_id, project_id=_project_of_list(list_id))
+
+
+def delete_tasks_data(task_ids, project_id):
+    # remove as tasks e seus comentarios com uma unica reescrita de cada arquivo
+    target_ids = {str(t) for t in task_ids}
+    if project_id is None and _sharded():
+        return []
+    tasks_arq, comments_arq = _shard_pairs(project_id)[0]
+
+    # cada arquivo e relido e reescrito sob a sua trava (um de cada vez, os
+    # comentarios antes das tasks): alteracoes concorrentes de outras linhas
+    # nunca sao desfeitas
+    with _rewriting(comments_arq):
+        all_comments = read_csv(comments_arq, fresh=True)
+        removed_comments = [c for c in all_comments if str(c.get("task_id")) in target_ids]
+        if removed_comments:
+            remaining_comments = [c for c in all_comments if str(c.get("task_id")) not in target_ids]
+            overwrite_csv(comments_arq, COMMENTS_FIELDNAMES, remaining_comments)
+
+    with _rewriting(tasks_arq):
+        all_tasks = read_csv(tasks_arq, fresh=True)
+        removed_tasks = [t for t in all_tasks if str(t.get("task_id")) in target_ids]
+        if removed_tasks:
+            remaining_tasks = [t for t in all_tasks if str(t.get("task_id")) not in target_ids]
+            overwrite_csv(tasks_arq, TASKS_FIELDNAMES, remaining_tasks)
+
+    if project_id is not None:
+        _after_write_many("comment", "delete", "comment_id", removed_comments, str(project_id))
+        _after_write_many("task", "delete", "task_id", removed_tasks, str(project_id))
+
+    return removed_tasks
+
+
+# indice de tasks por usuario (usuario -> projetos -> listas -> tasks). Cada
+# usuario tem a sua entrada, refeita so quando o escopo dele ou o de algum
+# dos seus projetos muda (contadores de versao, compartilhados entre os
+# workers): uma escrita num projeto nao invalida as tasks dos outros usuarios.
+
+_user_tasks_index = {"users": {}}
+_user_tasks_lock = threading.Lock()
+
+
+def _user_tasks_key(user_id):
+    # lida antes dos dados: uma escrita no meio da montagem muda a chave e a
+    # entrada e refeita na consulta seguinte. Sem contadores compartilhados,
+    # as escritas de outros workers so aparecem nos arquivos, que entram na
+    # chave (e ai qualquer escrita nas tabelas invalida todos os usuarios).
+    key = [get_version(user_scope(user_id))]
+    if not generations.shared:
+        key.extend(_file_key(arq) for arq in [PROJECTS, LISTS] + [tasks for tasks, _ in _shard_pairs()])
+    projects = {p.get("project_id"): p for p in read_csv(PROJECTS) if p.get("user_id") == user_id}
+    key.extend((project_id, get_version(project_scope(project_id))) for project_id in sorted(projects))
+    return tuple(key), projects
+
+
+def _index_tasks(projects, lists_data, tasks):
+    # tasks das listas dos projetos, com o projeto e a lista, por usuario
+    lists_by_id = {}
+    for lista in lists_data:
+        project = projects.get(lista.get("project_id"))
+        if project:
+            lists_by_id[lista.get("list_id")] = (project, lista)
+
+    index = {}
+    for task in tasks:
+        found = lists_by_id.get(task.get("list_id"))
+        if not found:
+            continue
+        project, lista = found
+        task = dict(task)
+        task["project_id"] = project.get("project_id")
+        task["project_title"] = project.get("project_title")
+        task["list_name"] = lista.get("list_name")
+        index.setdefault(project.get("user_id"), []).append(task)
+
+    for user_tasks in index.values():
+        user_tasks.sort(key=lambda t: (t.get("created_at", ""), int(t.get("task_id", 0))))
+
+    return index
+
+
+def get_user_tasks(user_id):
+    user_id = str(user_id)
+    key, projects = _user_tasks_key(user_id)
+    with _user_tasks_lock:
+        entry = _user_tasks_index["users"].get(user_id)
+        if entry is not None and entry["key"] == key:
+            return entry["tasks"]
+
+    # so os arquivos de tasks dos projetos do usuario (com shards, os dele)
+    files = sorted({_tasks_file(project_id) for project_id in projects}) if _sharded() else [TASKS]
+    tasks = [t for arq in files for t in read_csv(arq)]
+    user_tasks = _index_tasks(projects, read_csv(LISTS), tasks).get(user_id, [])
+    with _user_tasks_lock:
+        _user_tasks_index["users"][user_id] = {"key": key, "tasks": user_tasks}
+    return user_tasks
+
+
+def warm_user_tasks():
+    # monta as entradas de todos os usuarios de uma vez (uma leitura de cada
+    # tabela), para o warm-up; devolve o numero de usuarios
+    keys = {}
+    projects = {}
+    for user in read_csv(USERS):
+        key, user_projects = _user_tasks_key(user.get("user_id"))
+        keys[user.get("user_id")] = key
+        projects.update(user_projects)
+
+    tasks = [t for tasks_arq, _ in _shard_pairs() for t in read_csv(tasks_arq)]
+    index = _index_tasks(projects, read_csv(LISTS), tasks)
+    with _user_tasks_lock:
+        for user_id, key in keys.items():
+            _user_tasks_index["users"][user_id] = {"key": key, "tasks": index.get(user_id, [])}
+    return len(keys)
+
+
+def find_tasks_by_user_id(user_id, completed=None):
+    user_tasks = _visible("task", get_user_tasks(user_id))
+
+    if completed is not None:
+        user_tasks = [t for t in user_tasks if str(t.get("completed")).lower() == str(completed).lower()]
+
+    return [dict(t) for t in user_tasks]
 
 
 # comentarios
 
 def find_comments_by_task_id(task_id):
-    comments = read_csv(COMMENTS)
-    return [c for c in comments if str(c["task_id"]) == str(task_id)]
+    _, arq = _task_pair_of(task_id)
+    comments = read_csv(arq) if arq else []
+    return _visible("comment", [c for c in comments if str(c["task_id"]) == str(task_id)])
 
 def find_comment_by_id(comment_id):
-    comments = read_csv(COMMENTS)
-    for c in comments:
-        if str(c["comment_id"]) == str(comment_id):
-            return c
-    return None
+    arq = _comment_file_of(comment_id)
+    return _visible_one("comment", _find_by_id(arq, comment_id)) if arq else None
 
-def get_next_comment_id():
-    comments = read_csv(COMMENTS)
-    if not comments:
-        return '1'
-    max_id = max(int(c.get("comment_id", 0)) for c in comments)
-    return str(max_id + 1)
+def save_comment(comment):
+    project_id = _project_of_task(comment.get("task_id"))
+    _create_rows(_comments_file(project_id), COMMENTS_FIELDNAMES, "comment_id", [comment], "comment", project_id)
+    _after_write("comment", "create", comment.get("comment_id"), comment, project_id)
 
 
-def save_comment(comment):
-    save_csv(COMMENTS, COMMENTS_FIELDNAMES, comment)
+def save_comments(comments, project_id):
+    # todos os comentarios devem pertencer a tasks do projeto informado; os
+    # ids sao atribuidos em sequencia, na ordem da lista
+    _create_rows(_comments_file(project_id), COMMENTS_FIELDNAMES, "comment_id", comments, "comment", project_id)
+    _after_write_many("comment", "create", "comment_id", comments, str(project_id))
 
 
-def update_comment_data(comment_id, new_content):
-    comments = read_csv(COMMENTS)
-    updated = False
+def update_comment_data(comment_id, new_content, expected_version=None):
+    target_id = str(comment_id)
+    arq = _comment_file_of(target_id)
+    if arq is None:
+        _check_version("comment", target_id, None, expected_version)
+        return None
 
-    for c in comments:
-        if str(c["comment_id"]) == str(comment_id):
-            c["content"] = new_content
-            updated = True
-            break
+    with _rewriting(arq):
+        comments = read_csv(arq, fresh=True)
+        updated = next((c for c in comments if str(c["comment_id"]) == target_id), None)
+        _check_version("comment", target_id, updated, expected_version)
+        if updated is None:
+            return None
 
-    if updated:
-        overwrite_csv(COMMENTS, COMMENTS_FIELDNAMES, comments)
+        _apply_update(updated, {"content": new_content})
+        overwrite_csv(arq, COMMENTS_FIELDNAMES, comments)
 
+    _after_write("comment", "update", target_id, updated, _project_of_task(updated["task_id"]))
     return updated
 
 
 def delete_comment_data(comment_id):
-    comments = read_csv(COMMENTS)
-    new_comments = [c for c in comments if str(c["comment_id"]) != str(comment_id)]
-    overwrite_csv(COMMENTS, COMMENTS_FIELDNAMES, new_comments)
+    arq = _comment_file_of(comment_id)
+    if arq is None:
+        return
+    with _rewriting(arq):
+        comments = read_csv(arq, fresh=True)
+        task_id = next((c["task_id"] for c in comments if str(c["comment_id"]) == str(comment_id)), None)
+        new_comments = [c for c in comments if str(c["comment_id"]) != str(comment_id)]
+        overwrite_csv(arq, COMMENTS_FIELDNAMES, new_comments)
+    if task_id is not None:
+        _after_write("comment", "delete", str(comment_id), project_id=_project_of_task(task_id))
+
+
+
+# arquivo morto: tasks concluidas antigas e seus comentarios saem de
+# tasks.csv/comments.csv e vao para db/archive/, em arquivos gzip por projeto
+# (project-<id>-tasks.csv.gz e project-<id>-comments.csv.gz). Cada
+# arquivamento acrescenta um novo membro gzip ao fim do arquivo; a leitura
+# e separada das tabelas quentes (find_archived_*) e restore_archived_task
+# devolve a task e seus comentarios para as tabelas quentes.
 
+def _archive_file(project_id, kind):
+    return os.path.join(ARCHIVE_PATH, f"project-{project_id}-{kind}.csv.gz")
+
+
+def _read_archive(project_id, kind):
+    try:
+        with gzip.open(_archive_file(project_id, kind), "rt", encoding="utf-8", newline="") as file:
+            return list(csv.DictReader(file))
+    except FileNotFoundError:
+        return []
+
+
+def _append_archive(project_id, kind, fieldnames, rows):
+    os.makedirs(ARCHIVE_PATH, exist_ok=True)
+    path = _archive_file(project_id, kind)
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as compressed:
+            with io.TextIOWrapper(compressed, encoding="utf-8", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=fieldnames)
+                if new_file:
+                    writer.writeheader()
+                writer.writerows(rows)
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def _rewrite_archive(project_id, kind, fieldnames, rows):
+    path = _archive_file(project_id, kind)
+    if not rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def _drop_project_archive(project_id):
+    for kind in ("tasks", "comments"):
+        path = _archive_file(project_id, kind)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _drop_archived_lists(project_id, list_ids):
+    if not os.path.exists(_archive_file(project_id, "tasks")):
+        return
+    # sob as travas das tabelas do projeto, como os arquivamentos que
+    # acrescentam ao mesmo arquivo morto
+    with _rewriting_tables(*_shard_pairs(project_id)[0]):
+        tasks = _read_archive(project_id, "tasks")
+        removed = {t.get("task_id") for t in tasks if t.get("list_id") in list_ids}
+        if not removed:
+            return
+        _rewrite_archive(project_id, "tasks", TASKS_FIELDNAMES, [t for t in tasks if t.get("task_id") not in removed])
+        comments = _read_archive(project_id, "comments")
+        _rewrite_archive(project_id, "comments", COMMENTS_FIELDNAMES, [c for c in comments if c.get("task_id") not in removed])
+
+
+_archived_ids = {"key": None, "max_ids": {}}
+
+
+def _archived_max_ids():
+    # maiores ids ja arquivados, por tabela ({"tasks.csv": 10, ...})
+    key = _file_key(ARCHIVE_MAX_IDS)
+    if _archived_ids["key"] != key:
+        try:
+            with open(ARCHIVE_MAX_IDS, "r", encoding="utf-8") as file:
+                _archived_ids["max_ids"] = json.load(file)
+        except FileNotFoundError:
+            _archived_ids["max_ids"] = {}
+        _archived_ids["key"] = key
+    return _archived_ids["max_ids"]
+
+
+def _save_archived_max_ids(rows_by_table):
+    max_ids = dict(_archived_max_ids())
+    for arq, rows in rows_by_table.items():
+        id_field = ID_FIELDS[arq]
+        name = os.path.basename(arq)
+        max_ids[name] = max([max_ids.get(name, 0)] + [int(r[id_field]) for r in rows if str(r.get(id_field, "")).isdigit()])
+
+    tmp_path = ARCHIVE_MAX_IDS + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(max_ids, file)
+    os.replace(tmp_path, ARCHIVE_MAX_IDS)
+    _written(ARCHIVE_MAX_IDS)
+
+
+def _is_completed(task):
+    return str(task.get("completed")).lower() == "true"
+
+
+def archive_completed_tasks(project_id=None, older_than_days=None):
+    # move para o arquivo morto as tasks concluidas criadas ha mais de
+    # `older_than_days` dias (padrao ARCHIVE_AFTER_DAYS), com seus
+    # comentarios. Sem project_id, arquiva todos os projetos. O arquivo
+    # morto e gravado (com fsync) antes de as tabelas quentes serem
+    # reescritas. Devolve {project_id: numero de tasks arquivadas}.
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    archived = {}
+    archived_comments = {}
+    with _write_lock:
+        project_of_list = {l.get("list_id"): l.get("project_id") for l in read_csv(LISTS, fresh=True)}
+        # um shard por vez (sem shards, as tabelas globais de uma vez so)
+        for tasks_arq, comments_arq in _shard_pairs(project_id):
+            _archive_from(tasks_arq, comments_arq, project_id, cutoff, project_of_list, archived, archived_comments)
+
+    for pid, project_tasks in archived.items():
+        _after_write_many("comment", "archive", "comment_id", archived_comments.get(pid, []), pid)
+        _after_write_many("task", "archive", "task_id", project_tasks, pid)
+
+    return {pid: len(project_tasks) for pid, project_tasks in archived.items()}
+
+
+def _archive_from(tasks_arq, comments_arq, project_id, cutoff, project_of_list, archived, archived_comments):
+    # arquiva as tasks elegiveis de um arquivo de tasks (e seus comentarios),
+    # acumulando em archived/archived_comments por projeto
+    with _rewriting_tables(tasks_arq, comments_arq):
+        _archive_locked(tasks_arq, comments_arq, project_id, cutoff, project_of_list, archived, archived_comments)
+
+
+def _archive_locked(tasks_arq, comments_arq, project_id, cutoff, project_of_list, archived, archived_comments):
+    tasks = read_csv(tasks_arq, fresh=True)
+
+    moved = {}
+    for task in _visible("task", tasks):
+        task_project = project_of_list.get(task.get("list_id"))
+        if task_project is None or (project_id is not None and task_project != str(project_id)):
+            continue
+        if _is_completed(task) and task.get("created_at") and task.get("created_at") <= cutoff:
+            moved.setdefault(task_project, []).append(task)
+
+    if not moved:
+        return
+
+    project_of_task = {t.get("task_id"): pid for pid, project_tasks in moved.items() for t in project_tasks}
+    comments = read_csv(comments_arq, fresh=True)
+    moved_comments = {}
+    remaining_comments = []
+    for comment in comments:
+        comment_project = project_of_task.get(comment.get("task_id"))
+        if comment_project is None:
+            remaining_comments.append(comment)
+        else:
+            moved_comments.setdefault(comment_project, []).append(comment)
+
+    os.makedirs(ARCHIVE_PATH, exist_ok=True)
+    for pid, project_tasks in moved.items():
+        _append_archive(pid, "tasks", TASKS_FIELDNAMES, project_tasks)
+        if moved_comments.get(pid):
+            _append_archive(pid, "comments", COMMENTS_FIELDNAMES, moved_comments[pid])
+    _save_archived_max_ids({
+        TASKS: [t for project_tasks in moved.values() for t in project_tasks],
+        COMMENTS: [c for project_comments in moved_comments.values() for c in project_comments],
+    })
+
+    if len(remaining_comments) != len(comments):
+        overwrite_csv(comments_arq, COMMENTS_FIELDNAMES, remaining_comments)
+    overwrite_csv(tasks_arq, TASKS_FIELDNAMES, [t for t in tasks if t.get("task_id") not in project_of_task])
+
+    for pid, project_tasks in moved.items():
+        archived.setdefault(pid, []).extend(project_tasks)
+        archived_comments.setdefault(pid, []).extend(moved_comments.get(pid, []))
+
+
+def find_archived_tasks(project_id, list_id=None):
+    tasks = _read_archive(str(project_id), "tasks")
+    if list_id is not None:
+        tasks = [t for t in tasks if t.get("list_id") == str(list_id)]
+    return _visible("task", tasks)
+
+
+def find_archived_task(project_id, task_id):
+    return next((t for t in find_archived_tasks(project_id) if t.get("task_id") == str(task_id)), None)
+
+
+def find_archived_comments(project_id, task_id):
+    return [c for c in _read_archive(str(project_id), "comments") if c.get("task_id") == str(task_id)]
+
+
+def _insert_by_id(rows, new_rows, id_field):
+    # mantem o arquivo em ordem de id (o indice do modo mmap usa bisect)
+    rows.extend(new_rows)
+    rows.sort(key=lambda r: int(r[id_field]) if str(r.get(id_field, "")).isdigit() else 0)
+    return rows
+
+
+def restore_archived_task(project_id, task_id):
+    # devolve a task (e seus comentarios) as tabelas quentes; None se ela
+    # nao estiver no arquivo morto do projeto. O arquivo morto e lido sob as
+    # travas das tabelas, como no arquivamento: duas restauracoes da mesma
+    # task (em workers diferentes) nunca a devolvem duas vezes.
+    project_id, task_id = str(project_id), str(task_id)
+    tasks_arq, comments_arq = _shard_pairs(project_id)[0]
+    with _rewriting_tables(tasks_arq, comments_arq):
+        archived_tasks = _read_archive(project_id, "tasks")
+        task = next((t for t in archived_tasks if t.get("task_id") == task_id), None)
+        if task is None:
+            return None
+        archived_comments = _read_archive(project_id, "comments")
+        comments = [c for c in archived_comments if c.get("task_id") == task_id]
+
+        _register_shard("task", "task_id", [task], project_id)
+        _register_shard("comment", "comment_id", comments, project_id)
+        if comments:
+            all_comments = read_csv(comments_arq, fresh=True)
+            overwrite_csv(comments_arq, COMMENTS_FIELDNAMES, _insert_by_id(all_comments, comments, "comment_id"))
+        all_tasks = read_csv(tasks_arq, fresh=True)
+        overwrite_csv(tasks_arq, TASKS_FIELDNAMES, _insert_by_id(all_tasks, [task], "task_id"))
+
+        _rewrite_archive(project_id, "tasks", TASKS_FIELDNAMES, [t for t in archived_tasks if t.get("task_id") != task_id])
+        if comments:
+            _rewrite_archive(project_id, "comments", COMMENTS_FIELDNAMES, [c for c in archived_comments if c.get("task_id") != task_id])
+
+    _after_write_many("task", "restore", "task_id", [task], project_id)
+    _after_write_many("comment", "restore", "comment_id", comments, project_id)
+    return task
+
+
+# historico de alteracoes (change feed por usuario)
+
+# espelho em memoria do arquivo de historico, lido de forma incremental e
+# limitado as ultimas JOURNAL_MAX_ENTRIES alteracoes; horizon: ultimo seq
+# que ja saiu da memoria. head/first_seq: primeira linha do arquivo lido e
+# o seu seq (o arquivo e compactado para a janela mantida, ver
+# _compact_changes)
+_journal = {"key": None, "offset": 0, "last_seq": 0, "horizon": 0, "by_user": {}, "seqs": [], "changes": [],
+            "head": None, "first_seq": None}
+_journal_lock = threading.Lock()
+
+# funções avisadas quando este processo grava uma alteração (ex: eventos SSE)
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    _change_listeners.append(listener)
+
+
+def _sync_journal():
+    # le apenas as linhas acrescentadas desde a ultima leitura (inclusive
+    # as escritas por outros processos); sem escrita nova, nem abre o arquivo
+    key = _file_key(CHANGES)
+    if _journal["key"] == key:
+        return
+    try:
+        with open(CHANGES, "rb") as file:
+            file.readline()
+            head = file.readline()
+            if head != _journal["head"]:
+                # primeira leitura, ou o arquivo foi compactado (por este ou
+                # outro processo) e comeca em outro seq: o espelho e refeito
+                # a partir do arquivo novo
+                _journal.update(offset=0, last_seq=0, by_user={}, seqs=[], changes=[], head=head, first_seq=None)
+            file.seek(_journal["offset"])
+            chunk = file.read()
+    except FileNotFoundError:
+        return
+
+    _journal["key"] = key
+    end = chunk.rfind(b"\n") + 1
+    if not end:
+        return
+
+    rows = csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline=""))
+    for row in rows:
+        if row == CHANGES_FIELDNAMES:
+            continue
+        change = dict(zip(CHANGES_FIELDNAMES, row))
+        change["seq"] = int(change["seq"])
+        if _journal["first_seq"] is None:
+            # num arquivo compactado, o que vem antes da primeira linha ja saiu
+            _journal["first_seq"] = change["seq"]
+            _journal["horizon"] = max(_journal["horizon"], change["seq"] - 1)
+        user_changes = _journal["by_user"].setdefault(change["user_id"], {"seqs": [], "changes": []})
+        user_changes["seqs"].append(change["seq"])
+        user_changes["changes"].append(change)
+        _journal["seqs"].append(change["seq"])
+        _journal["changes"].append(change)
+        _journal["last_seq"] = max(_journal["last_seq"], change["seq"])
+
+        # corta com folga de 25%, para nao cortar a cada alteracao
+        if len(_journal["changes"]) > JOURNAL_MAX_ENTRIES * 1.25:
+            _trim_journal()
+
+    _journal["offset"] += end
+
+
+def _trim_journal():
+    # descarta as alteracoes mais antigas, da lista geral e das de cada usuario
+    drop = len(_journal["changes"]) - JOURNAL_MAX_ENTRIES
+    if drop <= 0:
+        return
+    _journal["horizon"] = _journal["seqs"][drop - 1]
+    del _journal["seqs"][:drop]
+    del _journal["changes"][:drop]
+    for user_id, user_changes in list(_journal["by_user"].items()):
+        start = bisect.bisect_right(user_changes["seqs"], _journal["horizon"])
+        if start == len(user_changes["seqs"]):
+            del _journal["by_user"][user_id]
+        elif start:
+            del user_changes["seqs"][:start]
+            del user_changes["changes"][:start]
+
+
+def _compact_changes():
+    # com a trava do arquivo: quando o que ja saiu da memoria chega a um
+    # quarto da janela, o arquivo e reescrito so com a janela mantida (troca
+    # atomica, pela fila de escrita). Os outros processos percebem o arquivo
+    # novo pelo inode e refazem o espelho a partir dele.
+    first_seq = _journal["first_seq"]
+    if first_seq is None or _journal["horizon"] - first_seq + 1 < max(JOURNAL_MAX_ENTRIES // 4, 1):
+        return
+    overwrite_csv(CHANGES, CHANGES_FIELDNAMES, _journal["changes"])
+    with open(CHANGES, "rb") as file:
+        file.readline()
+        head = file.readline()
+        offset = file.seek(0, os.SEEK_END)
+    _journal.update(key=_file_key(CHANGES), offset=offset, head=head,
+                    first_seq=_journal["seqs"][0] if _journal["seqs"] else None)
+
+
+def record_change(user_id, entity, op, entity_id, project_id=None, data=None):
+    changes = record_changes(user_id, [(entity, op, entity_id, project_id, data)])
+    return changes[0] if changes else None
+
+
+def record_changes(user_id, entries):
+    # entries: lista de (entity, op, entity_id, project_id, data), gravada de uma vez
+    tx = _transaction.get()
+    if tx is not None:
+        # dentro de uma transacao: adiado ate o commit
+        tx["changes"].append((user_id, [(e, o, i, p, dict(d) if d is not None else None) for e, o, i, p, d in entries]))
+        return []
+
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    with _journal_lock, locked_file(CHANGES):
+        _sync_journal()
+        changes = []
+        for entity, op, entity_id, project_id, data in entries:
+            if data is not None:
+                data = {k: v for k, v in data.items() if k != "password_hash"}
+            changes.append({
+                "seq": _journal["last_seq"] + len(changes) + 1,
+                "user_id": str(user_id),
+                "entity": entity,
+                "entity_id": str(entity_id),
+                "project_id": "" if project_id is None else str(project_id),
+                "op": op,
+                "data": "" if data is None else json.dumps(data),
+                "created_at": created_at,
+            })
+        save_csv_rows(CHANGES, CHANGES_FIELDNAMES, changes)
+        _sync_journal()
+        _compact_changes()
+
+    for change in changes:
+        for listener in _change_listeners:
+            listener(change)
+
+    return changes
+
+
+def find_changes_after(since):
+    # todas as alteracoes (de todos os usuarios) com seq maior que since
+    with _journal_lock:
+        _sync_journal()
+        start = bisect.bisect_right(_journal["seqs"], since)
+        return _journal["changes"][start:]
+
+
+def find_project_changes_since(project_id, since):
+    target_id = str(project_id)
+    return [c for c in find_changes_after(since) if c["project_id"] == target_id]
+
+
+def get_last_change_seq():
+    with _journal_lock:
+        _sync_journal()
+        return _journal["last_seq"]
+
+
+def get_change_horizon():
+    # alteracoes com seq ate este valor ja sairam da memoria: quem pede desde
+    # antes dele precisa recarregar os dados
+    with _journal_lock:
+        _sync_journal()
+        return _journal["horizon"]
+
+
+def find_changes_since(user_id, since=0, limit=100):
+    with _journal_lock:
+        _sync_journal()
+        user_changes = _journal["by_user"].get(str(user_id), {"seqs": [], "changes": []})
+        start = bisect.bisect_right(user_changes["seqs"], since)
+        changes = user_changes["changes"][start:]
+        last_seq = user_changes["seqs"][-1] if user_changes["seqs"] else 0
+        # parte das alteracoes desde since ja saiu da memoria
+        horizon = _journal["horizon"]
+        truncated = since < horizon
+
+    # compacta: fica so a ultima alteracao de cada entidade
+    latest = {}
+    for change in changes:
+        latest[(change["entity"], change["entity_id"])] = change
+    compacted = sorted(latest.values(), key=lambda c: c["seq"])
+
+    page = []
+    for change in compacted[:limit]:
+        page.append({
+            "seq": change["seq"],
+            "entity": change["entity"],
+            "entity_id": change["entity_id"],
+            "project_id": change["project_id"] or None,
+            "op": change["op"],
+            "data": json.loads(change["data"]) if change["data"] else None,
+            "created_at": change["created_at"],
+        })
+
+    return {
+        "changes": page,
+        "next_since": page[-1]["seq"] if page else max(since, 0, horizon),
+        "has_more": len(compacted) > limit,
+        "last_seq": last_seq,
+        "truncated": truncated,
+    }
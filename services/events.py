@@ -0,0 +1,141 @@
+import os
+import json
+import queue
+import threading
+from services.csv_service import find_changes_after, get_last_change_seq, add_change_listener
+
+# intervalo entre heartbeats enviados a cada cliente conectado
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+# quantos eventos podem ficar pendentes por cliente antes dele ser desconectado
+SSE_BUFFER_SIZE = int(os.getenv("SSE_BUFFER_SIZE", 100))
+# frequência de leitura do histórico gravado por outros processos (workers)
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", 1))
+
+# entidades cujas alterações são enviadas para o quadro do projeto
+BOARD_ENTITIES = ("project", "list", "task", "comment")
+
+
+class Subscriber:
+    def __init__(self, project_id):
+        self.project_id = str(project_id)
+        self.queue = queue.Queue(maxsize=SSE_BUFFER_SIZE)
+        self.dropped = False
+
+
+class EventHub:
+    # pub/sub em memória por projeto. Os eventos vêm do histórico de
+    # alterações (db/changes.csv): uma thread lê o que foi acrescentado ao
+    # arquivo e repassa aos inscritos, então escritas feitas por qualquer
+    # worker chegam a todos os clientes conectados neste processo.
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.last_seq = 0
+
+    def subscribe(self, project_id):
+        subscriber = Subscriber(project_id)
+        with self.lock:
+            self._start()
+            self.subscribers.setdefault(subscriber.project_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            project_subscribers = self.subscribers.get(subscriber.project_id)
+            if project_subscribers is not None:
+                project_subscribers.discard(subscriber)
+                if not project_subscribers:
+                    del self.subscribers[subscriber.project_id]
+
+    def publish(self, change):
+        with self.lock:
+            project_subscribers = list(self.subscribers.get(change["project_id"], ()))
+
+        for subscriber in project_subscribers:
+            try:
+                subscriber.queue.put_nowait(change)
+            except queue.Full:
+                # cliente lento: é desconectado e retoma depois pelo Last-Event-ID
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+
+    def notify(self, change):
+        # escrita feita neste processo: acorda a thread sem esperar o polling
+        self.wakeup.set()
+
+    def _start(self):
+        if self.thread is None:
+            self.last_seq = get_last_change_seq()
+            self.thread = threading.Thread(target=self._run, name="sse-hub", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(SSE_POLL_SECONDS)
+            self.wakeup.clear()
+            for change in find_changes_after(self.last_seq):
+                self.last_seq = change["seq"]
+                if change["entity"] in BOARD_ENTITIES:
+                    self.publish(change)
+
+
+hub = EventHub()
+add_change_listener(hub.notify)
+
+
+def format_event(change):
+    data = {
+        "seq": change["seq"],
+        "entity": change["entity"],
+        "entity_id": change["entity_id"],
+        "project_id": change["project_id"],
+        "op": change["op"],
+        "data": json.loads(change["data"]) if change["data"] else None,
+        "created_at": change["created_at"],
+    }
+    return f"id: {change['seq']}\nevent: {change['entity']}.{change['op']}\ndata: {json.dumps(data)}\n\n"
+
+
+def project_event_stream(subscriber, replay, reset=False):
+    # replay: alterações perdidas desde o Last-Event-ID do cliente; reset:
+    # parte delas já saiu do histórico, então o cliente recarrega o quadro
+    last_sent = 0
+    try:
+        yield f"retry: {int(SSE_POLL_SECONDS * 1000)}\n\n"
+
+        if reset:
+            yield "event: reset\ndata: {}\n\n"
+
+        for change in replay:
+            if change["entity"] in BOARD_ENTITIES:
+                last_sent = change["seq"]
+                yield format_event(change)
+
+        while True:
+            try:
+                change = subscriber.queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                if subscriber.dropped:
+                    break
+                yield ": heartbeat\n\n"
+                continue
+
+            if subscriber.dropped:
+                break
+
+            # já enviada no replay
+            if change["seq"] <= last_sent:
+                continue
+
+            last_sent = change["seq"]
+            yield format_event(change)
+
+            if change["entity"] == "project" and change["op"] == "delete":
+                return
+
+        yield "event: dropped\ndata: {}\n\n"
+    finally:
+        hub.unsubscribe(subscriber)
@@ -0,0 +1,342 @@
+# Verificador de integridade do banco (db/*.csv), no estilo fsck.
+#
+# Valida as cinco tabelas contra os FIELDNAMES e confere as referencias
+# (project.user_id, list.project_id, task.list_id, comment.task_id) numa
+# unica passada: as tabelas sao lidas de pai para filho e os ids validos de
+# cada uma ficam num set, entao cada linha e conferida em O(1). Filhos de
+# linhas removidas tambem contam como orfaos. Com shards (db/shards/), as
+# tasks de cada projeto so podem apontar para listas do proprio projeto e o
+# diretorio de shards precisa conhecer todas as tasks e comentarios.
+#
+# Rode com a API parada:
+#   python -m services.fsck                 so verifica (codigo 1 se houver problemas)
+#   python -m services.fsck --repair        remove as linhas com problema
+#   python -m services.fsck --quarantine    remove e guarda as linhas em db/quarantine/
+
+import os
+import sys
+import csv
+import glob
+import argparse
+from datetime import datetime
+from services.csv_service import (
+    db_path, USERS, PROJECTS, LISTS, TASKS, COMMENTS, SHARDS_PATH, SHARD_DIRECTORY,
+    USER_FIELDNAMES, PROJECT_FIELDNAMES, LIST_FIELDNAMES, TASKS_FIELDNAMES, COMMENTS_FIELDNAMES, VERSION_FIELD,
+    rebuild_shard_directory,
+)
+
+# (arquivo, fieldnames, chave primaria, coluna que referencia o pai, tabela pai)
+TABLES = [
+    (os.path.basename(USERS), USER_FIELDNAMES, "user_id", None, None),
+    (os.path.basename(PROJECTS), PROJECT_FIELDNAMES, "project_id", "user_id", os.path.basename(USERS)),
+    (os.path.basename(LISTS), LIST_FIELDNAMES, "list_id", "project_id", os.path.basename(PROJECTS)),
+    (os.path.basename(TASKS), TASKS_FIELDNAMES, "task_id", "list_id", os.path.basename(LISTS)),
+    (os.path.basename(COMMENTS), COMMENTS_FIELDNAMES, "comment_id", "task_id", os.path.basename(TASKS)),
+]
+
+SHARDS_FOLDER = os.path.basename(SHARDS_PATH)
+DIRECTORY_NAME = os.path.basename(SHARD_DIRECTORY)
+
+QUARANTINE_FOLDER = "quarantine"
+
+# quantos problemas de cada arquivo sao listados (o total sempre aparece)
+MAX_LISTED = 20
+
+
+def _int_id(value):
+    # ids sao inteiros gravados sem zeros a esquerda
+    if value and value.isdigit() and (value == "0" or not value.startswith("0")):
+        return int(value)
+    return None
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() == 0:
+            return True
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def _records(path):
+    # (numero da linha, valores ou None se ilegivel, erro) de cada registro
+    with open(path, "r", encoding="utf-8", errors="surrogateescape", newline="") as file:
+        reader = csv.reader(file)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                yield reader.line_num, None, f"registro ilegível ({error})"
+                continue
+            yield reader.line_num, row, None
+
+
+def _has_invalid_utf8(row):
+    # com errors="surrogateescape" os bytes invalidos viram surrogates
+    for value in row:
+        try:
+            value.encode("utf-8")
+        except UnicodeEncodeError:
+            return True
+    return False
+
+
+def check_table(folder, name, fieldnames, id_field, parent_field, parent_ids, mode, quarantined):
+    # confere uma tabela e devolve (ids validos, relatorio). Os ids sao None
+    # quando a tabela nao pode ser verificada (cabecalho desconhecido); os
+    # filhos dela entao nao tem as referencias conferidas. Fora do modo
+    # "check", a tabela e regravada so com as linhas validas, em streaming.
+    path = os.path.join(folder, name)
+    report = {"file": name, "rows": 0, "valid": 0, "problems": {}, "listed": [], "fatal": None, "repaired": False}
+
+    if not os.path.exists(path):
+        return set(), report
+
+    def problem(line, kind, detail, row):
+        report["problems"][kind] = report["problems"].get(kind, 0) + 1
+        if len(report["listed"]) < MAX_LISTED:
+            report["listed"].append(f"linha {line}: {kind}{f' ({detail})' if detail else ''}")
+        if quarantined is not None and row is not None:
+            quarantined.append([name, line, kind] + list(row))
+
+    complete = _ends_with_newline(path)
+    records = _records(path)
+    first = next(records, None)
+    if first is None:
+        return set(), report
+
+    legacy = [f for f in fieldnames if f != VERSION_FIELD]
+    values = first[1]
+    if values == legacy or (values is not None and len(values) == len(legacy) and _int_id(values[0]) is not None):
+        # tabela anterior a coluna version (a API acrescenta a coluna ao subir)
+        fieldnames = legacy
+
+    header_missing = False
+    if first[1] != fieldnames:
+        values = first[1]
+        if values is not None and len(values) == len(fieldnames) and _int_id(values[0]) is not None:
+            # sem cabecalho, mas a primeira linha ja e um registro
+            header_missing = True
+            problem(1, "cabeçalho ausente", None, None)
+        else:
+            report["fatal"] = f"cabeçalho diferente do esperado: {values}"
+            return None, report
+
+    ids = set()
+    id_index = fieldnames.index(id_field)
+    parent_index = fieldnames.index(parent_field) if parent_field else None
+
+    writer = None
+    tmp_path = path + ".fsck.tmp"
+    if mode != "check":
+        tmp_file = open(tmp_path, "w", encoding="utf-8", errors="surrogateescape", newline="")
+        writer = csv.writer(tmp_file)
+        writer.writerow(fieldnames)
+
+    def check(record, last):
+        line, row, error = record
+        report["rows"] += 1
+        if error:
+            problem(line, "registro ilegível", error, None)
+        elif last and not complete:
+            # os escritores sempre terminam o registro com quebra de linha
+            problem(line, "registro final incompleto", None, row)
+        elif not row:
+            problem(line, "linha vazia", None, None)
+        elif len(row) != len(fieldnames):
+            problem(line, "número de colunas inválido", f"esperado {len(fieldnames)}, encontrado {len(row)}", row)
+        elif _has_invalid_utf8(row):
+            problem(line, "utf-8 inválido", None, row)
+        else:
+            entity_id = _int_id(row[id_index])
+            if entity_id is None:
+                problem(line, "id inválido", f"{id_field}={row[id_index]!r}", row)
+            elif entity_id in ids:
+                problem(line, "id duplicado", f"{id_field}={entity_id}", row)
+            elif parent_ids is not None and parent_index is not None and _int_id(row[parent_index]) not in parent_ids:
+                problem(line, "órfão", f"{parent_field}={row[parent_index]!r}", row)
+            else:
+                ids.add(entity_id)
+                report["valid"] += 1
+                if writer is not None:
+                    writer.writerow(row)
+
+    try:
+        # um registro de atraso, para saber qual e o ultimo (que pode estar truncado)
+        previous = first if header_missing else None
+        for record in records:
+            if previous is not None:
+                check(previous, False)
+            previous = record
+        if previous is not None:
+            check(previous, True)
+    finally:
+        if writer is not None:
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+            tmp_file.close()
+
+    if writer is not None:
+        if report["problems"]:
+            os.replace(tmp_path, path)
+            report["repaired"] = True
+        else:
+            os.remove(tmp_path)
+
+    return ids, report
+
+
+def _save_quarantine(folder, quarantined):
+    quarantine_path = os.path.join(folder, QUARANTINE_FOLDER)
+    os.makedirs(quarantine_path, exist_ok=True)
+    path = os.path.join(quarantine_path, f"fsck-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv")
+    with open(path, "w", encoding="utf-8", errors="surrogateescape", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["file", "line", "reason", "values"])
+        writer.writerows(quarantined)
+    return path
+
+
+def _print_report(report, out):
+    # devolve (problemas, tabela ilegivel)
+    name = report["file"]
+    problems = sum(report["problems"].values())
+    if report["fatal"]:
+        print(f"{name}: ERRO - {report['fatal']} (tabela e dependentes não verificados)", file=out)
+        return problems, True
+
+    status = "ok" if not problems else f"{problems} problema(s)"
+    print(f"{name}: {report['rows']} registros, {report['valid']} válidos - {status}", file=out)
+    for kind, count in report["problems"].items():
+        print(f"  {kind}: {count}", file=out)
+    for item in report["listed"]:
+        print(f"    {item}", file=out)
+    if report["repaired"]:
+        print(f"  reparado: {name} regravado só com os registros válidos", file=out)
+    return problems, False
+
+
+def _lists_by_project(folder, list_ids):
+    # {project_id: ids das listas validas do projeto} (depois do reparo, se houver)
+    # (None se a tabela de listas nao pode ser verificada)
+    if list_ids is None:
+        return None
+    lists_by_project = {}
+    path = os.path.join(folder, os.path.basename(LISTS))
+    if not os.path.exists(path):
+        return lists_by_project
+    with open(path, "r", encoding="utf-8", errors="surrogateescape", newline="") as file:
+        for row in csv.DictReader(file):
+            list_id = _int_id(row.get("list_id"))
+            if list_id in list_ids:
+                lists_by_project.setdefault(row.get("project_id"), set()).add(list_id)
+    return lists_by_project
+
+
+def _directory_entries(folder):
+    entries = {}
+    path = os.path.join(folder, SHARDS_FOLDER, DIRECTORY_NAME)
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8", errors="surrogateescape", newline="") as file:
+        for row in csv.DictReader(file):
+            # a ultima entrada de cada id vale
+            entries[(row.get("entity"), row.get("entity_id"))] = row.get("project_id")
+    return entries
+
+
+def check_shards(folder, list_ids, mode, quarantined, out):
+    # confere os shards por projeto e o diretorio; devolve (problemas, tabelas ilegiveis)
+    shards_path = os.path.join(folder, SHARDS_FOLDER)
+    if not os.path.isdir(shards_path):
+        return 0, 0
+
+    found = fatal = 0
+    lists_by_project = _lists_by_project(folder, list_ids)
+    shard_ids = []
+    for shard in sorted(os.listdir(shards_path)):
+        if not shard.startswith("project-"):
+            continue
+        project_id = shard[len("project-"):]
+        # as tasks do shard so podem estar em listas do proprio projeto
+        parent_ids = lists_by_project.get(project_id, set()) if lists_by_project is not None else None
+        task_ids, report = check_table(folder, os.path.join(SHARDS_FOLDER, shard, "tasks.csv"), TASKS_FIELDNAMES,
+                                       "task_id", "list_id", parent_ids, mode, quarantined)
+        problems, broken = _print_report(report, out)
+        found += problems
+        fatal += broken
+        comment_ids, report = check_table(folder, os.path.join(SHARDS_FOLDER, shard, "comments.csv"), COMMENTS_FIELDNAMES,
+                                          "comment_id", "task_id", task_ids, mode, quarantined)
+        problems, broken = _print_report(report, out)
+        found += problems
+        fatal += broken
+        shard_ids.append((project_id, task_ids or set(), comment_ids or set()))
+
+    # cada task/comentario precisa estar no diretorio apontando para o seu shard
+    entries = _directory_entries(folder)
+    missing = sum(1 for project_id, task_ids, comment_ids in shard_ids
+                  for entity, ids in (("task", task_ids), ("comment", comment_ids))
+                  for entity_id in ids if entries.get((entity, str(entity_id))) != project_id)
+    if mode != "check":
+        total = rebuild_shard_directory(shards_path)
+        print(f"{SHARDS_FOLDER}/{DIRECTORY_NAME}: reconstruído ({total} entradas)", file=out)
+    elif missing:
+        print(f"{SHARDS_FOLDER}/{DIRECTORY_NAME}: {missing} registro(s) fora do diretório ou no shard errado", file=out)
+        found += missing
+    else:
+        print(f"{SHARDS_FOLDER}/{DIRECTORY_NAME}: ok", file=out)
+    return found, fatal
+
+
+def run(folder=db_path, mode="check", out=sys.stdout):
+    # mode: "check", "repair" ou "quarantine". Devolve o codigo de saida.
+    quarantined = [] if mode == "quarantine" else None
+    valid_ids = {}
+    found = 0
+    fatal = 0
+
+    for name, fieldnames, id_field, parent_field, parent in TABLES:
+        parent_ids = valid_ids.get(parent) if parent else None
+        ids, report = check_table(folder, name, fieldnames, id_field, parent_field, parent_ids, mode, quarantined)
+        valid_ids[name] = ids
+
+        problems, broken = _print_report(report, out)
+        found += problems
+        fatal += broken
+
+    shard_problems, shard_fatal = check_shards(folder, valid_ids.get(os.path.basename(LISTS)), mode, quarantined, out)
+    found += shard_problems
+    fatal += shard_fatal
+
+    # restos de escritas interrompidas
+    leftovers = glob.glob(os.path.join(folder, "*.tmp")) + glob.glob(os.path.join(folder, SHARDS_FOLDER, "*", "*.tmp"))
+    for path in leftovers:
+        if mode == "check":
+            print(f"arquivo temporário esquecido: {os.path.relpath(path, folder)}", file=out)
+        else:
+            os.remove(path)
+            print(f"removido arquivo temporário: {os.path.relpath(path, folder)}", file=out)
+
+    if quarantined:
+        print(f"{len(quarantined)} registro(s) em quarentena: {_save_quarantine(folder, quarantined)}", file=out)
+
+    if fatal or (mode == "check" and (found or leftovers)):
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.fsck", description="Verifica a integridade dos CSVs em db/.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--repair", action="store_true", help="remove as linhas com problema")
+    group.add_argument("--quarantine", action="store_true", help="remove as linhas com problema e as guarda em db/quarantine/")
+    parser.add_argument("--db", default=db_path, help="pasta do banco (padrão: db/)")
+    args = parser.parse_args(argv)
+    return run(args.db, "repair" if args.repair else "quarantine" if args.quarantine else "check")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
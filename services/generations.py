@@ -0,0 +1,177 @@
+import os
+import mmap
+import struct
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# invalidação dos caches entre processos: "shared" (contadores num arquivo
+# mapeado em memória, vistos por todos os workers) ou "local" (contadores
+# de cada processo; as escritas dos outros são detectadas pelo stat dos CSVs)
+CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "shared")
+# número de contadores do arquivo (chaves diferentes podem dividir um
+# contador: o custo é só uma invalidação a mais)
+GENERATIONS_SLOTS = int(os.getenv("GENERATIONS_SLOTS", 16384))
+
+GENERATIONS_FILE_NAME = "generations.bin"
+GENERATIONS_MAGIC = b"GPGEN01\n"
+
+# mesma pasta de services/csv_service.py (DB_PATH ou db/ na raiz)
+DB_PATH = os.getenv("DB_PATH") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "db")
+
+INVALIDATION_MODES = ("shared", "local")
+
+# cabeçalho: magic, época (aleatória, gravada na criação) e número de contadores
+_HEADER = struct.Struct("<8s8sQ")
+_COUNTER = struct.Struct("<Q")
+
+
+class Generations:
+    # contadores de geração por chave (um arquivo CSV, um escopo de ETag...).
+    # Toda escrita incrementa os contadores do que mudou e quem tem um cache
+    # compara o contador guardado com o atual: uma leitura de 8 bytes da
+    # memória compartilhada, sem stat nem syscall. O arquivo é mapeado por
+    # todos os workers do nó, então a escrita de um invalida o cache de
+    # todos e quem escreveu lê o que escreveu em qualquer worker.
+
+    def __init__(self, path, shared=True, slots=GENERATIONS_SLOTS):
+        if slots <= 0:
+            raise ValueError("GENERATIONS_SLOTS deve ser maior que zero")
+        self.path = path
+        self.shared = shared
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.local = {}
+        self.offsets = {}
+        self.file = None
+        self.mm = None
+        self.epoch = None
+        if not shared:
+            # sem arquivo: os contadores recomeçam a cada execução
+            self.epoch = os.urandom(8).hex()
+
+    def _open(self):
+        mm = self.mm
+        if mm is not None:
+            return mm
+
+        with self.lock:
+            if self.mm is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                file = open(self.path, "a+b")
+                try:
+                    # o primeiro processo cria o arquivo; os outros esperam
+                    if fcntl:
+                        fcntl.flock(file, fcntl.LOCK_EX)
+                    try:
+                        if os.fstat(file.fileno()).st_size < _HEADER.size:
+                            file.truncate(0)
+                            file.write(_HEADER.pack(GENERATIONS_MAGIC, os.urandom(8), self.slots))
+                            file.write(bytes(_COUNTER.size * self.slots))
+                            file.flush()
+                    finally:
+                        if fcntl:
+                            fcntl.flock(file, fcntl.LOCK_UN)
+
+                    mm = mmap.mmap(file.fileno(), 0)
+                    magic, epoch, slots = _HEADER.unpack_from(mm, 0)
+                    if magic != GENERATIONS_MAGIC or len(mm) < _HEADER.size + _COUNTER.size * slots:
+                        mm.close()
+                        raise ValueError(f"arquivo de gerações inválido: {self.path}")
+                except BaseException:
+                    file.close()
+                    raise
+
+                # o número de contadores é o do arquivo (pode ter sido criado
+                # com outro GENERATIONS_SLOTS)
+                if slots != self.slots:
+                    self.offsets = {}
+                self.slots = slots
+                self.epoch = epoch.hex()
+                self.file = file
+                self.mm = mm
+            return self.mm
+
+    def _offset(self, key):
+        offset = self.offsets.get(key)
+        if offset is None:
+            digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+            offset = _HEADER.size + _COUNTER.size * (int.from_bytes(digest, "little") % self.slots)
+            self.offsets[key] = offset
+        return offset
+
+    def get(self, key):
+        if not self.shared:
+            return self.local.get(key, 0)
+        mm = self._open()
+        return _COUNTER.unpack_from(mm, self._offset(key))[0]
+
+    def bump(self, *keys):
+        if not keys:
+            return
+        if not self.shared:
+            with self.lock:
+                for key in keys:
+                    self.local[key] = self.local.get(key, 0) + 1
+            return
+
+        mm = self._open()
+        offsets = {self._offset(key) for key in keys}
+        # a trava de arquivo serializa os incrementos entre processos e a
+        # de thread entre as threads deste (o flock vale por descritor)
+        with self.lock:
+            if fcntl:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                for offset in offsets:
+                    _COUNTER.pack_into(mm, offset, _COUNTER.unpack_from(mm, offset)[0] + 1)
+            finally:
+                if fcntl:
+                    fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def get_epoch(self):
+        if self.shared:
+            self._open()
+        return self.epoch
+
+    def reopen(self):
+        # depois de um fork: o descritor herdado é o mesmo do processo pai e
+        # o flock não separaria os dois, então o filho abre o arquivo de novo
+        self.lock = threading.Lock()
+        if self.mm is not None:
+            try:
+                self.mm.close()
+                self.file.close()
+            except (OSError, ValueError):
+                pass
+        self.mm = None
+        self.file = None
+
+    def close(self):
+        with self.lock:
+            if self.mm is not None:
+                self.mm.close()
+                self.file.close()
+            self.mm = None
+            self.file = None
+
+    def stats(self):
+        return {
+            "mode": "shared" if self.shared else "local",
+            "path": self.path if self.shared else None,
+            "slots": self.slots if self.shared else None,
+            "epoch": self.get_epoch(),
+        }
+
+
+if CACHE_INVALIDATION not in INVALIDATION_MODES:
+    raise ValueError(f"CACHE_INVALIDATION inválido: {CACHE_INVALIDATION}")
+
+generations = Generations(os.path.join(DB_PATH, GENERATIONS_FILE_NAME), shared=CACHE_INVALIDATION == "shared")
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=generations.reopen)
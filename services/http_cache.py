@@ -0,0 +1,210 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response
+from werkzeug.http import quote_etag
+from flask_jwt_extended import get_jwt_identity
+from services.versions import get_epoch, get_version, user_scope, project_scope, add_listener
+from services.csv_service import find_project_by_id, find_list_by_id, find_task_by_id, find_comment_by_id, row_version
+
+# limite de memória do cache de respostas, em bytes
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+
+# linha exibida por uma rota de recurso único: nome -> (busca, argumento com o id)
+_ROW_FINDERS = {
+    "project": (find_project_by_id, "project_id"),
+    "list": (find_list_by_id, "list_id"),
+    "task": (find_task_by_id, "task_id"),
+    "comment": (find_comment_by_id, "comment_id"),
+}
+
+
+def _scopes_for(names, user_id, view_args):
+    scopes = []
+    for name in names:
+        if name == "user":
+            scopes.append(user_scope(user_id))
+        elif name == "project":
+            scopes.append(project_scope(view_args["project_id"]))
+    return scopes
+
+
+def make_etag(user_id, scope_names, view_args):
+    scopes = _scopes_for(scope_names, user_id, view_args)
+    parts = [
+        get_epoch(),
+        str(user_id),
+        request.endpoint,
+        repr(sorted(view_args.items())),
+        repr(sorted(request.args.items(multi=True))),
+        repr([(scope, get_version(scope)) for scope in scopes]),
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def conditional_get(*scope_names, row=None):
+    # ETag forte derivada dos contadores de versão dos escopos informados
+    # ("user" e/ou "project"). Se o cliente enviar If-None-Match com a
+    # ETag atual, responde 304 sem ler os CSVs nem serializar o JSON.
+    # row: rota de um único registro ("task", "list"...); a ETag leva na
+    # frente a versão dele ("3.<hash>"), então serve também de If-Match
+    # no PUT/PATCH do mesmo registro.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # a versão é lida antes da rota acessar os dados: se houver uma
+            # escrita no meio, a próxima requisição recebe uma ETag nova
+            etag = make_etag(get_jwt_identity(), scope_names, kwargs)
+
+            # os escopos mudam a cada escrita no registro, então o hash
+            # basta para saber se a ETag do cliente (com a versão) é atual
+            current = next((tag for tag in request.if_none_match.as_set() if tag.rpartition(".")[2] == etag), None)
+            if current is not None:
+                response = make_response("", 304)
+                response.set_etag(current)
+                return response
+
+            if row is not None:
+                find, id_arg = _ROW_FINDERS[row]
+                found = find(kwargs[id_arg])
+                if found is not None:
+                    etag = f"{row_version(found)}.{etag}"
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def if_match_versions():
+    # versões aceitas pelo If-Match de um PUT/PATCH: a ETag de uma linha é a
+    # sua coluna version ("3"), ou a do GET do registro ("3.<hash>"). None
+    # sem o cabeçalho ou com "*"; ETags fracas nunca conferem (comparação
+    # forte), então só elas dão um conjunto vazio
+    if "If-Match" not in request.headers or request.if_match.star_tag:
+        return None
+    return {tag.partition(".")[0] for tag in request.if_match.as_set()}
+
+
+def version_headers(row):
+    # ETag da linha alterada, para o próximo If-Match do cliente
+    return {"ETag": quote_etag(str(row.get("version")))}
+
+
+class ResponseCache:
+    # cache LRU de respostas serializadas, limitado pelo total de bytes.
+    # cada entrada guarda as versões dos escopos no momento em que foi
+    # gerada e é descartada assim que uma escrita incrementa um deles.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.keys_by_scope = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or any(get_version(scope) != version for scope, version in entry["versions"]):
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, versions, body, status, content_type):
+        size = len(body) + len(repr(key))
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            # se houve escrita enquanto a resposta era gerada, ela já nasce velha
+            if any(get_version(scope) != version for scope, version in versions):
+                return
+
+            self._remove(key)
+            self.entries[key] = {"versions": versions, "body": body, "status": status, "content_type": content_type, "size": size}
+            self.size += size
+            for scope, _ in versions:
+                self.keys_by_scope.setdefault(scope, set()).add(key)
+
+            while self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, scopes):
+        with self.lock:
+            for scope in scopes:
+                for key in self.keys_by_scope.pop(scope, set()):
+                    if self._remove(key):
+                        self.invalidations += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.size -= entry["size"]
+        for scope, _ in entry["versions"]:
+            keys = self.keys_by_scope.get(scope)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_scope[scope]
+        return True
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+add_listener(response_cache.invalidate)
+
+
+def cached_response(*scope_names):
+    # guarda o corpo já serializado das respostas 200 por
+    # (usuário, rota, argumentos), invalidado pelas escritas nos escopos
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = get_jwt_identity()
+            key = (
+                str(user_id),
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+            )
+
+            entry = response_cache.get(key)
+            if entry is not None:
+                return make_response(entry["body"], entry["status"], {"Content-Type": entry["content_type"]})
+
+            scopes = _scopes_for(scope_names, user_id, kwargs)
+            versions = tuple((scope, get_version(scope)) for scope in scopes)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                response_cache.put(key, versions, response.get_data(), response.status_code, response.content_type)
+            return response
+        return wrapper
+    return decorator
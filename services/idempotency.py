@@ -0,0 +1,263 @@
+import os
+import io
+import csv
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, jsonify
+from flask_jwt_extended import get_jwt_identity
+from services.csv_service import db_path, save_csv, overwrite_csv, in_transaction, locked_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem travas entre processos
+    fcntl = None
+
+IDEMPOTENCY = os.path.join(db_path, "idempotency.csv")
+IDEMPOTENCY_FIELDNAMES = ['key', 'fingerprint', 'status', 'content_type', 'body', 'created_at']
+
+# por quanto tempo uma resposta pode ser reaproveitada
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+# máximo de respostas guardadas (as mais antigas saem primeiro)
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+
+# bytes do final do trecho já lido conferidos a cada leitura incremental
+SYNC_TAIL_BYTES = 64
+
+
+class IdempotencyStore:
+    # respostas já enviadas para cada Idempotency-Key, mantidas em memória e
+    # gravadas em db/idempotency.csv. O arquivo é lido de forma incremental,
+    # então respostas gravadas por outros workers também são encontradas.
+    #
+    # Repetições simultâneas da mesma requisição esperam a primeira: no mesmo
+    # processo por um Event, entre workers por uma trava de registro (lockf)
+    # em db/idempotency.csv.keys.lock, no byte dado pelo hash da chave. A
+    # trava some sozinha se o worker que executa cair.
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.offset = 0
+        self.ino = None
+        self.tail = b""
+        self.rows_in_file = 0
+        self.lock = threading.Lock()
+        self.key_locks = None
+        self.replays = 0
+        self.coalesced = 0
+
+    def reopen(self):
+        # depois de um fork: as requisições em andamento são do pai
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.key_locks = None
+
+    def _sync(self):
+        try:
+            with open(self.path, "rb") as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_ino != self.ino or stat.st_size < self.offset or self._tail(file) != self.tail:
+                    # arquivo novo: compactado (trocado) por este ou outro
+                    # processo; o offset antigo não vale para ele. O inode
+                    # pode ser reaproveitado pelo arquivo novo, então o
+                    # final do trecho já lido também é conferido.
+                    self.ino = stat.st_ino
+                    self.offset = 0
+                    self.tail = b""
+                    self.rows_in_file = 0
+                file.seek(self.offset)
+                chunk = file.read()
+        except FileNotFoundError:
+            return
+
+        end = chunk.rfind(b"\n") + 1
+        if not end:
+            return
+
+        for row in csv.reader(io.StringIO(chunk[:end].decode("utf-8"), newline="")):
+            if row == IDEMPOTENCY_FIELDNAMES:
+                continue
+            self.rows_in_file += 1
+            entry = dict(zip(IDEMPOTENCY_FIELDNAMES, row))
+            try:
+                entry["status"] = int(entry["status"])
+                entry["created_at"] = float(entry["created_at"])
+            except (KeyError, ValueError):
+                # linha incompleta (ex.: gravação interrompida): ignorada
+                continue
+            self.entries[entry["key"]] = entry
+            self.entries.move_to_end(entry["key"])
+
+        self.offset += end
+        self.tail = (self.tail + chunk[:end])[-SYNC_TAIL_BYTES:]
+        self._prune()
+
+    def _tail(self, file):
+        # últimos bytes do trecho já lido, como estão no arquivo agora
+        file.seek(max(0, self.offset - SYNC_TAIL_BYTES))
+        return file.read(min(self.offset, SYNC_TAIL_BYTES))
+
+    def _prune(self):
+        limit = time.time() - self.ttl
+        while self.entries:
+            oldest = next(iter(self.entries.values()))
+            if oldest["created_at"] >= limit and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
+
+    def _store(self, entry):
+        # sob a trava do arquivo: a compactação de um worker não pode perder
+        # o append de outro, então as linhas deles são lidas antes
+        with locked_file(self.path):
+            self._sync()
+            self.entries[entry["key"]] = entry
+            self._prune()
+
+            # o arquivo é reescrito só com as respostas válidas quando
+            # acumula o dobro do limite de linhas
+            if self.rows_in_file + 1 > 2 * self.max_entries:
+                overwrite_csv(self.path, IDEMPOTENCY_FIELDNAMES, list(self.entries.values()))
+            else:
+                save_csv(self.path, IDEMPOTENCY_FIELDNAMES, entry)
+            self._sync()
+
+    def _lock_key(self, key, locked):
+        # trava (ou solta) a chave entre processos. As travas de registro são
+        # do processo e caem ao fechar qualquer descritor do arquivo, então
+        # cada processo usa um único descritor aberto.
+        if fcntl is None:
+            return
+        if self.key_locks is None:
+            self.key_locks = open(self.path + ".keys.lock", "a")
+        fcntl.lockf(self.key_locks, fcntl.LOCK_EX if locked else fcntl.LOCK_UN, 1, int(key[:15], 16))
+
+    def begin(self, key, fingerprint):
+        # devolve ("replay", entrada), ("conflict", None) ou ("execute", None).
+        # requisições iguais simultâneas esperam a primeira terminar.
+        while True:
+            with self.lock:
+                result = self._lookup(key, fingerprint)
+                if result is not None:
+                    return result
+
+                event = self.in_flight.get(key)
+                if event is None:
+                    self.in_flight[key] = threading.Event()
+                    break
+                self.coalesced += 1
+
+            event.wait()
+
+        # única thread deste processo com a chave: espera a execução dela em
+        # outro worker (se houver) e confere de novo se a resposta já existe
+        try:
+            self._lock_key(key, True)
+            with self.lock:
+                result = self._lookup(key, fingerprint)
+        except BaseException:
+            self._release(key)
+            raise
+        if result is not None:
+            self._release(key)
+            return result
+        return "execute", None
+
+    def _lookup(self, key, fingerprint):
+        self._sync()
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["fingerprint"] != fingerprint:
+            return "conflict", None
+        self.replays += 1
+        return "replay", entry
+
+    def _release(self, key):
+        try:
+            self._lock_key(key, False)
+        finally:
+            with self.lock:
+                self.in_flight.pop(key).set()
+
+    def finish(self, key, fingerprint, response):
+        try:
+            with self.lock:
+                # erros do servidor não são guardados: o cliente pode tentar de novo
+                if response is not None and response.status_code < 500:
+                    self._store({
+                        "key": key,
+                        "fingerprint": fingerprint,
+                        "status": response.status_code,
+                        "content_type": response.content_type,
+                        "body": base64.b64encode(response.get_data()).decode("ascii"),
+                        "created_at": time.time(),
+                    })
+        finally:
+            self._release(key)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "in_flight": len(self.in_flight),
+                "replays": self.replays,
+                "coalesced": self.coalesced,
+            }
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_MAX_ENTRIES)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=idempotency_store.reopen)
+
+
+def idempotent(view):
+    # com o header Idempotency-Key, a primeira resposta é guardada e
+    # devolvida novamente para as repetições da mesma requisição
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get("Idempotency-Key")
+        if not client_key:
+            return view(*args, **kwargs)
+
+        if len(client_key) > 255:
+            return jsonify({"error": "Idempotency-Key deve ter no máximo 255 caracteres"}), 400
+
+        # dentro de um lote atômico a escrita ainda pode ser desfeita
+        if in_transaction():
+            return view(*args, **kwargs)
+
+        key = hashlib.sha256("|".join([
+            str(get_jwt_identity()),
+            request.endpoint,
+            repr(sorted(kwargs.items())),
+            client_key,
+        ]).encode("utf-8")).hexdigest()
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        action, entry = idempotency_store.begin(key, fingerprint)
+
+        if action == "conflict":
+            return jsonify({"error": "Idempotency-Key já utilizada com outro conteúdo"}), 422
+
+        if action == "replay":
+            response = make_response(base64.b64decode(entry["body"]), entry["status"])
+            response.headers["Content-Type"] = entry["content_type"]
+            response.headers["Idempotent-Replayed"] = "true"
+            return response
+
+        response = None
+        try:
+            response = make_response(view(*args, **kwargs))
+            return response
+        finally:
+            idempotency_store.finish(key, fingerprint, response)
+
+    return wrapper
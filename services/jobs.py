@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from datetime import datetime
+from services.csv_service import db_path, read_csv, overwrite_csv, locked_file, delete_user_data, purge_deleted, pending_purges, archive_completed_tasks
+
+logger = logging.getLogger(__name__)
+
+JOBS = os.path.join(db_path, "jobs.csv")
+JOB_FIELDNAMES = ['job_id', 'user_id', 'kind', 'params', 'status', 'attempts', 'max_attempts', 'progress',
+                  'result', 'error', 'owner', 'created_at', 'started_at', 'finished_at', 'duration_ms']
+
+# threads que executam os jobs
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 2))
+# tentativas por job (a primeira execução conta)
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", 3))
+# espera antes de tentar de novo (multiplicada pelo número de tentativas)
+JOBS_RETRY_DELAY_SECONDS = float(os.getenv("JOBS_RETRY_DELAY_SECONDS", 5))
+# jobs terminados mantidos em db/jobs.csv (os mais antigos saem primeiro)
+JOBS_KEEP_FINISHED = int(os.getenv("JOBS_KEEP_FINISHED", 1000))
+# intervalo mínimo entre gravações do progresso de um job
+JOBS_PROGRESS_SAVE_SECONDS = float(os.getenv("JOBS_PROGRESS_SAVE_SECONDS", 1))
+
+FINISHED = ("succeeded", "failed")
+
+# tipos de job: nome -> função(params, progress)
+_job_kinds = {}
+
+
+def job_kind(name):
+    # registra uma função como tipo de job. Ela recebe os parâmetros do job
+    # e uma função progress(fração de 0 a 1); o retorno vira o result.
+    def register(fn):
+        _job_kinds[name] = fn
+        return fn
+    return register
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _owner_alive(owner):
+    # owner = "<pid>:<token>"; o token distingue um processo novo que
+    # recebeu o mesmo pid (ex.: pid 1 em containers)
+    pid, _, _ = owner.partition(":")
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    if os.name != "posix":
+        # sem sinal 0 fora do POSIX: considera o dono encerrado
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _public(job):
+    data = {k: job.get(k) for k in JOB_FIELDNAMES if k != "owner"}
+    for field in ("params", "result"):
+        data[field] = json.loads(data[field]) if data[field] else None
+    for field in ("attempts", "max_attempts", "duration_ms"):
+        data[field] = int(data[field]) if data[field] not in (None, "") else None
+    data["progress"] = float(data["progress"] or 0)
+    return data
+
+
+class JobQueue:
+    # jobs em segundo plano executados por threads deste processo. Cada job
+    # é gravado em db/jobs.csv (status, tentativas, progresso, duração), então
+    # o status pode ser consultado por qualquer worker da API e os jobs de um
+    # processo que caiu são retomados quando a fila sobe de novo.
+
+    def __init__(self, path, workers, max_attempts, retry_delay):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+
+        self._recover()
+        for number in range(self.workers):
+            threading.Thread(target=self._work, name=f"jobs-{number}", daemon=True).start()
+
+    def reopen(self):
+        # depois de um fork (gunicorn --preload): o filho herda started=True,
+        # mas não as threads de jobs. Ele ganha um dono e uma fila próprios
+        # (os jobs em memória continuam com o pai) e sobe os seus workers no
+        # primeiro submit, retomando então os jobs de processos que caíram
+        # (ex.: o worker que ele substitui). Nada roda aqui: o fork pode ser
+        # de um processo auxiliar (ex.: o pool da leitura paralela), que
+        # herdou travas de outras threads e nunca enfileira jobs.
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+
+    def submit(self, kind, params=None, user_id=None, max_attempts=None):
+        if kind not in _job_kinds:
+            raise ValueError(f"tipo de job desconhecido: {kind}")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "user_id": "" if user_id is None else str(user_id),
+            "kind": kind,
+            "params": json.dumps(params or {}),
+            "status": "queued",
+            "attempts": "0",
+            "max_attempts": str(max_attempts or self.max_attempts),
+            "progress": "0",
+            "result": "",
+            "error": "",
+            "owner": self.owner,
+            "created_at": _now(),
+            "started_at": "",
+            "finished_at": "",
+            "duration_ms": "",
+        }
+        with self.lock:
+            self.jobs[job["job_id"]] = job
+        self._save(job)
+
+        self.start()
+        self.pending.put(job["job_id"])
+        return _public(job)
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return _public(job)
+        for row in read_csv(self.path, fresh=True):
+            if row.get("job_id") == job_id:
+                return _public(row)
+        return None
+
+    def list(self, user_id):
+        rows = {row["job_id"]: row for row in read_csv(self.path, fresh=True)}
+        with self.lock:
+            rows.update(self.jobs)
+            jobs = [_public(job) for job in rows.values() if job.get("user_id") == str(user_id)]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def _save(self, job):
+        # lê-mescla-grava sob trava de arquivo: outros processos também
+        # gravam os seus jobs no mesmo arquivo
+        with self.lock:
+            snapshot = dict(job)
+        with locked_file(self.path):
+            rows = read_csv(self.path, fresh=True)
+            for index, row in enumerate(rows):
+                if row.get("job_id") == snapshot["job_id"]:
+                    rows[index] = snapshot
+                    break
+            else:
+                rows.append(snapshot)
+
+            finished = [row for row in rows if row.get("status") in FINISHED]
+            if len(finished) > JOBS_KEEP_FINISHED:
+                drop = {row["job_id"] for row in sorted(finished, key=lambda r: r.get("finished_at", ""))[:len(finished) - JOBS_KEEP_FINISHED]}
+                rows = [row for row in rows if row["job_id"] not in drop]
+
+            overwrite_csv(self.path, JOB_FIELDNAMES, rows)
+
+    def _recover(self):
+        # jobs não terminados cujo processo dono não existe mais voltam à fila
+        recovered = []
+        with locked_file(self.path):
+            rows = read_csv(self.path, fresh=True)
+            for row in rows:
+                if row.get("status") in FINISHED or row.get("owner") == self.owner:
+                    continue
+                if _owner_alive(row.get("owner", "")):
+                    continue
+                row["owner"] = self.owner
+                row["status"] = "queued"
+                recovered.append(row)
+            if recovered:
+                overwrite_csv(self.path, JOB_FIELDNAMES, rows)
+
+        for job in recovered:
+            with self.lock:
+                self.jobs[job["job_id"]] = job
+            self.pending.put(job["job_id"])
+        if recovered:
+            logger.info("jobs: %d job(s) retomado(s)", len(recovered))
+
+    def _work(self):
+        while True:
+            job_id = self.pending.get()
+            with self.lock:
+                job = self.jobs.get(job_id)
+            if job is not None:
+                self._run(job)
+
+    def _run(self, job):
+        fn = _job_kinds.get(job["kind"])
+        with self.lock:
+            job["status"] = "running"
+            job["attempts"] = str(int(job["attempts"]) + 1)
+            job["started_at"] = _now()
+            job["error"] = ""
+        self._save(job)
+
+        last_save = [time.monotonic()]
+
+        def progress(fraction):
+            with self.lock:
+                job["progress"] = str(round(min(max(fraction, 0.0), 1.0) * 100, 1))
+            if time.monotonic() - last_save[0] >= JOBS_PROGRESS_SAVE_SECONDS:
+                last_save[0] = time.monotonic()
+                self._save(job)
+
+        started = time.perf_counter()
+        retry = False
+        try:
+            if fn is None:
+                raise ValueError(f"tipo de job desconhecido: {job['kind']}")
+            result = fn(json.loads(job["params"] or "{}"), progress)
+        except Exception as error:
+            logger.exception("job %s (%s) falhou", job["job_id"], job["kind"])
+            with self.lock:
+                job["error"] = str(error)
+                retry = int(job["attempts"]) < int(job["max_attempts"])
+                job["status"] = "queued" if retry else "failed"
+        else:
+            with self.lock:
+                job["status"] = "succeeded"
+                job["progress"] = "100.0"
+                job["result"] = json.dumps(result) if result is not None else ""
+
+        with self.lock:
+            job["duration_ms"] = str(int((time.perf_counter() - started) * 1000))
+            if not retry:
+                job["finished_at"] = _now()
+        self._save(job)
+
+        if retry:
+            delay = self.retry_delay * int(job["attempts"])
+            timer = threading.Timer(delay, self.pending.put, args=(job["job_id"],))
+            timer.daemon = True
+            timer.start()
+        else:
+            with self.lock:
+                self.jobs.pop(job["job_id"], None)
+
+    def stats(self):
+        with self.lock:
+            statuses = [job["status"] for job in self.jobs.values()]
+        return {
+            "workers": self.workers if self.started else 0,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+        }
+
+
+job_queue = JobQueue(JOBS, JOBS_WORKERS, JOBS_MAX_ATTEMPTS, JOBS_RETRY_DELAY_SECONDS)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=job_queue.reopen)
+
+
+# tipos de job disponíveis
+
+@job_kind("delete_user")
+def _delete_user_job(params, progress):
+    delete_user_data(params["user_id"])
+    return {"user_id": str(params["user_id"])}
+
+
+@job_kind("purge_deleted")
+def _purge_deleted_job(params, progress):
+    # apaga de uma vez todas as subárvores com lápide (soft delete)
+    total = pending_purges()
+    purged = 0
+    while True:
+        done = purge_deleted(int(params.get("batch_size", 100)))
+        if not done:
+            break
+        purged += done
+        progress(purged / total if total else 1.0)
+    return {"purged": purged}
+
+
+@job_kind("archive_tasks")
+def _archive_tasks_job(params, progress):
+    # sem project_id: arquiva as tasks concluídas antigas de todos os projetos
+    archived = archive_completed_tasks(params.get("project_id"), params.get("older_than_days"))
+    return {"archived": archived, "total": sum(archived.values())}
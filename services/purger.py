@@ -0,0 +1,93 @@
+import os
+import time
+import logging
+import threading
+from services.csv_service import purge_deleted, pending_purges
+
+logger = logging.getLogger(__name__)
+
+# quanto tempo sem requisições conta como período calmo
+PURGE_IDLE_SECONDS = float(os.getenv("PURGE_IDLE_SECONDS", 5))
+# intervalo entre verificações do purger
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", 1))
+# lápides processadas por lote (uma reescrita de cada tabela por lote)
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", 100))
+
+_state = {
+    "running": False,
+    "last_activity": time.monotonic(),
+    "batches": 0,
+    "purged": 0,
+    "last_batch_seconds": None,
+    "error": None,
+}
+_lock = threading.Lock()
+# purger parado por um fork, a ser religado no processo filho
+_interrupted = False
+
+
+def note_activity():
+    # chamada a cada requisição; o purger só trabalha quando elas param
+    _state["last_activity"] = time.monotonic()
+    if _interrupted:
+        start_purger()
+
+
+def purger_status():
+    with _lock:
+        status = {k: v for k, v in _state.items() if k != "last_activity"}
+    status["pending"] = pending_purges()
+    return status
+
+
+def _quiet():
+    return time.monotonic() - _state["last_activity"] >= PURGE_IDLE_SECONDS
+
+
+def run_purger():
+    # apaga as subárvores com lápide em lotes, um lote por vez, voltando a
+    # esperar assim que chegar alguma requisição
+    while True:
+        time.sleep(PURGE_INTERVAL_SECONDS)
+        try:
+            while _quiet() and pending_purges():
+                started = time.perf_counter()
+                purged = purge_deleted(PURGE_BATCH_SIZE)
+                seconds = time.perf_counter() - started
+                with _lock:
+                    _state["batches"] += 1
+                    _state["purged"] += purged
+                    _state["last_batch_seconds"] = round(seconds, 3)
+                    _state["error"] = None
+                logger.info("purger: %d lápide(s) processada(s) em %.3fs", purged, seconds)
+        except Exception as error:
+            logger.exception("purger falhou")
+            with _lock:
+                _state["error"] = str(error)
+
+
+def start_purger():
+    global _interrupted
+    with _lock:
+        _interrupted = False
+        if _state["running"]:
+            return
+        _state["running"] = True
+
+    threading.Thread(target=run_purger, name="purger", daemon=True).start()
+
+
+def _reopen():
+    # depois de um fork (gunicorn --preload): o filho herda running=True,
+    # mas não a thread do purger, que sobe de novo na primeira requisição
+    # do filho. Nada roda aqui: o fork pode ser de um processo auxiliar
+    # (ex.: o pool da leitura paralela), que nunca recebe requisições.
+    global _lock, _interrupted
+    _lock = threading.Lock()
+    if _state["running"]:
+        _state["running"] = False
+        _interrupted = True
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen)
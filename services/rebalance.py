@@ -0,0 +1,447 @@
+# Rebalanceamento dos nós (tenant sharding por usuário).
+#
+# Cada usuário (com projetos, listas, tasks, comentários, arquivo morto e
+# lápides) mora na pasta db/ de um nó. Depois de mudar os nós do mapa de
+# shards, os usuários cujo dono pelo anel mudou são movidos para o nó novo.
+# Os ids são repartidos entre os nós (ver ShardMap.next_id), então a
+# subárvore chega ao destino com os mesmos ids; se algum id já existir lá
+# com outro conteúdo (dados de antes do mapa), o usuário não é movido.
+#
+# Fluxo para incluir/retirar um nó:
+#   python -m services.rebalance pin      fixa cada usuário no nó onde está
+#   (edite o mapa: inclua/retire o nó)
+#   python -m services.rebalance plan     mostra quem precisa mudar de nó
+#   python -m services.rebalance apply    move esses usuários e tira os pins
+#                                         que ficaram iguais ao anel
+#   python -m services.rebalance move <user_id> <nó>
+#
+# Mova sem tráfego do usuário: escritas que chegarem ao nó de origem
+# durante a cópia se perdem. O histórico de alterações (/user/changes) não
+# é copiado; depois da mudança o cliente precisa sincronizar do zero.
+
+import os
+import sys
+import csv
+import json
+import shutil
+import argparse
+from contextlib import ExitStack, contextmanager
+from services.shard_map import shard_map
+from services.generations import Generations, GENERATIONS_FILE_NAME
+from services.versions import scope_key, user_scope, project_scope
+from services.shared_tables import segment_name
+from services.csv_service import (
+    USERS, PROJECTS, LISTS, TASKS, COMMENTS, TOMBSTONES, ARCHIVE_PATH, ARCHIVE_MAX_IDS, SHARDS_PATH, SHARD_DIRECTORY,
+    USER_FIELDNAMES, PROJECT_FIELDNAMES, LIST_FIELDNAMES, TASKS_FIELDNAMES, COMMENTS_FIELDNAMES,
+    TOMBSTONE_FIELDNAMES, SHARD_DIRECTORY_FIELDNAMES, TRANSACTION_LOCK, locked_file,
+)
+
+
+class RebalanceError(Exception):
+    pass
+
+
+def _name(arq):
+    return os.path.basename(arq)
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            return list(csv.DictReader(file))
+    except FileNotFoundError:
+        return []
+
+
+def _write(path, fieldnames, rows):
+    # troca atômica, como as escritas da API, sob a trava do arquivo (a
+    # mesma dos workers do nó). Quem relê e reescreve já segura a trava
+    # desde a leitura; ela é reentrante.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".rebalance.tmp"
+    with locked_file(path):
+        with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+
+def _append(path, fieldnames, rows):
+    if not rows:
+        return
+    with locked_file(path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, "a", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+def _id_order(id_field):
+    return lambda row: int(row[id_field]) if str(row.get(id_field, "")).isdigit() else 0
+
+
+class NodeData:
+    # acesso direto aos CSVs da pasta de um nó (com ou sem shards por projeto)
+
+    def __init__(self, name, folder):
+        self.name = name
+        self.folder = folder
+
+    def path(self, arq):
+        return os.path.join(self.folder, _name(arq))
+
+    @property
+    def sharded(self):
+        return os.path.isdir(os.path.join(self.folder, _name(SHARDS_PATH)))
+
+    def shard_path(self, project_id, arq):
+        return os.path.join(self.folder, _name(SHARDS_PATH), f"project-{project_id}", _name(arq))
+
+    def archive_path(self, project_id, kind):
+        return os.path.join(self.folder, _name(ARCHIVE_PATH), f"project-{project_id}-{kind}.csv.gz")
+
+    def users(self):
+        return _read(self.path(USERS))
+
+    @contextmanager
+    def locked(self, paths):
+        # travas de vários arquivos do nó, as mesmas dos workers da API; a
+        # trava das transações vem antes, como em _rewriting_tables
+        with ExitStack() as locks:
+            for path in [self.path(TRANSACTION_LOCK)] + sorted(paths):
+                locks.enter_context(locked_file(path))
+            yield
+
+    def changed(self, data):
+        # a API do nó continua no ar: descarta os segmentos compartilhados e
+        # incrementa os contadores de geração (services/generations.py) de
+        # tudo o que a mudança pode ter tocado, para os workers descartarem
+        # os caches e as ETags do usuário
+        paths = [self.path(arq) for arq in (USERS, PROJECTS, LISTS, TASKS, COMMENTS, TOMBSTONES)]
+        paths.append(os.path.join(self.folder, _name(SHARDS_PATH), _name(SHARD_DIRECTORY)))
+        paths.append(os.path.join(self.folder, _name(ARCHIVE_PATH), _name(ARCHIVE_MAX_IDS)))
+        paths.extend(self.shard_path(pid, arq) for pid in data["ids"]["project"] for arq in (TASKS, COMMENTS))
+        relative = [os.path.relpath(path, self.folder) for path in paths]
+        keys = ["file:" + path.replace(os.sep, "/") for path in relative]
+
+        # segmentos do modo CSV_READ_MODE=shared (na pasta padrão): o próximo
+        # leitor publica de novo a partir dos CSVs
+        for path in relative:
+            try:
+                os.remove(os.path.join(self.folder, "shared", segment_name(path)))
+            except FileNotFoundError:
+                pass
+
+        scopes = [user_scope(user_id) for user_id in data["ids"]["user"]]
+        scopes.extend(project_scope(pid) for pid in data["ids"]["project"])
+        keys.extend(scope_key(scope) for scope in scopes)
+
+        counters = Generations(os.path.join(self.folder, GENERATIONS_FILE_NAME))
+        try:
+            counters.bump(*keys)
+        finally:
+            counters.close()
+
+    def subtree(self, user_id):
+        # linhas do usuário em cada tabela
+        user_id = str(user_id)
+        users = [u for u in self.users() if u.get("user_id") == user_id]
+        projects = [p for p in _read(self.path(PROJECTS)) if p.get("user_id") == user_id]
+        project_ids = {p["project_id"] for p in projects}
+        lists = [l for l in _read(self.path(LISTS)) if l.get("project_id") in project_ids]
+        list_ids = {l["list_id"] for l in lists}
+
+        if self.sharded:
+            tasks = [t for pid in sorted(project_ids) for t in _read(self.shard_path(pid, TASKS))]
+            comments = [c for pid in sorted(project_ids) for c in _read(self.shard_path(pid, COMMENTS))]
+        else:
+            tasks = [t for t in _read(self.path(TASKS)) if t.get("list_id") in list_ids]
+            task_ids = {t["task_id"] for t in tasks}
+            comments = [c for c in _read(self.path(COMMENTS)) if c.get("task_id") in task_ids]
+
+        ids = {
+            "user": {user_id} if users else set(),
+            "project": project_ids,
+            "list": list_ids,
+            "task": {t["task_id"] for t in tasks},
+            "comment": {c["comment_id"] for c in comments},
+        }
+        tombstones = [t for t in _read(self.path(TOMBSTONES)) if t.get("entity_id") in ids.get(t.get("entity"), ())]
+        return {"users": users, "projects": projects, "lists": lists, "tasks": tasks, "comments": comments,
+                "tombstones": tombstones, "ids": ids}
+
+
+# (chave no subtree, tabela, fieldnames, chave primária)
+TABLES = [
+    ("users", USERS, USER_FIELDNAMES, "user_id"),
+    ("projects", PROJECTS, PROJECT_FIELDNAMES, "project_id"),
+    ("lists", LISTS, LIST_FIELDNAMES, "list_id"),
+    ("tasks", TASKS, TASKS_FIELDNAMES, "task_id"),
+    ("comments", COMMENTS, COMMENTS_FIELDNAMES, "comment_id"),
+]
+
+
+def _merge(existing, new_rows, id_field, where):
+    # junta as linhas novas em ordem de id. Linha igual já presente é de uma
+    # mudança interrompida; id igual com outro conteúdo impede a mudança.
+    by_id = {row.get(id_field): row for row in existing}
+    added = []
+    for row in new_rows:
+        current = by_id.get(row.get(id_field))
+        if current is None:
+            added.append(row)
+        elif current != row:
+            raise RebalanceError(f"{where}: {id_field}={row.get(id_field)} já existe no destino com outro conteúdo")
+    return sorted(existing + added, key=_id_order(id_field)), added
+
+
+def _copy_to(target, data):
+    # confere todas as tabelas antes de gravar qualquer uma. Os arquivos do
+    # destino ficam travados da leitura até a gravação: escritas da API no
+    # nó esperam a cópia em vez de serem sobrescritas por ela.
+    directory = os.path.join(target.folder, _name(SHARDS_PATH), _name(SHARD_DIRECTORY))
+    paths = [target.path(TOMBSTONES)]
+    if target.sharded:
+        project_of_list = {l["list_id"]: l["project_id"] for l in data["lists"]}
+        project_ids = {project_of_list.get(t.get("list_id")) for t in data["tasks"]} - {None}
+        paths.append(directory)
+        for pid in project_ids:
+            os.makedirs(os.path.dirname(target.shard_path(pid, TASKS)), exist_ok=True)
+            paths.extend(target.shard_path(pid, arq) for arq in (TASKS, COMMENTS))
+    paths.extend(target.path(arq) for key, arq, *_ in TABLES if not (key in ("tasks", "comments") and target.sharded))
+
+    with target.locked(paths):
+        _copy_locked(target, data, directory)
+
+
+def _copy_locked(target, data, directory):
+    writes = []
+    directory_entries = []
+    for key, arq, fieldnames, id_field in TABLES:
+        rows = data[key]
+        if key in ("tasks", "comments") and target.sharded:
+            project_of_list = {l["list_id"]: l["project_id"] for l in data["lists"]}
+            project_of_task = {t["task_id"]: project_of_list.get(t.get("list_id")) for t in data["tasks"]}
+            by_project = {}
+            for row in rows:
+                pid = project_of_list.get(row.get("list_id")) if key == "tasks" else project_of_task.get(row.get("task_id"))
+                # linhas órfãs (sem lista/task) não vão para o destino
+                if pid is not None:
+                    by_project.setdefault(pid, []).append(row)
+            for pid, project_rows in by_project.items():
+                path = target.shard_path(pid, arq)
+                merged, _ = _merge(_read(path), project_rows, id_field, path)
+                writes.append((path, fieldnames, merged))
+                directory_entries.extend({"entity": key[:-1], "entity_id": row[id_field], "project_id": pid} for row in project_rows)
+        else:
+            path = target.path(arq)
+            merged, _ = _merge(_read(path), rows, id_field, path)
+            writes.append((path, fieldnames, merged))
+
+    # o diretório de shards antes das linhas (entradas repetidas não fazem mal)
+    if directory_entries:
+        _append(directory, SHARD_DIRECTORY_FIELDNAMES, directory_entries)
+
+    # filhos antes dos pais: se parar no meio, nada fica sem o pai no destino
+    for path, fieldnames, rows in reversed(writes):
+        _write(path, fieldnames, rows)
+
+    known = {(t["entity"], t["entity_id"]) for t in _read(target.path(TOMBSTONES))}
+    _append(target.path(TOMBSTONES), TOMBSTONE_FIELDNAMES,
+            [t for t in data["tombstones"] if (t["entity"], t["entity_id"]) not in known])
+
+
+def _move_archive(source, target, project_ids):
+    # arquivo morto: os arquivos do projeto vão inteiros; o maior id
+    # arquivado acompanha, para o destino nunca reaproveitar esses ids
+    moved = False
+    for pid in project_ids:
+        for kind in ("tasks", "comments"):
+            path = source.archive_path(pid, kind)
+            if os.path.exists(path):
+                os.makedirs(os.path.dirname(target.archive_path(pid, kind)), exist_ok=True)
+                shutil.copyfile(path, target.archive_path(pid, kind))
+                moved = True
+    if not moved:
+        return
+
+    def load(node):
+        try:
+            with open(os.path.join(node.folder, _name(ARCHIVE_PATH), _name(ARCHIVE_MAX_IDS)), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    max_ids = load(target)
+    for name, value in load(source).items():
+        max_ids[name] = max(max_ids.get(name, 0), value)
+    path = os.path.join(target.folder, _name(ARCHIVE_PATH), _name(ARCHIVE_MAX_IDS))
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(max_ids, file)
+    os.replace(path + ".tmp", path)
+
+
+def _remove_from(source, data):
+    # cada arquivo é relido e reescrito sob a sua trava, como nas reescritas
+    # da API: escritas de outras linhas feitas durante a mudança ficam
+    ids = data["ids"]
+    if source.sharded:
+        for pid in ids["project"]:
+            folder = os.path.dirname(source.shard_path(pid, TASKS))
+            if os.path.isdir(folder):
+                with source.locked([source.shard_path(pid, arq) for arq in (TASKS, COMMENTS)]):
+                    shutil.rmtree(folder, ignore_errors=True)
+    for key, arq, fieldnames, id_field in TABLES:
+        if key in ("tasks", "comments") and source.sharded:
+            continue
+        path = source.path(arq)
+        with locked_file(path):
+            rows = _read(path)
+            remaining = [r for r in rows if r.get(id_field) not in ids[key[:-1]]]
+            if len(remaining) != len(rows):
+                _write(path, fieldnames, remaining)
+
+    with locked_file(source.path(TOMBSTONES)):
+        tombstones = _read(source.path(TOMBSTONES))
+        remaining = [t for t in tombstones if t.get("entity_id") not in ids.get(t.get("entity"), ())]
+        if len(remaining) != len(tombstones):
+            _write(source.path(TOMBSTONES), TOMBSTONE_FIELDNAMES, remaining)
+
+    for pid in ids["project"]:
+        for kind in ("tasks", "comments"):
+            path = source.archive_path(pid, kind)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _nodes():
+    return {name: NodeData(name, config["db"]) for name, config in sorted(shard_map.nodes().items())}
+
+
+def _email_key(email):
+    return str(email or "").strip().lower()
+
+
+def _pins_for(user, node_name):
+    # pins que fazem o roteador achar o usuário neste nó (None = sem pin)
+    user_id, email = user["user_id"], _email_key(user.get("email"))
+    users = {user_id: None if shard_map.ring_node(f"user:{user_id}") == node_name else node_name}
+    emails = {email: None if shard_map.ring_node(f"email:{email}") == node_name else node_name} if email else {}
+    return users, emails
+
+
+def move_user(user_id, target_name, out=sys.stdout):
+    # copia a subárvore para o destino, aponta o roteador para lá e só então
+    # apaga da origem. Pode ser repetido depois de uma interrupção.
+    nodes = _nodes()
+    if target_name not in nodes:
+        raise RebalanceError(f"nó desconhecido: {target_name}")
+    target = nodes[target_name]
+    user_id = str(user_id)
+
+    sources = [node for name, node in nodes.items()
+               if name != target_name and any(u.get("user_id") == user_id for u in node.users())]
+    if not sources:
+        user = next((u for u in target.users() if u.get("user_id") == user_id), None)
+        if user is None:
+            raise RebalanceError(f"usuário {user_id} não encontrado em nenhum nó")
+        shard_map.set_pins(*_pins_for(user, target_name))
+        print(f"usuário {user_id} já está em {target_name}", file=out)
+        return
+
+    source = sources[0]
+    data = source.subtree(user_id)
+    _copy_to(target, data)
+    _move_archive(source, target, data["ids"]["project"])
+    target.changed(data)
+    shard_map.set_pins(*_pins_for(data["users"][0], target_name))
+    _remove_from(source, data)
+    source.changed(data)
+
+    counts = ", ".join(f"{len(data[key])} {key}" for key, *_ in TABLES[1:])
+    print(f"usuário {user_id}: {source.name} -> {target_name} ({counts})", file=out)
+
+
+def plan():
+    # (user_id, nó atual, nó pelo anel) dos usuários fora do lugar
+    moves = []
+    for name, node in _nodes().items():
+        for user in node.users():
+            owner = shard_map.ring_node(f"user:{user['user_id']}")
+            if owner != name:
+                moves.append((user["user_id"], name, owner))
+    return moves
+
+
+def pin_all(out=sys.stdout):
+    # fixa cada usuário (e email) no nó onde ele está, mesmo os que já estão
+    # no dono pelo anel: assim a mudança do mapa não desvia ninguém
+    users, emails = {}, {}
+    for name, node in _nodes().items():
+        for user in node.users():
+            users[user["user_id"]] = name
+            if user.get("email"):
+                emails[_email_key(user["email"])] = name
+    shard_map.set_pins(users, emails)
+    print(f"{len(users)} usuário(s) fixado(s)", file=out)
+
+
+def unpin_settled(out=sys.stdout):
+    # tira os pins que só repetem o dono pelo anel
+    users, emails = {}, {}
+    for name, node in _nodes().items():
+        for user in node.users():
+            user_pins, email_pins = _pins_for(user, name)
+            users.update({key: node for key, node in user_pins.items() if node is None})
+            emails.update({key: node for key, node in email_pins.items() if node is None})
+    shard_map.set_pins(users, emails)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.rebalance", description="Move usuários entre os nós do mapa de shards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("plan", help="mostra os usuários que precisam mudar de nó")
+    commands.add_parser("apply", help="move os usuários para o dono pelo anel")
+    commands.add_parser("pin", help="fixa cada usuário no nó onde ele está")
+    move = commands.add_parser("move", help="move um usuário para um nó")
+    move.add_argument("user_id")
+    move.add_argument("node")
+    args = parser.parse_args(argv)
+
+    if not shard_map.enabled:
+        print("defina SHARD_MAP com o caminho do mapa de shards", file=sys.stderr)
+        return 2
+
+    try:
+        if args.command == "plan":
+            moves = plan()
+            for user_id, current, owner in moves:
+                print(f"usuário {user_id}: {current} -> {owner}")
+            print(f"{len(moves)} usuário(s) para mover")
+        elif args.command == "apply":
+            failed = 0
+            for user_id, _, owner in plan():
+                try:
+                    move_user(user_id, owner)
+                except RebalanceError as error:
+                    failed += 1
+                    print(f"usuário {user_id}: não movido - {error}")
+            unpin_settled()
+            return 1 if failed else 0
+        elif args.command == "pin":
+            pin_all()
+        else:
+            move_user(args.user_id, args.node)
+    except RebalanceError as error:
+        print(f"erro: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# Roteador dos nós (tenant sharding por usuário).
+#
+# Aplicação WSGI que só encaminha: cada requisição vai para o nó dono do
+# usuário, segundo o mapa de shards (SHARD_MAP). Com token JWT (header ou
+# ?jwt=), o dono é o do user_id do token; /register e /login (sem token) vão
+# para o dono do email do corpo; o resto (/, /apidocs...) vai para o
+# primeiro nó.
+#
+#   SHARD_MAP=shards.json JWT_SECRET_KEY=... python -m services.router --port 5000
+#
+# Em produção: gunicorn "services.router:application".
+
+import os
+import sys
+import json
+import argparse
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs
+import jwt
+from dotenv import load_dotenv
+
+# o .env precisa valer antes de o mapa de shards ser lido
+load_dotenv()
+
+from services.shard_map import shard_map
+
+# tempo máximo de espera por um nó
+ROUTER_TIMEOUT_SECONDS = float(os.getenv("ROUTER_TIMEOUT_SECONDS", 30))
+
+# rotas sem token roteadas pelo email do corpo
+EMAIL_ROUTES = {"/register", "/login"}
+
+# cabeçalhos de uma conexão só (não são repassados)
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+              "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # redirecionamentos do nó voltam para o cliente (o Location é relativo)
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# sem proxies do ambiente: os nós são acessados direto
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _NoRedirect)
+
+
+def _json_response(start_response, status, data):
+    body = json.dumps(data).encode("utf-8")
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+class Router:
+
+    def __init__(self, shard_map, secret):
+        self.shard_map = shard_map
+        self.secret = secret
+
+    def _token_user(self, environ):
+        # user_id do token (a assinatura é conferida; a validade fica com o
+        # nó). O token vem do header ou do parâmetro ?jwt= (EventSource, que
+        # não envia headers, ver /user/projects/<id>/events)
+        auth = environ.get("HTTP_AUTHORIZATION", "")
+        if auth.startswith("Bearer "):
+            token = auth[len("Bearer "):]
+        else:
+            token = next(iter(parse_qs(environ.get("QUERY_STRING", "")).get("jwt", [])), None)
+        if not token:
+            return None
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=["HS256"], options={"verify_exp": False})
+        except jwt.InvalidTokenError:
+            return None
+        return claims.get("sub")
+
+    def pick_node(self, environ, body):
+        user_id = self._token_user(environ)
+        if user_id is not None:
+            return self.shard_map.node_for_user(user_id)
+
+        if environ.get("PATH_INFO") in EMAIL_ROUTES and body:
+            try:
+                email = json.loads(body).get("email")
+            except (ValueError, AttributeError):
+                email = None
+            if email:
+                return self.shard_map.node_for_email(email)
+
+        # sem usuário: qualquer nó responde (o mesmo sempre, para os caches)
+        nodes = self.shard_map.nodes()
+        return min(nodes) if nodes else None
+
+    def __call__(self, environ, start_response):
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        body = environ["wsgi.input"].read(length) if length else b""
+
+        name = self.pick_node(environ, body)
+        node = self.shard_map.node(name)
+        if node is None:
+            return _json_response(start_response, "503 Service Unavailable", {"error": "Nenhum nó configurado"})
+
+        url = node["url"].rstrip("/") + environ.get("PATH_INFO", "/")
+        if environ.get("QUERY_STRING"):
+            url += "?" + environ["QUERY_STRING"]
+
+        headers = {key[5:].replace("_", "-").title(): value for key, value in environ.items()
+                   if key.startswith("HTTP_") and key[5:].replace("_", "-").lower() not in HOP_BY_HOP}
+        if environ.get("CONTENT_TYPE"):
+            headers["Content-Type"] = environ["CONTENT_TYPE"]
+        headers["X-Forwarded-For"] = environ.get("REMOTE_ADDR", "")
+
+        request = urllib.request.Request(url, data=body if body or environ["REQUEST_METHOD"] in ("POST", "PUT", "PATCH") else None,
+                                         headers=headers, method=environ["REQUEST_METHOD"])
+        try:
+            response = _opener.open(request, timeout=ROUTER_TIMEOUT_SECONDS)
+        except urllib.error.HTTPError as error:
+            # 3xx/4xx/5xx do nó: repassados como vieram
+            response = error
+        except (urllib.error.URLError, OSError):
+            return _json_response(start_response, "502 Bad Gateway", {"error": f"Nó {name} indisponível"})
+
+        status = f"{response.status} {response.reason}"
+        response_headers = [(key, value) for key, value in response.headers.items() if key.lower() not in HOP_BY_HOP]
+        if response.headers.get("Content-Length") and not response.headers.get("Transfer-Encoding"):
+            response_headers.append(("Content-Length", response.headers["Content-Length"]))
+        response_headers.append(("X-Shard-Node", name))
+        start_response(status, response_headers)
+
+        # repassa em pedaços, assim que chegam (ex.: eventos SSE)
+        def stream():
+            with response:
+                while True:
+                    chunk = response.read1(64 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return stream()
+
+
+application = Router(shard_map, os.getenv("JWT_SECRET_KEY", ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.router", description="Encaminha as requisições para o nó dono do usuário.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if not shard_map.enabled:
+        print("defina SHARD_MAP com o caminho do mapa de shards", file=sys.stderr)
+        return 2
+
+    from werkzeug.serving import run_simple
+    run_simple(args.host, args.port, application, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import os
+import json
+import bisect
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# mapa de shards (vários nós, cada um com a sua pasta db/). Vazio: um nó só.
+# Formato do arquivo JSON:
+#   {
+#     "id_stride": 16,
+#     "vnodes": 64,
+#     "nodes": {"a": {"url": "http://127.0.0.1:5001", "db": "/dados/a", "index": 0}, ...},
+#     "pins": {"users": {"<user_id>": "<nó>"}, "emails": {"<email>": "<nó>"}}
+#   }
+SHARD_MAP = os.getenv("SHARD_MAP", "")
+# nome deste nó no mapa (vazio no roteador e nas ferramentas)
+NODE_NAME = os.getenv("NODE_NAME", "")
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ShardMap:
+    # distribui os usuários entre os nós por hashing consistente: cada nó
+    # ocupa `vnodes` pontos de um anel e a chave vai para o primeiro ponto
+    # depois do seu hash, então incluir ou tirar um nó só muda o dono das
+    # chaves vizinhas. Usuários (por user_id) e emails (para /register e
+    # /login, que ainda não têm token) usam o mesmo anel. Os pins fixam um
+    # usuário/email num nó enquanto ele não é movido pelo rebalanceamento.
+
+    def __init__(self, path, node_name):
+        self.path = path
+        self.node_name = node_name
+        self.lock = threading.Lock()
+        self.key = None
+        self.config = {"nodes": {}, "pins": {"users": {}, "emails": {}}}
+        self.ring = []
+        self.points = []
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _load(self):
+        # relido apenas quando o arquivo muda (o rebalanceamento grava pins)
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if self.key == key:
+            return self.config
+
+        with self.lock:
+            if self.key != key:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    config = json.load(file)
+                config.setdefault("pins", {})
+                config["pins"].setdefault("users", {})
+                config["pins"].setdefault("emails", {})
+
+                vnodes = int(config.get("vnodes", 64))
+                ring = sorted((_hash(f"{name}#{number}"), name) for name in config["nodes"] for number in range(vnodes))
+                self.ring = ring
+                self.points = [point for point, _ in ring]
+                self.config = config
+                self.key = key
+        return self.config
+
+    def nodes(self):
+        return self._load()["nodes"]
+
+    def node(self, name):
+        return self.nodes().get(name)
+
+    def ring_node(self, key):
+        # dono da chave pelo anel, ignorando os pins
+        self._load()
+        if not self.ring:
+            return None
+        position = bisect.bisect_right(self.points, _hash(key)) % len(self.ring)
+        return self.ring[position][1]
+
+    def node_for_user(self, user_id):
+        pinned = self._load()["pins"]["users"].get(str(user_id))
+        return pinned or self.ring_node(f"user:{user_id}")
+
+    def node_for_email(self, email):
+        email = str(email).strip().lower()
+        pinned = self._load()["pins"]["emails"].get(email)
+        return pinned or self.ring_node(f"email:{email}")
+
+    def next_id(self, last_id, user=False):
+        # próximo id deste nó depois de last_id. Os ids são repartidos entre
+        # os nós (id % id_stride == index do nó), então uma subárvore pode
+        # mudar de nó sem colidir com os ids de lá; um user_id novo também
+        # precisa cair neste nó pelo anel, para o roteador achá-lo.
+        if not self.enabled or not self.node_name:
+            return last_id + 1
+
+        config = self._load()
+        stride = int(config.get("id_stride", 1))
+        index = int(config["nodes"][self.node_name]["index"])
+        candidate = last_id + 1
+        while True:
+            if candidate % stride == index and (not user or self.node_for_user(candidate) == self.node_name):
+                return candidate
+            candidate += 1
+
+    def claim_email(self, email, old_email=None):
+        # um email cadastrado/alterado neste nó precisa ser roteado para cá
+        if not self.enabled or not self.node_name:
+            return
+        pins = {}
+        if self.node_for_email(email) != self.node_name:
+            pins[str(email).strip().lower()] = self.node_name
+        if old_email and self._load()["pins"]["emails"].get(str(old_email).strip().lower()) == self.node_name:
+            pins[str(old_email).strip().lower()] = None
+        if pins:
+            self.set_pins(emails=pins)
+
+    def set_pins(self, users=None, emails=None):
+        # grava pins ({chave: nó}; nó None remove o pin) com lê-altera-grava
+        # sob trava de arquivo, porque nós e ferramentas dividem o mapa
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    config = json.load(file)
+                pins = config.setdefault("pins", {})
+                for kind, changes in (("users", users), ("emails", emails)):
+                    current = pins.setdefault(kind, {})
+                    for key, node in (changes or {}).items():
+                        if node is None:
+                            current.pop(str(key), None)
+                        else:
+                            current[str(key)] = node
+
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json.dump(config, file, indent=2)
+                os.replace(tmp_path, self.path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+shard_map = ShardMap(SHARD_MAP, NODE_NAME)
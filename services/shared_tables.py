@@ -0,0 +1,155 @@
+import os
+import mmap
+import struct
+import bisect
+import marshal
+import threading
+from array import array
+
+# Segmentos de tabela compartilhados entre os workers (CSV_READ_MODE=shared).
+#
+# Um segmento é a foto imutável de uma tabela num arquivo binário, mapeado
+# em memória (somente leitura) por todos os processos: as páginas são as
+# mesmas para todos os workers, então a tabela ocupa memória uma vez por
+# host, e não uma vez por worker. Nada é copiado para o processo: a busca
+# por id é um bisect direto nos arrays do arquivo e só a linha encontrada é
+# decodificada.
+#
+# Formato (inteiros na ordem de bytes do host: o segmento é local ao nó):
+#   cabeçalho  magic, csv_size, csv_mtime_ns, tail_crc, flags, rows, max_id,
+#              bytes dos nomes das colunas, bytes das linhas
+#   colunas    marshal da tupla de nomes (alinhado em 8 bytes)
+#   ids        int64[rows], na ordem do arquivo (-1 para id não numérico)
+#   ordem      int64[rows], posições das linhas ordenadas por id (só se os
+#              ids do arquivo não estiverem em ordem)
+#   offsets    int64[rows + 1], início de cada linha na área de dados
+#   dados      marshal da tupla de valores de cada linha
+#
+# csv_size, csv_mtime_ns e tail_crc identificam o trecho do CSV que o
+# segmento cobre: o que foi acrescentado ao CSV depois dele é a camada de
+# alterações (ver _shared_view em services/csv_service.py).
+
+SEGMENT_MAGIC = b"GPSEG01\n"
+
+_HEADER = struct.Struct("=8sQqIIQqQQ")
+_SORTED = 1
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def segment_name(relative_path):
+    # shards/project-1/tasks.csv -> shards__project-1__tasks.csv.seg
+    return relative_path.replace("\\", "/").replace("/", "__") + ".seg"
+
+
+def write_segment(path, fieldnames, rows, id_field, csv_size, csv_mtime_ns, tail_crc):
+    # grava a foto da tabela (rows: dicts) num temporário e troca: quem já
+    # mapeou o segmento anterior continua lendo ele até trocar de segmento
+    fieldnames = tuple(fieldnames)
+    ids = []
+    max_id = 0
+    for row in rows:
+        try:
+            entity_id = int(row.get(id_field))
+        except (TypeError, ValueError):
+            entity_id = -1
+        ids.append(entity_id)
+        max_id = max(max_id, entity_id)
+
+    in_order = all(ids[i] <= ids[i + 1] for i in range(len(ids) - 1))
+    order = [] if in_order else sorted(range(len(ids)), key=ids.__getitem__)
+
+    data = bytearray()
+    offsets = [0]
+    for row in rows:
+        data += marshal.dumps(tuple(row.get(field) for field in fieldnames))
+        offsets.append(len(data))
+
+    names = marshal.dumps(fieldnames)
+    header = _HEADER.pack(SEGMENT_MAGIC, csv_size, csv_mtime_ns, tail_crc, _SORTED if in_order else 0,
+                          len(rows), max_id, len(names), len(data))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(header)
+            file.write(names)
+            file.write(bytes(_align(len(names)) - len(names)))
+            file.write(array("q", ids).tobytes())
+            file.write(array("q", order).tobytes())
+            file.write(array("q", offsets).tobytes())
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Segment:
+    # segmento mapeado em memória; as linhas devolvidas são dicts novos
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.ino = os.fstat(file.fileno()).st_ino
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.csv_size, self.csv_mtime_ns, self.tail_crc, flags,
+         self.count, self.max_id, names_size, data_size) = _HEADER.unpack_from(self.mm, 0)
+        if magic != SEGMENT_MAGIC:
+            self.mm.close()
+            raise ValueError(f"segmento inválido: {path}")
+
+        view = memoryview(self.mm)
+        pos = _HEADER.size
+        self.fieldnames = marshal.loads(view[pos:pos + names_size])
+        pos += _align(names_size)
+
+        self.ids = view[pos:pos + 8 * self.count].cast("q")
+        pos += 8 * self.count
+        if flags & _SORTED:
+            self.order = None
+        else:
+            self.order = view[pos:pos + 8 * self.count].cast("q")
+            pos += 8 * self.count
+        self.offsets = view[pos:pos + 8 * (self.count + 1)].cast("q")
+        pos += 8 * (self.count + 1)
+        self.data = view[pos:pos + data_size]
+
+    def row(self, position):
+        values = marshal.loads(self.data[self.offsets[position]:self.offsets[position + 1]])
+        return dict(zip(self.fieldnames, values))
+
+    def rows(self):
+        fieldnames, data, offsets, loads = self.fieldnames, self.data, self.offsets, marshal.loads
+        return [dict(zip(fieldnames, loads(data[offsets[i]:offsets[i + 1]]))) for i in range(self.count)]
+
+    def find(self, entity_id):
+        # primeira linha com o id (como o by_id das tabelas em memória)
+        try:
+            wanted = int(entity_id)
+        except (TypeError, ValueError):
+            return None
+        if wanted < 0:
+            return None
+
+        if self.order is None:
+            position = bisect.bisect_left(self.ids, wanted)
+            if position < self.count and self.ids[position] == wanted:
+                return self.row(position)
+            return None
+
+        # ids fora de ordem no arquivo: bisect sobre a permutação ordenada
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.ids[self.order[middle]] < wanted:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.ids[self.order[low]] == wanted:
+            return self.row(self.order[low])
+        return None
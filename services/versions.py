@@ -0,0 +1,43 @@
+from services.generations import generations
+
+# funções chamadas com os escopos alterados a cada escrita (ex: caches)
+_listeners = []
+
+
+def get_epoch():
+    # identificador dos contadores: muda quando eles recomeçam do zero
+    # (restart no modo local ou arquivo de gerações recriado), evitando que
+    # uma ETag emitida antes seja aceita
+    return generations.get_epoch()
+
+
+def user_scope(user_id):
+    # dados do usuário e a lista de projetos dele
+    return ("user", str(user_id))
+
+
+def project_scope(project_id):
+    # o projeto e toda a sua subárvore (listas, tasks e comentários)
+    return ("project", str(project_id))
+
+
+# contadores de versão por escopo, incrementados a cada escrita. Ficam nos
+# contadores compartilhados (services/generations.py), então uma escrita em
+# um worker muda as ETags e invalida os caches de resposta de todos.
+def scope_key(scope):
+    return "scope:" + ":".join(scope)
+
+
+def get_version(scope):
+    return generations.get(scope_key(scope))
+
+
+def bump(*scopes):
+    generations.bump(*[scope_key(scope) for scope in scopes])
+
+    for listener in _listeners:
+        listener(scopes)
+
+
+def add_listener(listener):
+    _listeners.append(listener)
@@ -0,0 +1,106 @@
+import os
+import time
+import logging
+import threading
+from services.csv_service import data_files, warm_table, warm_user_tasks, get_last_change_seq
+
+logger = logging.getLogger(__name__)
+
+# sem o warm-up na subida, o worker já nasce pronto (as tabelas são
+# carregadas pela primeira requisição que precisar delas)
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "True") == "True"
+
+_state = {
+    "enabled": WARMUP_ON_START,
+    "ready": not WARMUP_ON_START,
+    "running": False,
+    "error": None,
+    "step": None,
+    "steps_done": 0,
+    "steps_total": None,
+    "rows": 0,
+    "seconds": None,
+}
+_lock = threading.Lock()
+# warm-up interrompido por um fork, a ser refeito no processo filho
+_interrupted = False
+
+
+def warmup_status():
+    # /ready é o que o balanceador consulta antes de mandar tráfego: um
+    # warm-up interrompido pelo fork recomeça aqui
+    if _interrupted:
+        start_warmup()
+    with _lock:
+        return dict(_state)
+
+
+def _progress(**values):
+    with _lock:
+        _state.update(values)
+
+
+def run_warmup():
+    # carrega e indexa todas as tabelas, o índice de tasks por usuário e o
+    # histórico de alterações, para que as primeiras requisições não paguem
+    # por isso
+    started = time.perf_counter()
+    rows = 0
+    _progress(running=True, ready=False, error=None, steps_done=0, rows=0)
+
+    try:
+        # ordem de carga: tabelas pequenas primeiro (com shards, um arquivo por projeto)
+        tables = data_files()
+        _progress(steps_total=len(tables) + 2)
+        for number, arq in enumerate(tables, start=1):
+            _progress(step=arq)
+            table_started = time.perf_counter()
+            table_rows = warm_table(arq)
+            rows += table_rows
+            _progress(steps_done=number, rows=rows)
+            logger.info("warm-up: %s carregado (%d linhas em %.3fs)", arq, table_rows, time.perf_counter() - table_started)
+
+        _progress(step="user_tasks_index")
+        warm_user_tasks()
+        _progress(steps_done=len(tables) + 1)
+
+        _progress(step="changes")
+        get_last_change_seq()
+        _progress(steps_done=len(tables) + 2)
+    except Exception as error:
+        logger.exception("warm-up falhou")
+        _progress(running=False, error=str(error))
+        return
+
+    seconds = time.perf_counter() - started
+    per_million = seconds / rows * 1_000_000 if rows else 0.0
+    logger.info("warm-up concluído: %d linhas em %.3fs (%.3fs por milhão de linhas)", rows, seconds, per_million)
+    _progress(running=False, ready=True, step=None, seconds=round(seconds, 3))
+
+
+def start_warmup():
+    global _interrupted
+    with _lock:
+        _interrupted = False
+        if _state["running"] or _state["ready"]:
+            return
+        _state["running"] = True
+
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
+
+
+def _reopen():
+    # depois de um fork (gunicorn --preload): o filho herda o estado, mas
+    # não a thread do warm-up. Um warm-up já concluído vale para o filho
+    # (as tabelas vieram com a memória); um pela metade fica marcado e é
+    # refeito na primeira consulta ao /ready. Nada roda aqui: o fork pode
+    # ser de um processo auxiliar (ex.: o pool da leitura paralela).
+    global _lock, _interrupted
+    _lock = threading.Lock()
+    if _state["running"]:
+        _state["running"] = False
+        _interrupted = True
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reopen)
@@ -0,0 +1,207 @@
+import os
+import csv
+import time
+import threading
+from collections import deque
+
+# liga/desliga a fila de escrita (desligada: cada escrita vai direto ao disco)
+WRITE_QUEUE = os.getenv("WRITE_QUEUE", "True") == "True"
+# durabilidade: "none" (sem fsync), "batch" (um fsync por arquivo a cada lote)
+# ou "write" (um fsync a cada escrita)
+WRITE_DURABILITY = os.getenv("WRITE_DURABILITY", "none")
+# quanto tempo o escritor espera juntando escritas antes de gravar um lote
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", 2))
+# máximo de escritas por lote
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", 500))
+
+DURABILITY_MODES = ("none", "batch", "write")
+
+
+class WriteQueue:
+    # fila de escrita com group commit: as escritas de todas as threads são
+    # enfileiradas e uma thread escritora grava em lotes, abrindo cada
+    # arquivo uma única vez por lote. Quem escreve espera a confirmação do
+    # lote (wait), então continua lendo o que acabou de gravar.
+
+    def __init__(self, enabled, durability, window_ms, max_batch):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"WRITE_DURABILITY inválido: {durability}")
+        self.enabled = enabled
+        self.durability = durability
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.pending = deque()
+        self.in_progress = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.batches = 0
+        self.writes = 0
+        self.fsyncs = 0
+        self.largest_batch = 0
+
+    def submit(self, op, arq, fieldnames, rows):
+        # op: "append" (acrescenta linhas) ou "overwrite" (reescreve o arquivo)
+        entry = {"op": op, "arq": arq, "fieldnames": fieldnames, "rows": rows,
+                 "done": threading.Event(), "error": None}
+
+        if not self.enabled:
+            self._apply([entry])
+            entry["done"].set()
+            return entry
+
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self.thread.start()
+            self.pending.append(entry)
+            self.condition.notify_all()
+        return entry
+
+    def wait(self, entry):
+        entry["done"].wait()
+        if entry["error"] is not None:
+            raise entry["error"]
+
+    def write(self, op, arq, fieldnames, rows):
+        self.wait(self.submit(op, arq, fieldnames, rows))
+
+    def flush(self):
+        # espera tudo o que já estava na fila ser gravado
+        with self.condition:
+            queued = self.pending or self.in_progress
+            last = queued[-1] if queued else None
+        if last is not None:
+            last["done"].wait()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+
+            # janela curta para juntar as escritas de outras threads
+            if self.window:
+                time.sleep(self.window)
+
+            with self.condition:
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.max_batch))]
+                self.in_progress = batch
+
+            try:
+                self._apply(batch)
+            finally:
+                with self.condition:
+                    self.in_progress = []
+                for entry in batch:
+                    entry["done"].set()
+
+    def _sync(self, file):
+        file.flush()
+        os.fsync(file.fileno())
+        self.fsyncs += 1
+
+    def _replace(self, arq, fieldnames, rows):
+        # reescreve em um arquivo temporário e troca: quem lê (outra thread
+        # ou outro worker) vê o arquivo antigo ou o novo, nunca um pela
+        # metade, e uma queda no meio não deixa a tabela truncada
+        tmp_path = f"{arq}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+                if self.durability != "none":
+                    self._sync(file)
+            os.replace(tmp_path, arq)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # a troca só é durável depois do fsync da pasta
+        if self.durability != "none":
+            self._sync_directory(os.path.dirname(arq) or ".")
+
+    def _sync_directory(self, path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+            self.fsyncs += 1
+        except OSError:
+            # sistemas sem fsync de pastas (ex.: Windows)
+            pass
+        finally:
+            os.close(fd)
+
+    def _apply(self, batch):
+        files = {}
+        try:
+            for entry in batch:
+                arq = entry["arq"]
+                try:
+                    if entry["op"] == "append":
+                        file = files.get(arq)
+                        if file is None:
+                            file = files[arq] = open(arq, "a", encoding="utf-8", newline="")
+                        writer = csv.DictWriter(file, fieldnames=entry["fieldnames"])
+                        if file.tell() == 0:
+                            writer.writeheader()
+                        writer.writerows(entry["rows"])
+                        if self.durability == "write":
+                            self._sync(file)
+                    else:
+                        # appends anteriores do mesmo lote vão para o disco antes
+                        file = files.pop(arq, None)
+                        if file is not None:
+                            file.close()
+                        self._replace(arq, entry["fieldnames"], entry["rows"])
+                except Exception as error:
+                    entry["error"] = error
+        finally:
+            for arq, file in files.items():
+                try:
+                    if self.durability == "batch":
+                        self._sync(file)
+                    file.close()
+                except Exception as error:
+                    for entry in batch:
+                        if entry["arq"] == arq and entry["error"] is None:
+                            entry["error"] = error
+
+            self.batches += 1
+            self.writes += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def reopen(self):
+        # depois de um fork (gunicorn --preload): o filho herda a thread
+        # escritora já iniciada, mas ela não existe nele, e a fila/condição
+        # podem ter sido copiadas no meio de um uso. O filho começa com uma
+        # fila vazia e sobe a sua thread na primeira escrita; o que estava
+        # pendente é gravado pelo processo pai.
+        self.pending = deque()
+        self.in_progress = []
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def stats(self):
+        with self.condition:
+            pending = len(self.pending)
+        return {
+            "enabled": self.enabled,
+            "durability": self.durability,
+            "pending": pending,
+            "batches": self.batches,
+            "writes": self.writes,
+            "fsyncs": self.fsyncs,
+            "largest_batch": self.largest_batch,
+            "writes_per_batch": round(self.writes / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+write_queue = WriteQueue(WRITE_QUEUE, WRITE_DURABILITY, WRITE_BATCH_WINDOW_MS, WRITE_BATCH_MAX)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=write_queue.reopen)
@@ -0,0 +1,149 @@
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_DB = os.path.join(ROOT, "db")
+JWT_SECRET = "chave-de-teste-" + "x" * 32
+
+# A configuração é lida quando os serviços são importados: a pasta de dados
+# (uma cópia dos CSVs de exemplo) e as flags precisam estar definidas antes
+# de importar a aplicação.
+TEST_DB = tempfile.mkdtemp(prefix="gestao-tests-")
+for name in os.listdir(SEED_DB):
+    if name.endswith(".csv"):
+        shutil.copy(os.path.join(SEED_DB, name), TEST_DB)
+
+# configuração padrão, independente de um .env local; o warm-up é
+# disparado pelos próprios testes (ver test_warmup.py)
+BASE_ENV = {
+    "JWT_SECRET_KEY": JWT_SECRET,
+    "WARMUP_ON_START": "False",
+    "SOFT_DELETE": "False",
+    "SHARDED_STORAGE": "False",
+    "CSV_READ_MODE": "memory",
+    "METRICS_ENABLED": "False",
+    "SHARD_MAP": "",
+    "NODE_NAME": "",
+}
+os.environ.update(BASE_ENV, DB_PATH=TEST_DB)
+sys.path.insert(0, ROOT)
+
+from app import app as flask_app  # noqa: E402
+
+_emails = itertools.count(1)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DB, ignore_errors=True)
+
+
+@pytest.fixture
+def seed_db(tmp_path):
+    # pasta com uma cópia dos CSVs de exemplo, fora da usada pela aplicação
+    folder = str(tmp_path / "db")
+    os.makedirs(folder)
+    for name in os.listdir(SEED_DB):
+        if name.endswith(".csv"):
+            shutil.copy(os.path.join(SEED_DB, name), folder)
+    return folder
+
+
+@pytest.fixture
+def app():
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register_and_login(client, name="Teste", password="1234"):
+    email = f"teste{next(_emails)}-{os.getpid()}@example.com"
+    response = client.post("/register", json={"email": email, "password": password, "name": name})
+    assert response.status_code == 201, response.json
+    token = client.post("/login", json={"email": email, "password": password}).json["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def new_user(client):
+    # cada chamada cadastra outro usuário e devolve os headers com o token dele
+    return lambda: register_and_login(client)
+
+
+@pytest.fixture
+def auth(new_user):
+    # cada teste tem o seu usuário, então os testes não enxergam os dados uns dos outros
+    return new_user()
+
+
+def create_board(client, auth, title="Projeto"):
+    # um projeto com uma lista e uma task, criados pela API
+    project = client.post("/user/projects/", headers=auth, json={"project_title": title, "project_description": ""}).json["data"]
+    project_id = project["project_id"]
+    lista = client.post(f"/user/projects/{project_id}/lists/", headers=auth, json={"list_name": "A Fazer"}).json["data"]
+    list_id = lista["list_id"]
+    task = client.post(f"/user/projects/{project_id}/lists/{list_id}/tasks/", headers=auth, json={"title": "Task", "description": ""}).json["data"]
+    return {
+        "project_id": project_id,
+        "list_id": list_id,
+        "task_id": task["task_id"],
+        "tasks_url": f"/user/projects/{project_id}/lists/{list_id}/tasks",
+    }
+
+
+@pytest.fixture
+def make_board(client, auth):
+    return lambda title="Projeto": create_board(client, auth, title)
+
+
+@pytest.fixture
+def board(make_board):
+    return make_board()
+
+
+# código inicial dos processos de `run_isolated`: a aplicação e um
+# cliente de teste, com login() cadastrando o usuário se preciso
+ISOLATED_APP = """
+from app import app
+client = app.test_client()
+
+def login(email, password="1234", name="Teste", register=True):
+    if register:
+        client.post("/register", json={"email": email, "password": password, "name": name})
+    response = client.post("/login", json={"email": email, "password": password})
+    if response.status_code != 200:
+        return None
+    return {"Authorization": "Bearer " + response.json["access_token"]}
+"""
+
+
+def run_isolated(code, app=True, **env):
+    # roda `code` em outro processo, com a aplicação importada com outra
+    # configuração (flags como SHARDED_STORAGE valem para o processo todo);
+    # a última linha impressa é lida como JSON
+    process_env = dict(os.environ, **BASE_ENV)
+    process_env.update({key: str(value) for key, value in env.items()})
+    prelude = (
+        "import json, os, sys\n"
+        f"sys.path.insert(0, {ROOT!r})\n"
+    )
+    if app:
+        prelude += ISOLATED_APP
+    result = subprocess.run([sys.executable, "-c", prelude + code], cwd=ROOT, env=process_env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture
+def isolated():
+    return run_isolated
@@ -0,0 +1,85 @@
+import time
+
+
+def _archive(client, auth, project_id, **body):
+    response = client.post(f"/user/projects/{project_id}/archive/", headers=auth, json=body)
+    assert response.status_code == 202, response.json
+    job_id = response.json["data"]["job_id"]
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}", headers=auth).json["data"]
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("o arquivamento não terminou a tempo")
+
+
+def _hot_ids(client, auth, board):
+    data = client.get(f"{board['tasks_url']}/", headers=auth).json.get("data", {"tasks": []})
+    return sorted(t["task_id"] for t in data["tasks"])
+
+
+def _complete(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    assert client.put(url, headers=auth, json={"title": "Task", "completed": True}).status_code == 200
+    response = client.post(f"{url}/comments/", headers=auth, json={"content": "Feito!"})
+    assert response.status_code == 201
+
+
+def test_archive_and_restore_completed_task(client, auth, board):
+    _complete(client, auth, board)
+    pending = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Pendente", "description": ""}).json["data"]
+    project_url = f"/user/projects/{board['project_id']}"
+
+    job = _archive(client, auth, board["project_id"], older_than_days=0)
+    assert job["status"] == "succeeded"
+
+    # só a task concluída sai da tabela quente
+    assert _hot_ids(client, auth, board) == [pending["task_id"]]
+
+    archived = client.get(f"{project_url}/archive/tasks", headers=auth).json["data"]
+    assert [t["task_id"] for t in archived] == [board["task_id"]]
+    detail = client.get(f"{project_url}/archive/tasks/{board['task_id']}", headers=auth).json["data"]
+    assert [c["content"] for c in detail["comments"]] == ["Feito!"]
+
+    response = client.post(f"{project_url}/archive/tasks/{board['task_id']}/restore", headers=auth)
+    assert response.status_code == 200
+    assert _hot_ids(client, auth, board) == sorted([board["task_id"], pending["task_id"]])
+    comments = client.get(f"{board['tasks_url']}/{board['task_id']}/comments/", headers=auth).json["data"]["comments"]
+    assert [c["content"] for c in comments] == ["Feito!"]
+    assert client.get(f"{project_url}/archive/tasks", headers=auth).json["data"] == []
+
+
+def test_recent_tasks_are_kept(client, auth, board):
+    _complete(client, auth, board)
+    assert _archive(client, auth, board["project_id"])["status"] == "succeeded"
+    assert _hot_ids(client, auth, board) == [board["task_id"]]
+
+
+def test_archived_ids_are_not_reused(client, auth, board):
+    _complete(client, auth, board)
+    _archive(client, auth, board["project_id"], older_than_days=0)
+
+    task = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Nova", "description": ""}).json["data"]
+    assert int(task["task_id"]) > int(board["task_id"])
+
+
+def test_deleting_a_list_drops_its_archived_tasks(client, auth, board):
+    _complete(client, auth, board)
+    _archive(client, auth, board["project_id"], older_than_days=0)
+    project_url = f"/user/projects/{board['project_id']}"
+
+    other_list = client.post(f"{project_url}/lists/", headers=auth, json={"list_name": "Outra"}).json["data"]
+    assert other_list["list_id"] != board["list_id"]
+    client.delete(f"{project_url}/lists/{board['list_id']}", headers=auth)
+
+    response = client.post(f"{project_url}/archive/tasks/{board['task_id']}/restore", headers=auth)
+    assert response.status_code == 404
+    assert client.get(f"{project_url}/archive/tasks", headers=auth).json["data"] == []
+
+
+def test_invalid_age_and_other_users(client, auth, board, new_user):
+    project_url = f"/user/projects/{board['project_id']}/archive"
+    response = client.post(f"{project_url}/", headers=auth, json={"older_than_days": -1})
+    assert response.status_code == 400
+    assert client.get(f"{project_url}/tasks", headers=new_user()).status_code == 403
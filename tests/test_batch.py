@@ -0,0 +1,108 @@
+import threading
+
+from services import csv_service
+
+
+def _titles(client, auth, board):
+    return [task["title"] for task in client.get(f"{board['tasks_url']}/", headers=auth).json["data"]["tasks"]]
+
+
+def test_atomic_batch_rolls_back_on_failure(client, auth, board):
+    before = _titles(client, auth, board)
+    response = client.post("/batch/", headers=auth, json={"atomic": True, "requests": [
+        {"method": "POST", "path": f"{board['tasks_url']}/", "body": {"title": "Nova"}},
+        {"method": "PUT", "path": f"{board['tasks_url']}/{board['task_id']}", "body": {"title": "Editada"}},
+        {"method": "GET", "path": f"{board['tasks_url']}/999999"},
+    ]})
+    assert response.status_code == 400
+    data = response.json["data"]
+    assert data["committed"] is False
+    assert data["failed_index"] == 2
+    assert [item["status"] for item in data["responses"]] == [201, 200, 404]
+
+    assert _titles(client, auth, board) == before
+
+
+def test_atomic_batch_commits_when_all_succeed(client, auth, board):
+    response = client.post("/batch/", headers=auth, json={"atomic": True, "requests": [
+        {"method": "POST", "path": f"{board['tasks_url']}/", "body": {"title": "Nova"}},
+        {"method": "PUT", "path": f"{board['tasks_url']}/{board['task_id']}", "body": {"title": "Editada"}},
+    ]})
+    assert response.status_code == 200
+    assert response.json["data"]["committed"] is True
+    assert sorted(_titles(client, auth, board)) == ["Editada", "Nova"]
+
+
+def test_non_atomic_batch_keeps_successful_requests(client, auth, board):
+    response = client.post("/batch/", headers=auth, json={"requests": [
+        {"method": "POST", "path": f"{board['tasks_url']}/", "body": {"title": "Nova"}},
+        {"method": "GET", "path": f"{board['tasks_url']}/999999"},
+    ]})
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json["data"]["responses"]] == [201, 404]
+    assert "Nova" in _titles(client, auth, board)
+
+
+def test_batch_rejects_blocked_routes(client, auth):
+    response = client.post("/batch/", headers=auth, json={"requests": [
+        {"method": "POST", "path": "/login", "body": {}},
+    ]})
+    assert response.json["data"]["responses"][0]["status"] == 400
+
+
+def test_atomic_batch_rejects_routes_that_enqueue_jobs(client, auth, board):
+    # o job rodaria fora da transação: o rollback não o desfaria
+    response = client.post("/batch/", headers=auth, json={"atomic": True, "requests": [
+        {"method": "PUT", "path": f"{board['tasks_url']}/{board['task_id']}", "body": {"title": "Editada"}},
+        {"method": "DELETE", "path": "/user?async=true", "body": {"password": "1234"}},
+    ]})
+    assert response.status_code == 400
+    assert response.json["data"]["failed_index"] == 1
+    assert response.json["data"]["responses"][1]["status"] == 400
+    assert client.get("/user", headers=auth).status_code == 200
+    assert client.get("/jobs/", headers=auth).json["data"] == []
+
+
+def test_atomic_batch_size_limit(client, auth, board):
+    requests = [{"method": "GET", "path": f"{board['tasks_url']}/{board['task_id']}"}] * 21
+    response = client.post("/batch/", headers=auth, json={"atomic": True, "requests": requests})
+    assert response.status_code == 400
+    assert "20" in response.json["error"]
+
+    assert client.post("/batch/", headers=auth, json={"requests": requests}).status_code == 200
+
+
+def test_atomic_batch_restores_deleted_rows(client, auth, board):
+    response = client.post("/batch/", headers=auth, json={"atomic": True, "requests": [
+        {"method": "DELETE", "path": f"/user/projects/{board['project_id']}"},
+        {"method": "POST", "path": "/user/projects/", "body": {}},
+    ]})
+    assert response.status_code == 400
+    assert [item["status"] for item in response.json["data"]["responses"]] == [200, 400]
+
+    assert client.get(f"{board['tasks_url']}/{board['task_id']}", headers=auth).status_code == 200
+
+
+def test_rollback_keeps_writes_of_other_workers(client, auth, board, isolated):
+    token = auth["Authorization"].split()[1]
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    result = {}
+
+    def other_worker():
+        result["status"] = isolated(f"""
+response = client.post({board['tasks_url'] + '/'!r}, headers={{"Authorization": "Bearer {token}"}}, json={{"title": "De outro worker"}})
+print(json.dumps(response.status_code))
+""")
+
+    with csv_service.transaction() as tx:
+        assert client.put(url, headers=auth, json={"title": "Desfeita"}).status_code == 200
+        worker = threading.Thread(target=other_worker)
+        worker.start()
+        # o outro processo espera a transação em vez de gravar por baixo dela
+        worker.join(timeout=3)
+        assert worker.is_alive()
+        tx["rollback"] = True
+    worker.join()
+
+    assert result["status"] == 201
+    assert _titles(client, auth, board) == ["Task", "De outro worker"]
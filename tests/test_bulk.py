@@ -0,0 +1,200 @@
+import threading
+import time
+
+from services import csv_service
+from services.csv_service import find_comments_by_task_id, find_tasks_by_list_id
+
+
+def _titles(client, auth, board):
+    return [task["title"] for task in client.get(f"{board['tasks_url']}/", headers=auth).json["data"]["tasks"]]
+
+
+def test_bulk_create_keeps_valid_items(client, auth, board):
+    response = client.post(f"{board['tasks_url']}/bulk", headers=auth, json={"tasks": [
+        {"title": "Um"},
+        {"description": "sem título"},
+        {"title": "Dois"},
+        "não é um objeto",
+    ]})
+    assert response.status_code == 201
+    data = response.json["data"]
+    assert [task["title"] for task in data["created"]] == ["Um", "Dois"]
+    assert [error["index"] for error in data["errors"]] == [1, 3]
+    assert len({task["task_id"] for task in data["created"]} | {board["task_id"]}) == 3
+
+    assert _titles(client, auth, board) == ["Task", "Um", "Dois"]
+
+
+def test_bulk_create_without_valid_items(client, auth, board):
+    response = client.post(f"{board['tasks_url']}/bulk", headers=auth, json={"tasks": [{}, {"title": ""}]})
+    assert response.status_code == 400
+    assert [error["index"] for error in response.json["data"]["errors"]] == [0, 1]
+    assert _titles(client, auth, board) == ["Task"]
+
+
+def test_bulk_create_checks_ownership(client, board, new_user):
+    response = client.post(f"{board['tasks_url']}/bulk", headers=new_user(), json={"tasks": [{"title": "Intrusa"}]})
+    assert response.status_code == 403
+
+
+def test_bulk_create_comments(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}/comments"
+    response = client.post(f"{url}/bulk", headers=auth, json={"comments": [{"content": "a"}, {"content": ""}, {"content": "b"}]})
+    assert response.status_code == 201
+    assert [comment["content"] for comment in response.json["data"]["created"]] == ["a", "b"]
+    assert [error["index"] for error in response.json["data"]["errors"]] == [1]
+
+    assert client.post(f"{url}/bulk", headers=auth, json={"comments": []}).status_code == 400
+
+
+def test_bulk_update_and_move(client, auth, board, make_board):
+    url = f"/user/projects/{board['project_id']}/tasks"
+    done = client.post(f"/user/projects/{board['project_id']}/lists/", headers=auth, json={"list_name": "Feito"}).json["data"]
+    second = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Segunda"}).json["data"]
+    foreign = make_board("Outro")
+
+    response = client.patch(url, headers=auth, json={"tasks": [
+        {"task_id": board["task_id"], "completed": True, "list_id": done["list_id"]},
+        {"task_id": second["task_id"], "title": "Renomeada"},
+        {"task_id": "999999", "completed": True},
+        {"task_id": foreign["task_id"], "completed": True},
+        {"task_id": second["task_id"], "completed": "sim"},
+    ]})
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert sorted(task["task_id"] for task in data["updated"]) == sorted([board["task_id"], second["task_id"]])
+    assert [error["index"] for error in data["errors"]] == [2, 3, 4]
+
+    moved = client.get(f"/user/projects/{board['project_id']}/lists/{done['list_id']}/tasks/{board['task_id']}", headers=auth)
+    assert moved.status_code == 200
+    assert str(moved.json["data"]["task"]["completed"]) == "True"
+    assert _titles(client, auth, board) == ["Renomeada"]
+
+
+def test_bulk_update_without_valid_items(client, auth, board):
+    url = f"/user/projects/{board['project_id']}/tasks"
+    response = client.patch(url, headers=auth, json={"tasks": [{"task_id": board["task_id"]}, {}]})
+    assert response.status_code == 400
+    assert [error["index"] for error in response.json["data"]["errors"]] == [0, 1]
+
+
+def test_bulk_delete_completed_tasks(client, auth, board):
+    done = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Feita"}).json["data"]
+    client.put(f"{board['tasks_url']}/{done['task_id']}", headers=auth, json={"title": "Feita", "completed": True})
+    client.post(f"{board['tasks_url']}/{done['task_id']}/comments/", headers=auth, json={"content": "some junto"})
+
+    response = client.delete(f"{board['tasks_url']}/", headers=auth, query_string={"completed": "true"})
+    assert response.status_code == 200
+    assert response.json["data"]["deleted_task_ids"] == [done["task_id"]]
+
+    assert _titles(client, auth, board) == ["Task"]
+    assert find_comments_by_task_id(done["task_id"]) == []
+
+    assert client.delete(f"{board['tasks_url']}/", headers=auth).status_code == 400
+
+
+def test_bulk_delete_keeps_concurrent_updates(client, auth, make_board, monkeypatch):
+    # o delete em lote relê as tabelas sob a trava: as alterações feitas
+    # ao mesmo tempo em outras tasks do arquivo não se perdem
+    doomed, other = make_board("Apagar"), make_board("Manter")
+    read_csv = csv_service.read_csv
+
+    def slow_read(arq, fresh=False):
+        # alarga a janela entre a leitura e a reescrita do delete
+        rows = read_csv(arq, fresh)
+        if fresh and threading.current_thread().name == "delete":
+            time.sleep(0.02)
+        return rows
+
+    monkeypatch.setattr(csv_service, "read_csv", slow_read)
+    kept = [client.post(f"{other['tasks_url']}/", headers=auth, json={"title": f"Task {i}"}).json["data"] for i in range(6)]
+    start = threading.Barrier(len(kept) + 1)
+
+    def update(task):
+        start.wait()
+        for round in range(10):
+            client.put(f"{other['tasks_url']}/{task['task_id']}", headers=auth, json={"title": f"Editada {round}"})
+
+    def delete():
+        start.wait()
+        for round in range(10):
+            task = client.post(f"{doomed['tasks_url']}/", headers=auth, json={"title": "Feita"}).json["data"]
+            client.put(f"{doomed['tasks_url']}/{task['task_id']}", headers=auth, json={"title": "Feita", "completed": True})
+            client.delete(f"{doomed['tasks_url']}/", headers=auth, query_string={"completed": "true"})
+
+    threads = [threading.Thread(target=update, args=(task,)) for task in kept] + [threading.Thread(target=delete, name="delete")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [t["title"] for t in find_tasks_by_list_id(other["list_id"])] == ["Task"] + ["Editada 9"] * len(kept)
+    assert [t["title"] for t in find_tasks_by_list_id(doomed["list_id"])] == ["Task"]
+
+
+def test_bulk_item_limit_comes_from_the_environment(isolated):
+    result = isolated("""
+auth = login("limite@example.com")
+project_id = client.post("/user/projects/", headers=auth, json={"project_title": "P"}).json["data"]["project_id"]
+list_id = client.post(f"/user/projects/{project_id}/lists/", headers=auth, json={"list_name": "L"}).json["data"]["list_id"]
+url = f"/user/projects/{project_id}/lists/{list_id}/tasks/bulk"
+print(json.dumps([
+    client.post(url, headers=auth, json={"tasks": [{"title": str(i)} for i in range(3)]}).status_code,
+    client.post(url, headers=auth, json={"tasks": [{"title": str(i)} for i in range(4)]}).status_code,
+]))
+""", BULK_MAX_ITEMS=3)
+    assert result == [201, 400]
+
+
+def test_concurrent_creates_get_distinct_ids(app, auth, board):
+    barrier = threading.Barrier(12)
+    created = []
+
+    def create(index):
+        client = app.test_client()
+        barrier.wait()
+        if index % 2:
+            response = client.post(f"{board['tasks_url']}/bulk", headers=auth, json={"tasks": [{"title": f"b{index}-{n}"} for n in range(3)]})
+            created.extend(task["task_id"] for task in response.json["data"]["created"])
+        else:
+            response = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": f"s{index}"})
+            created.append(response.json["data"]["task_id"])
+        assert response.status_code == 201
+
+    threads = [threading.Thread(target=create, args=(index,)) for index in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 6 + 6 * 3
+    assert len(set(created)) == len(created)
+    stored = [task["task_id"] for task in find_tasks_by_list_id(board["list_id"])]
+    assert sorted(stored) == sorted(created + [board["task_id"]])
+
+
+def test_concurrent_creates_in_other_workers_get_distinct_ids(client, auth, board, isolated):
+    token = auth["Authorization"].split()[1]
+    start = time.time() + 3
+    code = f"""
+import time
+time.sleep(max(0, {start} - time.time()))
+headers = {{"Authorization": "Bearer {token}"}}
+ids = []
+for index in range(10):
+    response = client.post({board['tasks_url'] + '/bulk'!r}, headers=headers, json={{"tasks": [{{"title": "a"}}, {{"title": "b"}}]}})
+    ids += [task["task_id"] for task in response.json["data"]["created"]]
+    ids.append(client.post({board['tasks_url'] + '/'!r}, headers=headers, json={{"title": "c"}}).json["data"]["task_id"])
+print(json.dumps(ids))
+"""
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(isolated(code))) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    created = [task_id for ids in results for task_id in ids]
+    assert len(created) == 3 * 30
+    assert len(set(created)) == len(created)
+    assert len(find_tasks_by_list_id(board["list_id"])) == len(created) + 1
@@ -0,0 +1,112 @@
+from services import csv_service
+
+
+def _changes(client, auth, **params):
+    response = client.get("/user/changes", headers=auth, query_string=params)
+    assert response.status_code == 200
+    return response.json["data"]
+
+
+def test_changes_since_a_cursor(client, auth, board):
+    cursor = _changes(client, auth)["last_seq"]
+
+    task_url = f"{board['tasks_url']}/{board['task_id']}"
+    client.put(task_url, headers=auth, json={"title": "Um"})
+    client.put(task_url, headers=auth, json={"title": "Dois"})
+    created = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Nova"}).json["data"]
+    client.delete(f"{board['tasks_url']}/{created['task_id']}", headers=auth)
+
+    data = _changes(client, auth, since=cursor)
+    # só a última alteração de cada entidade
+    assert [(c["entity"], c["entity_id"], c["op"]) for c in data["changes"]] == [
+        ("task", board["task_id"], "update"),
+        ("task", created["task_id"], "delete"),
+    ]
+    assert data["changes"][0]["data"]["title"] == "Dois"
+    assert data["changes"][0]["project_id"] == board["project_id"]
+    assert data["changes"][1]["data"] is None
+    assert data["next_since"] == data["last_seq"] == data["changes"][-1]["seq"]
+
+    assert _changes(client, auth, since=data["next_since"])["changes"] == []
+
+
+def test_changes_are_paginated(client, auth, board):
+    cursor = _changes(client, auth)["last_seq"]
+    for title in ("a", "b", "c"):
+        client.post(f"{board['tasks_url']}/", headers=auth, json={"title": title})
+
+    first = _changes(client, auth, since=cursor, limit=2)
+    assert [c["data"]["title"] for c in first["changes"]] == ["a", "b"]
+    assert first["has_more"] is True
+
+    rest = _changes(client, auth, since=first["next_since"], limit=2)
+    assert [c["data"]["title"] for c in rest["changes"]] == ["c"]
+    assert rest["has_more"] is False
+
+
+def test_changes_are_per_user(client, auth, board, new_user):
+    other = new_user()
+    # o outro usuário só vê o próprio cadastro
+    assert [c["entity"] for c in _changes(client, other)["changes"]] == ["user"]
+    assert client.get("/user/changes", headers=other, query_string={"since": -1}).status_code == 400
+
+
+def test_old_cursors_are_told_the_journal_was_trimmed(client, auth, board, monkeypatch):
+    monkeypatch.setattr(csv_service, "JOURNAL_MAX_ENTRIES", 4)
+    cursor = _changes(client, auth)["last_seq"]
+    for index in range(8):
+        client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": f"Versão {index}"})
+
+    # o espelho em memória guarda só as últimas alterações (com folga de 25%)
+    assert len(csv_service._journal["changes"]) <= 5
+    horizon = csv_service.get_change_horizon()
+    assert horizon > cursor
+
+    data = _changes(client, auth, since=cursor)
+    assert data["truncated"] is True
+    assert data["changes"][-1]["data"]["title"] == "Versão 7"
+    assert data["next_since"] >= horizon
+    assert _changes(client, auth, since=data["next_since"])["truncated"] is False
+
+
+def _journal_rows():
+    with open(csv_service.CHANGES, encoding="utf-8") as file:
+        return len(file.read().splitlines()) - 1
+
+
+def test_changes_file_is_compacted_to_the_window(client, auth, board, monkeypatch):
+    monkeypatch.setattr(csv_service, "JOURNAL_MAX_ENTRIES", 8)
+    for index in range(40):
+        client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": f"Versão {index}"})
+
+    # o arquivo não cresce sem limite: fica a janela mantida na memória
+    # (mais o que ainda não chegou a um quarto dela)
+    assert _journal_rows() <= 8 * 1.25 + 2
+    assert csv_service.get_change_horizon() >= csv_service.get_last_change_seq() - 12
+    data = _changes(client, auth, since=csv_service.get_change_horizon())
+    assert data["changes"][-1]["data"]["title"] == "Versão 39"
+
+
+def test_compaction_by_another_worker(client, auth, board, isolated):
+    last_seq = csv_service.get_last_change_seq()
+
+    # outro worker grava e compacta o arquivo; este percebe o arquivo novo
+    # (mesmo com o seu espelho apontando para o meio do antigo)
+    other = isolated("""
+from services import csv_service
+auth = login("compacta@example.com")
+project_id = client.post("/user/projects/", headers=auth, json={"project_title": "P"}).json["data"]["project_id"]
+for index in range(20):
+    client.put(f"/user/projects/{project_id}", headers=auth, json={"project_title": f"P{index}", "project_description": ""})
+print(json.dumps(csv_service.get_last_change_seq()))
+""", JOURNAL_MAX_ENTRIES=4)
+
+    assert other > last_seq + 20
+    assert _journal_rows() < 20
+    assert csv_service.get_last_change_seq() == other
+    assert csv_service.get_change_horizon() > last_seq
+
+    # e continua gravando por cima do arquivo compactado
+    client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": "Depois"})
+    assert csv_service.get_last_change_seq() == other + 1
+    assert _changes(client, auth, since=other)["changes"][0]["data"]["title"] == "Depois"
@@ -0,0 +1,74 @@
+import json
+
+from services import csv_service
+
+
+def _open(client, auth, board, **headers):
+    response = client.get(f"/user/projects/{board['project_id']}/events", headers={**auth, **headers}, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    return response, iter(response.response)
+
+
+def _next_event(chunks):
+    for chunk in chunks:
+        chunk = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if chunk.startswith(("retry:", ":")):
+            continue
+        fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+        return fields["event"], json.loads(fields["data"]), fields.get("id")
+    return None
+
+
+def test_stream_pushes_writes_to_the_board(client, auth, board):
+    response, chunks = _open(client, auth, board)
+    try:
+        assert next(chunks).startswith(b"retry:")
+        client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Ao vivo"})
+
+        event, data, event_id = _next_event(chunks)
+        assert event == "task.create"
+        assert data["data"]["title"] == "Ao vivo"
+        assert event_id == str(data["seq"])
+
+        # deletar o projeto encerra o stream
+        client.delete(f"/user/projects/{board['project_id']}", headers=auth)
+        events = []
+        while (item := _next_event(chunks)) is not None:
+            events.append(item[0])
+        assert events[-1] == "project.delete"
+    finally:
+        response.close()
+
+
+def test_stream_replays_from_last_event_id(client, auth, board):
+    changes = client.get("/user/changes", headers=auth).json["data"]
+    cursor = changes["last_seq"]
+    client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": "Perdida"})
+
+    response, chunks = _open(client, auth, board, **{"Last-Event-ID": str(cursor)})
+    try:
+        event, data, _ = _next_event(chunks)
+        assert event == "task.update"
+        assert data["data"]["title"] == "Perdida"
+    finally:
+        response.close()
+
+
+def test_stream_requires_project_owner(client, board, new_user):
+    response = client.get(f"/user/projects/{board['project_id']}/events", headers=new_user())
+    assert response.status_code == 403
+
+
+def test_last_event_id_before_the_horizon_gets_a_reset(client, auth, board, monkeypatch):
+    monkeypatch.setattr(csv_service, "JOURNAL_MAX_ENTRIES", 2)
+    for index in range(4):
+        client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": f"Versão {index}"})
+    assert csv_service.get_change_horizon() > 1
+
+    response, chunks = _open(client, auth, board, **{"Last-Event-ID": "1"})
+    try:
+        next(chunks)
+        assert _next_event(chunks)[0] == "reset"
+    finally:
+        response.close()
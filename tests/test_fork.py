@@ -0,0 +1,115 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from services import purger, warmup
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="precisa de os.fork")
+
+# Simula um worker do gunicorn --preload: o processo já fez escritas (e
+# subiu a fila de escrita e os workers de jobs) antes do fork, e o filho
+# precisa continuar escrevendo e executando jobs sozinho.
+
+
+def _in_worker(check, timeout=30):
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            status = 0 if check() else 1
+        finally:
+            os._exit(status)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status) == 0
+        time.sleep(0.05)
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+    return False
+
+
+def test_worker_writes_after_pre_fork_write(client, auth, board, new_user):
+    # escrita no processo pai antes do fork
+    assert client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Antes"}).status_code == 201
+
+    def write_in_worker():
+        worker = client.application.test_client()
+        created = worker.post(f"{board['tasks_url']}/", headers=auth, json={"title": "No worker"})
+        registered = worker.post("/register", json={"email": f"worker-{os.getpid()}@example.com", "password": "1", "name": "w"})
+        return created.status_code == 201 and registered.status_code == 201
+
+    assert _in_worker(write_in_worker)
+
+    titles = {task["title"] for task in client.get(f"{board['tasks_url']}/", headers=auth).json["data"]["tasks"]}
+    assert {"Antes", "No worker"} <= titles
+    # o pai continua escrevendo depois do fork
+    assert client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Depois"}).status_code == 201
+
+
+def test_job_runs_in_forked_worker(client, new_user):
+    def run_job_in_worker():
+        worker = client.application.test_client()
+        headers = new_user()
+        response = worker.delete("/user?async=true", headers=headers, json={"password": "1234"})
+        if response.status_code != 202:
+            return False
+        job_url = f"/jobs/{response.json['data']['job_id']}"
+
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            status = worker.get(job_url, headers=headers).json["data"]["status"]
+            if status == "succeeded":
+                return worker.get("/user", headers=headers).status_code != 200
+            if status == "failed":
+                return False
+            time.sleep(0.05)
+        return False
+
+    assert _in_worker(run_job_in_worker)
+
+
+def test_forked_helper_starts_no_job_workers():
+    # processos auxiliares (ex.: o pool da leitura paralela) não enfileiram
+    # jobs, então não sobem workers nem mexem em db/jobs.csv
+    def no_job_threads():
+        time.sleep(0.2)
+        return not any(thread.name.startswith("jobs") for thread in threading.enumerate())
+
+    assert _in_worker(no_job_threads)
+
+
+def test_interrupted_warmup_restarts_in_forked_worker(client, monkeypatch):
+    # o fork pegou o warm-up do pai pela metade: o filho o refaz sozinho
+    monkeypatch.setitem(warmup._state, "ready", False)
+    monkeypatch.setitem(warmup._state, "running", True)
+
+    def ready_in_worker():
+        worker = client.application.test_client()
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            if worker.get("/ready").status_code == 200:
+                return True
+            time.sleep(0.05)
+        return False
+
+    assert _in_worker(ready_in_worker)
+
+
+def test_purger_restarts_in_forked_worker(client, monkeypatch):
+    # o filho herda running=True sem a thread; a primeira requisição a religa
+    monkeypatch.setitem(purger._state, "running", True)
+
+    def purger_in_worker():
+        if purger._state["running"]:
+            return False
+        client.application.test_client().get("/")
+        time.sleep(0.1)
+        return any(thread.name == "purger" for thread in threading.enumerate())
+
+    assert _in_worker(purger_in_worker)
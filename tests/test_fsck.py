@@ -0,0 +1,98 @@
+import csv
+import io
+import os
+
+from services import fsck
+
+
+def _append(folder, name, **values):
+    path = os.path.join(folder, name)
+    with open(path, encoding="utf-8", newline="") as file:
+        header = next(csv.reader(file))
+    with open(path, "a", encoding="utf-8", newline="") as file:
+        csv.DictWriter(file, fieldnames=header, restval="").writerow(values)
+
+
+def _ids(folder, name, id_field):
+    with open(os.path.join(folder, name), encoding="utf-8", newline="") as file:
+        return [row[id_field] for row in csv.DictReader(file)]
+
+
+def _run(folder, mode="check"):
+    out = io.StringIO()
+    return fsck.run(folder, mode, out=out), out.getvalue()
+
+
+def test_seed_database_is_clean(seed_db):
+    code, output = _run(seed_db)
+    assert code == 0, output
+
+
+def test_orphans_are_found_in_one_pass(seed_db):
+    _append(seed_db, "tasks.csv", task_id="900", title="órfã", completed="False", list_id="999")
+    _append(seed_db, "comments.csv", comment_id="900", task_id="900", content="da órfã")
+    _append(seed_db, "lists.csv", list_id="1", project_id="1", list_name="id repetido")
+
+    code, output = _run(seed_db)
+    assert code == 1
+    assert "órfão: 1" in output.split("tasks.csv")[1]
+    # o comentário da task órfã também é órfão
+    assert "órfão: 1" in output.split("comments.csv")[1]
+    assert "id duplicado: 1" in output.split("lists.csv")[1]
+
+
+def test_repair_removes_only_bad_rows(seed_db):
+    tasks_before = _ids(seed_db, "tasks.csv", "task_id")
+    _append(seed_db, "tasks.csv", task_id="900", title="órfã", completed="False", list_id="999")
+    _append(seed_db, "tasks.csv", task_id="x1", title="id inválido", completed="False", list_id="1")
+
+    code, output = _run(seed_db, "repair")
+    assert code == 0
+    assert "reparado: tasks.csv" in output
+    assert _ids(seed_db, "tasks.csv", "task_id") == tasks_before
+    assert _run(seed_db)[0] == 0
+
+
+def test_quarantine_keeps_removed_rows(seed_db):
+    _append(seed_db, "comments.csv", comment_id="900", task_id="999", content="sem task")
+
+    code, _ = _run(seed_db, "quarantine")
+    assert code == 0
+    quarantine = os.path.join(seed_db, fsck.QUARANTINE_FOLDER)
+    [name] = os.listdir(quarantine)
+    with open(os.path.join(quarantine, name), encoding="utf-8", newline="") as file:
+        rows = list(csv.reader(file))
+    assert len(rows) == 2
+    assert rows[1][0] == "comments.csv"
+    assert rows[1][2:5] == ["órfão", "900", "999"]
+
+
+def test_truncated_write_and_leftover_tmp(seed_db):
+    with open(os.path.join(seed_db, "comments.csv"), "a", encoding="utf-8", newline="") as file:
+        file.write('901,1,"escrita interrom')
+    open(os.path.join(seed_db, "tasks.csv.tmp"), "w").close()
+
+    code, output = _run(seed_db)
+    assert code == 1
+    assert "arquivo temporário esquecido: tasks.csv.tmp" in output
+
+    assert _run(seed_db, "repair")[0] == 0
+    assert not os.path.exists(os.path.join(seed_db, "tasks.csv.tmp"))
+    assert "901" not in _ids(seed_db, "comments.csv", "comment_id")
+    assert _run(seed_db)[0] == 0
+
+
+def test_unknown_header_is_fatal(seed_db):
+    with open(os.path.join(seed_db, "lists.csv"), "w", encoding="utf-8") as file:
+        file.write("outra,coisa\n1,2\n")
+
+    # a tabela não é tocada e os filhos dela não têm as referências conferidas
+    code, output = _run(seed_db, "repair")
+    assert code == 1
+    assert "lists.csv: ERRO" in output
+    with open(os.path.join(seed_db, "lists.csv"), encoding="utf-8") as file:
+        assert file.read() == "outra,coisa\n1,2\n"
+
+
+def test_command_line(seed_db):
+    assert fsck.main(["--db", seed_db]) == 0
@@ -0,0 +1,61 @@
+import os
+
+from services.generations import Generations
+
+
+def test_counters_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "generations.bin")
+    first, second = Generations(path, slots=64), Generations(path, slots=64)
+
+    first.bump("file:tasks.csv")
+    first.bump("file:tasks.csv", "scope:project:1")
+    assert second.get("file:tasks.csv") == 2
+    assert second.get("scope:project:1") == 1
+    assert second.get_epoch() == first.get_epoch()
+
+    # o arquivo guarda o número de contadores com que foi criado
+    assert Generations(path, slots=8).get("file:tasks.csv") == 2
+
+
+def test_local_mode_counts_only_this_process(tmp_path):
+    path = str(tmp_path / "generations.bin")
+    local = Generations(path, shared=False)
+    local.bump("file:tasks.csv")
+    assert local.get("file:tasks.csv") == 1
+    assert not os.path.exists(path)
+
+
+def test_forked_writers_do_not_lose_increments(tmp_path):
+    counters = Generations(str(tmp_path / "generations.bin"), slots=64)
+    counters.get("file:tasks.csv")
+
+    children = []
+    for _ in range(4):
+        pid = os.fork()
+        if pid == 0:
+            counters.reopen()
+            for _ in range(500):
+                counters.bump("file:tasks.csv")
+            os._exit(0)
+        children.append(pid)
+    for pid in children:
+        assert os.waitpid(pid, 0)[1] == 0
+
+    assert counters.get("file:tasks.csv") == 2000
+
+
+def test_write_from_another_process_reaches_the_cache(client, auth, board, isolated):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    first = client.get(url, headers=auth)
+    token = auth["Authorization"].split()[1]
+
+    # outro worker (outro processo, mesma pasta de dados) muda a task
+    status = isolated(f"""
+response = client.put({url!r}, headers={{"Authorization": "Bearer {token}"}}, json={{"title": "De outro worker"}})
+print(json.dumps(response.status_code))
+""")
+    assert status == 200
+
+    second = client.get(url, headers=auth)
+    assert second.json["data"]["task"]["title"] == "De outro worker"
+    assert second.headers["ETag"] != first.headers["ETag"]
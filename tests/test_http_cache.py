@@ -0,0 +1,68 @@
+from services.http_cache import ResponseCache, response_cache
+
+
+def test_get_etag_revalidates_with_304(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    response = client.get(url, headers=auth)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    revalidated = client.get(url, headers={**auth, "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.data == b""
+
+
+def test_write_in_the_project_changes_the_etag(client, auth, board, make_board):
+    url = f"{board['tasks_url']}/"
+    etag = client.get(url, headers=auth).headers["ETag"]
+
+    # uma escrita em outro projeto não invalida a ETag
+    other = make_board("Outro")
+    client.post(f"{other['tasks_url']}/", headers=auth, json={"title": "Fora"})
+    assert client.get(url, headers={**auth, "If-None-Match": etag}).status_code == 304
+
+    client.post(url, headers=auth, json={"title": "Nova"})
+    response = client.get(url, headers={**auth, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "Nova" in [task["title"] for task in response.json["data"]["tasks"]]
+
+
+def test_etag_is_not_shared_between_users(client, auth, board, new_user):
+    url = f"/user/projects/{board['project_id']}"
+    etag = client.get(url, headers=auth).headers["ETag"]
+
+    other = client.get(url, headers={**new_user(), "If-None-Match": etag})
+    assert other.status_code == 403
+
+
+def test_cached_response_is_served_until_a_write(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    first = client.get(url, headers=auth)
+    hits = response_cache.stats()["hits"]
+
+    again = client.get(url, headers=auth)
+    assert response_cache.stats()["hits"] == hits + 1
+    assert again.data == first.data
+
+    client.put(url, headers=auth, json={"title": "Editada"})
+    assert client.get(url, headers=auth).json["data"]["task"]["title"] == "Editada"
+
+
+def test_cached_response_is_per_user(client, auth, board, new_user):
+    url = f"/user/projects/{board['project_id']}"
+    assert client.get(url, headers=auth).status_code == 200
+    assert client.get(url, headers=new_user()).status_code == 403
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=200)
+    for key in ("a", "b", "c"):
+        cache.put(key, (), b"x" * 60, 200, "application/json")
+    cache.get("a")
+    cache.put("d", (), b"x" * 60, 200, "application/json")
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,84 @@
+import threading
+import time
+
+
+def test_retry_replays_first_response(client, auth):
+    headers = {**auth, "Idempotency-Key": "criar-projeto-1"}
+    body = {"project_title": "Idempotente", "project_description": ""}
+
+    first = client.post("/user/projects/", headers=headers, json=body)
+    retry = client.post("/user/projects/", headers=headers, json=body)
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json == first.json
+
+    projects = client.get("/user/projects/", headers=auth).json["data"]
+    assert [p["project_title"] for p in projects].count("Idempotente") == 1
+
+
+def test_key_reused_with_other_body_conflicts(client, auth):
+    headers = {**auth, "Idempotency-Key": "criar-projeto-2"}
+    assert client.post("/user/projects/", headers=headers, json={"project_title": "A"}).status_code == 201
+
+    conflict = client.post("/user/projects/", headers=headers, json={"project_title": "B"})
+    assert conflict.status_code == 422
+
+    projects = client.get("/user/projects/", headers=auth).json["data"]
+    assert [p["project_title"] for p in projects] == ["A"]
+
+
+def test_keys_are_scoped_per_user(client, auth, new_user):
+    other = new_user()
+    body = {"project_title": "Mesmo"}
+    first = client.post("/user/projects/", headers={**auth, "Idempotency-Key": "k"}, json=body)
+    second = client.post("/user/projects/", headers={**other, "Idempotency-Key": "k"}, json=body)
+    assert "Idempotent-Replayed" not in second.headers
+    assert first.json["data"]["project_id"] != second.json["data"]["project_id"]
+
+
+def test_concurrent_retries_create_once(app, client, auth):
+    headers = {**auth, "Idempotency-Key": "criar-projeto-3"}
+    statuses = []
+
+    def post():
+        statuses.append(app.test_client().post("/user/projects/", headers=headers, json={"project_title": "Uma vez"}).status_code)
+
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [201] * 8
+    projects = client.get("/user/projects/", headers=auth).json["data"]
+    assert [p["project_title"] for p in projects] == ["Uma vez"]
+
+
+def test_concurrent_retries_in_other_workers_create_once(client, auth, isolated):
+    token = auth["Authorization"].split()[1]
+    start = time.time() + 3
+    code = f"""
+import time
+import routes.projects
+
+# gravação lenta, para que as cópias da requisição se sobreponham
+save_project = routes.projects.save_project
+routes.projects.save_project = lambda project: (time.sleep(0.5), save_project(project))[1]
+
+time.sleep(max(0, {start} - time.time()))
+response = client.post("/user/projects/", json={{"project_title": "Entre workers"}},
+                       headers={{"Authorization": "Bearer {token}", "Idempotency-Key": "criar-projeto-4"}})
+print(json.dumps([response.status_code, response.json["data"]["project_id"]]))
+"""
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(isolated(code))) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(results) == 4
+    assert {status for status, _ in results} == {201}
+    assert len({project_id for _, project_id in results}) == 1
+    projects = client.get("/user/projects/", headers=auth).json["data"]
+    assert [p["project_title"] for p in projects].count("Entre workers") == 1
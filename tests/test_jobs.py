@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from services import jobs
+from services.csv_service import overwrite_csv
+
+
+def _wait(get, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get()
+        if job and job["status"] in jobs.FINISHED:
+            return job
+        time.sleep(0.02)
+    raise AssertionError("o job não terminou a tempo")
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    return jobs.JobQueue(str(tmp_path / "jobs.csv"), workers=2, max_attempts=3, retry_delay=0)
+
+
+@jobs.job_kind("teste_soma")
+def _sum_job(params, progress):
+    progress(0.5)
+    return {"total": sum(params["numbers"])}
+
+
+_flaky_calls = []
+
+
+@jobs.job_kind("teste_instavel")
+def _flaky_job(params, progress):
+    _flaky_calls.append(params["name"])
+    if _flaky_calls.count(params["name"]) < params["failures"] + 1:
+        raise RuntimeError("falha temporária")
+    return None
+
+
+def test_async_delete_user_runs_as_a_job(client, new_user):
+    auth = new_user()
+    response = client.delete("/user?async=true", headers=auth, json={"password": "1234"})
+    assert response.status_code == 202
+    job_id = response.json["data"]["job_id"]
+
+    job = _wait(lambda: client.get(f"/jobs/{job_id}", headers=auth).json["data"])
+    assert job["status"] == "succeeded"
+    assert job["kind"] == "delete_user"
+    assert job["progress"] == 100.0
+    assert job["duration_ms"] is not None
+    assert client.get("/user", headers=auth).status_code != 200
+    listed = client.get("/jobs/", headers=auth).json["data"]
+    assert job_id in {item["job_id"] for item in listed}
+
+
+def test_jobs_are_visible_only_to_their_owner(client, auth, new_user):
+    job = jobs.job_queue.submit("teste_soma", {"numbers": [1, 2]}, user_id="não-é-você")
+    assert client.get(f"/jobs/{job['job_id']}", headers=auth).status_code == 404
+    listed = client.get("/jobs/", headers=auth).json.get("data", [])
+    assert job["job_id"] not in {item["job_id"] for item in listed}
+
+
+def test_result_and_progress(job_queue):
+    job = job_queue.submit("teste_soma", {"numbers": [1, 2, 3]})
+    assert job["status"] == "queued"
+
+    finished = _wait(lambda: job_queue.get(job["job_id"]))
+    assert finished["status"] == "succeeded"
+    assert finished["result"] == {"total": 6}
+    assert finished["attempts"] == 1
+
+
+def test_failed_attempts_are_retried(job_queue):
+    job = job_queue.submit("teste_instavel", {"name": "retry", "failures": 2})
+    finished = _wait(lambda: job_queue.get(job["job_id"]))
+    assert finished["status"] == "succeeded"
+    assert finished["attempts"] == 3
+
+    job = job_queue.submit("teste_instavel", {"name": "sempre", "failures": 10}, max_attempts=2)
+    finished = _wait(lambda: job_queue.get(job["job_id"]))
+    assert finished["status"] == "failed"
+    assert finished["attempts"] == 2
+    assert finished["error"] == "falha temporária"
+
+
+def test_unknown_kind_is_rejected(job_queue):
+    with pytest.raises(ValueError):
+        job_queue.submit("nao_existe")
+
+
+def test_jobs_of_a_dead_process_are_resumed(job_queue):
+    # job que ficou "running" num processo que não existe mais
+    overwrite_csv(job_queue.path, jobs.JOB_FIELDNAMES, [{
+        "job_id": "orfao", "user_id": "1", "kind": "teste_soma", "params": '{"numbers": [4, 5]}',
+        "status": "running", "attempts": "1", "max_attempts": "3", "progress": "40.0", "result": "",
+        "error": "", "owner": "999999999:deadbeef", "created_at": "2025-11-25 20:00:00",
+        "started_at": "2025-11-25 20:00:01", "finished_at": "", "duration_ms": "",
+    }])
+
+    job_queue.start()
+    finished = _wait(lambda: job_queue.get("orfao"))
+    assert finished["status"] == "succeeded"
+    assert finished["result"] == {"total": 9}
+    assert finished["attempts"] == 2
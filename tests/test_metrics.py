@@ -0,0 +1,18 @@
+def test_metrics_are_off_by_default(client, auth):
+    assert client.get("/metrics", headers=auth).status_code == 404
+
+
+def test_metrics_need_a_token(isolated):
+    result = isolated("""
+auth = login("metricas@example.com")
+with_token = client.get("/metrics", headers=auth)
+print(json.dumps({
+    "anonymous": client.get("/metrics").status_code,
+    "authenticated": with_token.status_code,
+    "sections": sorted(with_token.json),
+}))
+""", METRICS_ENABLED="True")
+
+    assert result["anonymous"] == 401
+    assert result["authenticated"] == 200
+    assert {"response_cache", "write_queue", "jobs"} <= set(result["sections"])
@@ -0,0 +1,62 @@
+import csv
+
+from services import csv_service
+
+FIELDNAMES = ["task_id", "title", "description"]
+
+
+def _write(path, rows, mode="w"):
+    with open(path, mode, encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        if mode == "w":
+            writer.writerow(FIELDNAMES)
+        writer.writerows(rows)
+    # escrita por fora da API: avisa os caches como uma escrita dela faria
+    csv_service.generations.bump(csv_service._generation_key(path))
+
+
+def test_offset_index_handles_quoted_multiline_fields(tmp_path):
+    path = str(tmp_path / "tasks.csv")
+    description = 'primeira linha\nsegunda com "aspas", vírgula'
+    _write(path, [["1", "a", description], ["2", "b", ""], ["3", "c", "\n\n"]])
+
+    assert csv_service._find_by_offset(path, "1")["description"] == description
+    assert csv_service._find_by_offset(path, 2)["title"] == "b"
+    assert csv_service._find_by_offset(path, "3")["description"] == "\n\n"
+    assert csv_service._find_by_offset(path, "4") is None
+    assert csv_service._find_by_offset(path, "abc") is None
+
+
+def test_offset_index_follows_appends_and_rewrites(tmp_path):
+    path = str(tmp_path / "tasks.csv")
+    _write(path, [["1", "a", ""]])
+    assert csv_service._find_by_offset(path, "1")["title"] == "a"
+
+    _write(path, [["2", "b", ""]], mode="a")
+    assert csv_service._find_by_offset(path, "2")["title"] == "b"
+    assert csv_service._offset_index(path)["max_id"] == 2
+
+    # reescrita fora de ordem (ex.: depois de um delete)
+    _write(path, [["7", "sete", ""], ["5", "cinco", ""]])
+    assert csv_service._find_by_offset(path, "1") is None
+    assert csv_service._find_by_offset(path, "5")["title"] == "cinco"
+    assert csv_service._find_by_offset(path, "7")["title"] == "sete"
+    assert csv_service._offset_index(path)["max_id"] == 7
+
+
+def test_api_in_mmap_mode(isolated):
+    result = isolated("""
+from services import csv_service
+auth = login("mmap@example.com")
+project_id = client.post("/user/projects/", headers=auth, json={"project_title": "P"}).json["data"]["project_id"]
+list_id = client.post(f"/user/projects/{project_id}/lists/", headers=auth, json={"list_name": "L"}).json["data"]["list_id"]
+url = f"/user/projects/{project_id}/lists/{list_id}/tasks/"
+task_id = client.post(url, headers=auth, json={"title": "T", "description": "com\\nquebra"}).json["data"]["task_id"]
+client.put(url + task_id, headers=auth, json={"title": "Editada"})
+task = client.get(url + task_id, headers=auth).json["data"]["task"]
+print(json.dumps({"mode": csv_service.CSV_READ_MODE, "task": task}))
+""", CSV_READ_MODE="mmap")
+
+    assert result["mode"] == "mmap"
+    assert result["task"]["title"] == "Editada"
+    assert result["task"]["description"] == "com\nquebra"
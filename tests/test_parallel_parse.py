@@ -0,0 +1,53 @@
+import csv
+
+import pytest
+
+from services import csv_service
+
+
+@pytest.fixture
+def tricky_csv(tmp_path):
+    path = str(tmp_path / "comments.csv")
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["comment_id", "task_id", "content", "created_at"])
+        for i in range(1, 2001):
+            content = f'comentário {i}\nsegunda linha com "aspas", vírgula' if i % 3 == 0 else f"simples {i}"
+            writer.writerow([i, i % 7, content, "2025-11-25 20:25:57"])
+        # linhas curtas, longas e vazias também precisam sair iguais ao DictReader
+        file.write("2001,1\n\n2002,1,longa,2025-11-25 20:25:57,extra\n")
+    return path
+
+
+def _sequential(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        return list(csv.DictReader(file))
+
+
+@pytest.mark.parametrize("workers", [2, 4, 7])
+def test_parallel_parse_matches_sequential(tricky_csv, workers):
+    assert csv_service.parse_csv_parallel(tricky_csv, workers=workers) == _sequential(tricky_csv)
+
+
+def test_chunks_start_at_record_boundaries(tricky_csv):
+    with open(tricky_csv, "rb") as file:
+        data = file.read()
+    header_end = data.index(b"\n") + 1
+    boundaries = csv_service._chunk_boundaries(data, header_end, len(data), 8)
+
+    assert len(boundaries) > 1
+    for start in boundaries:
+        # cada pedaço começa no início de uma linha fora de aspas
+        assert data[start - 1:start] == b"\n"
+        assert data[:start].count(b'"') % 2 == 0
+
+
+def test_large_tables_use_the_parallel_parser(tricky_csv, monkeypatch):
+    monkeypatch.setattr(csv_service, "PARALLEL_PARSE_MIN_BYTES", 1)
+    monkeypatch.setattr(csv_service, "PARALLEL_PARSE_WORKERS", 3)
+    calls = []
+    parallel = csv_service.parse_csv_parallel
+    monkeypatch.setattr(csv_service, "parse_csv_parallel", lambda arq: calls.append(arq) or parallel(arq))
+
+    assert csv_service._parse_csv_file(tricky_csv) == _sequential(tricky_csv)
+    assert calls == [tricky_csv]
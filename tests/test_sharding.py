@@ -0,0 +1,214 @@
+import json
+import os
+
+# SHARDED_STORAGE, DB_PATH e SHARD_MAP valem para o processo inteiro, então
+# cada cenário roda a aplicação em outro processo (ver `isolated`)
+
+
+def test_global_tables_migrate_to_project_shards(seed_db, isolated):
+    result = isolated("""
+from services import csv_service
+auth = login("usuario@gmail.com")
+task = client.get("/user/projects/1/lists/1/tasks/1", headers=auth)
+created = client.post("/user/projects/1/lists/1/tasks/", headers=auth, json={"title": "Nova"}).json["data"]
+shard_tasks = csv_service.read_csv(os.path.join(csv_service.SHARDS_PATH, "project-1", "tasks.csv"), fresh=True)
+print(json.dumps({
+    "task": task.status_code,
+    "created": created["task_id"],
+    "shard_tasks": [t["task_id"] for t in shard_tasks],
+    "legacy": sorted(n for n in os.listdir(csv_service.db_path) if n.endswith(".migrated")),
+}))
+""", DB_PATH=seed_db, SHARDED_STORAGE="True")
+
+    assert result["task"] == 200
+    assert "1" in result["shard_tasks"] and result["created"] in result["shard_tasks"]
+    assert result["legacy"] == ["comments.csv.migrated", "tasks.csv.migrated"]
+    assert not os.path.exists(os.path.join(seed_db, "tasks.csv"))
+
+    # a migração roda uma vez só; o processo seguinte lê direto dos shards
+    result = isolated("""
+auth = login("usuario@gmail.com")
+tasks = client.get("/user/projects/1/lists/1/tasks/", headers=auth).json["data"]["tasks"]
+print(json.dumps([t["title"] for t in tasks]))
+""", DB_PATH=seed_db, SHARDED_STORAGE="True")
+    assert "Nova" in result
+
+
+def test_deleting_a_project_drops_its_shard(seed_db, isolated):
+    result = isolated("""
+from services import csv_service
+auth = login("outro@example.com")
+project_id = client.post("/user/projects/", headers=auth, json={"project_title": "P"}).json["data"]["project_id"]
+list_id = client.post(f"/user/projects/{project_id}/lists/", headers=auth, json={"list_name": "L"}).json["data"]["list_id"]
+client.post(f"/user/projects/{project_id}/lists/{list_id}/tasks/", headers=auth, json={"title": "T"})
+shard = os.path.join(csv_service.SHARDS_PATH, f"project-{project_id}")
+before = os.path.isdir(shard)
+status = client.delete(f"/user/projects/{project_id}", headers=auth).status_code
+print(json.dumps({"before": before, "status": status, "after": os.path.exists(shard)}))
+""", DB_PATH=seed_db, SHARDED_STORAGE="True")
+
+    assert result == {"before": True, "status": 200, "after": False}
+
+
+def _write_map(path, nodes):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"id_stride": 16, "vnodes": 64, "nodes": {
+            name: {"url": f"http://127.0.0.1:{5100 + index}", "db": folder, "index": index}
+            for index, (name, folder) in enumerate(nodes.items())
+        }}, file)
+
+
+def _on_node(isolated, shard_map, nodes, name, code):
+    return isolated(code, DB_PATH=nodes[name], NODE_NAME=name, SHARD_MAP=shard_map)
+
+
+def _rebalance(isolated, shard_map, *argv):
+    return isolated(f"""
+from services.rebalance import main, plan
+code = main({list(argv)!r})
+print(json.dumps({{"code": code, "plan": plan()}}))
+""", SHARD_MAP=shard_map)
+
+
+USER_TASKS = """
+auth = login({email!r}, register=False)
+response = client.get("/user/tasks", headers=auth) if auth else None
+print(json.dumps(response.json["data"]["tasks"] if response is not None and response.status_code == 200 else None))
+"""
+
+
+def test_move_user_between_nodes(tmp_path, isolated):
+    nodes = {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}
+    for folder in nodes.values():
+        os.makedirs(folder)
+    shard_map = str(tmp_path / "shards.json")
+    _write_map(shard_map, nodes)
+
+    user = _on_node(isolated, shard_map, nodes, "a", """
+auth = login("mover@example.com")
+project_id = client.post("/user/projects/", headers=auth, json={"project_title": "P"}).json["data"]["project_id"]
+list_id = client.post(f"/user/projects/{project_id}/lists/", headers=auth, json={"list_name": "L"}).json["data"]["list_id"]
+task_id = client.post(f"/user/projects/{project_id}/lists/{list_id}/tasks/", headers=auth, json={"title": "T"}).json["data"]["task_id"]
+client.post(f"/user/projects/{project_id}/lists/{list_id}/tasks/{task_id}/comments/", headers=auth, json={"content": "c"})
+print(json.dumps(client.get("/user", headers=auth).json["data"]["user_id"]))
+""")
+    # ids gerados no nó a: id % id_stride == índice do nó
+    assert int(user) % 16 == 0
+
+    assert _rebalance(isolated, shard_map, "move", user, "b")["code"] == 0
+
+    tasks = _on_node(isolated, shard_map, nodes, "b", USER_TASKS.format(email="mover@example.com"))
+    assert [task["title"] for task in tasks] == ["T"]
+    with open(shard_map, encoding="utf-8") as file:
+        assert json.load(file)["pins"]["users"][user] == "b"
+
+    with open(os.path.join(nodes["a"], "users.csv"), encoding="utf-8") as file:
+        assert "mover@example.com" not in file.read()
+
+    # repetir o move (ex.: depois de uma interrupção) não duplica nada
+    assert _rebalance(isolated, shard_map, "move", user, "b")["code"] == 0
+    tasks = _on_node(isolated, shard_map, nodes, "b", USER_TASKS.format(email="mover@example.com"))
+    assert len(tasks) == 1
+
+
+def test_apply_moves_users_to_a_new_node(tmp_path, isolated):
+    nodes = {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}
+    for folder in nodes.values():
+        os.makedirs(folder)
+    shard_map = str(tmp_path / "shards.json")
+    _write_map(shard_map, {"a": nodes["a"]})
+
+    emails = [f"u{index}@example.com" for index in range(8)]
+    _on_node(isolated, shard_map, nodes, "a", """
+for email in {emails!r}:
+    auth = login(email)
+    project_id = client.post("/user/projects/", headers=auth, json={{"project_title": email}}).json["data"]["project_id"]
+    list_id = client.post(f"/user/projects/{{project_id}}/lists/", headers=auth, json={{"list_name": "L"}}).json["data"]["list_id"]
+    client.post(f"/user/projects/{{project_id}}/lists/{{list_id}}/tasks/", headers=auth, json={{"title": email}})
+print(json.dumps(None))
+""".format(emails=emails))
+
+    _rebalance(isolated, shard_map, "pin")
+    _write_map(shard_map, nodes)
+    moves = _rebalance(isolated, shard_map, "plan")["plan"]
+    assert moves and all(current == "a" and owner == "b" for _, current, owner in moves)
+
+    result = _rebalance(isolated, shard_map, "apply")
+    assert result == {"code": 0, "plan": []}
+
+    moved = {user_id for user_id, _, _ in moves}
+    for name, folder in nodes.items():
+        with open(os.path.join(folder, "users.csv"), encoding="utf-8") as file:
+            ids = {line.split(",")[0] for line in file.read().splitlines()[1:]}
+        if name == "b":
+            assert ids == moved
+        else:
+            assert ids and ids.isdisjoint(moved)
+    for email in emails:
+        tasks = [_on_node(isolated, shard_map, nodes, name, USER_TASKS.format(email=email)) for name in nodes]
+        assert [[task["title"] for task in found] for found in tasks if found] == [[email]]
+
+
+def test_move_waits_for_the_node_file_locks(tmp_path, isolated):
+    # o rebalance relê e reescreve cada arquivo sob a trava usada pelos
+    # workers do nó: com a trava de users.csv na origem, a mudança espera
+    nodes = {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}
+    for folder in nodes.values():
+        os.makedirs(folder)
+    shard_map = str(tmp_path / "shards.json")
+    _write_map(shard_map, nodes)
+
+    user = _on_node(isolated, shard_map, nodes, "a", """
+auth = login("travado@example.com")
+print(json.dumps(client.get("/user", headers=auth).json["data"]["user_id"]))
+""")
+    result = isolated(f"""
+import threading
+from services.csv_service import locked_file
+from services.rebalance import move_user
+
+held, release = threading.Event(), threading.Event()
+
+def hold():
+    with locked_file(os.path.join({nodes["a"]!r}, "users.csv")):
+        held.set()
+        release.wait()
+
+threading.Thread(target=hold).start()
+held.wait()
+move = threading.Thread(target=move_user, args=({user!r}, "b"))
+move.start()
+move.join(0.5)
+waited = move.is_alive()
+release.set()
+move.join()
+print(json.dumps(waited))
+""", SHARD_MAP=shard_map)
+    assert result is True
+
+    tasks = _on_node(isolated, shard_map, nodes, "b", USER_TASKS.format(email="travado@example.com"))
+    assert tasks == []
+
+
+def test_router_reads_the_query_string_token(tmp_path, isolated):
+    # clientes EventSource mandam o token em ?jwt=; o roteador precisa
+    # levá-los ao nó do usuário, não ao primeiro nó
+    nodes = {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}
+    shard_map = str(tmp_path / "shards.json")
+    _write_map(shard_map, nodes)
+
+    result = isolated("""
+import jwt
+from services.router import Router
+from services.shard_map import shard_map
+
+router = Router(shard_map, os.environ["JWT_SECRET_KEY"])
+picked = {}
+for user_id in map(str, range(1, 40)):
+    token = jwt.encode({"sub": user_id}, os.environ["JWT_SECRET_KEY"], algorithm="HS256")
+    environ = {"PATH_INFO": "/user/projects/1/events", "QUERY_STRING": "last_event_id=3&jwt=" + token}
+    picked[user_id] = [router.pick_node(environ, b""), shard_map.node_for_user(user_id)]
+print(json.dumps(picked))
+""", app=False, SHARD_MAP=shard_map)
+    assert all(node == owner for node, owner in result.values())
+    assert {owner for _, owner in result.values()} == {"a", "b"}
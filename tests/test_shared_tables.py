@@ -0,0 +1,59 @@
+from services.shared_tables import Segment, segment_name, write_segment
+
+
+def test_segment_round_trip(tmp_path):
+    path = str(tmp_path / "tasks.csv.seg")
+    rows = [
+        {"task_id": "7", "title": "sete", "description": 'com "aspas"\ne quebra'},
+        {"task_id": "2", "title": "dois", "description": ""},
+        {"task_id": "5", "title": "cinco", "description": None},
+    ]
+    write_segment(path, ["task_id", "title", "description"], rows, "task_id", 100, 1, 0)
+
+    segment = Segment(path)
+    assert segment.count == 3 and segment.max_id == 7
+    assert segment.rows() == rows
+    # ids fora de ordem: a busca usa a permutação ordenada
+    assert segment.find("7")["description"] == 'com "aspas"\ne quebra'
+    assert segment.find(2)["title"] == "dois"
+    assert segment.find("3") is None
+    assert segment.find("abc") is None
+
+
+def test_segment_name():
+    assert segment_name("shards/project-1/tasks.csv") == "shards__project-1__tasks.csv.seg"
+
+
+def test_api_in_shared_mode(seed_db, isolated):
+    code = """
+from services import csv_service
+auth = login("usuario@gmail.com")
+url = "/user/projects/1/lists/1/tasks/"
+created = [client.post(url, headers=auth, json={"title": f"Nova {i}"}).json["data"]["task_id"] for i in range(5)]
+client.put(url + created[0], headers=auth, json={"title": "Alterada"})
+client.delete(url + created[1], headers=auth)
+tasks = client.get(url, headers=auth).json["data"]["tasks"]
+print(json.dumps({
+    "titles": {t["task_id"]: t["title"] for t in tasks},
+    "one": client.get(url + created[2], headers=auth).json["data"]["task"]["title"],
+    "created": created,
+    "stats": csv_service.shared_tables_stats(),
+    "segments": sorted(os.listdir(csv_service.SHARED_TABLES_PATH)),
+}))
+"""
+    result = isolated(code, DB_PATH=seed_db, CSV_READ_MODE="shared", SHARED_OVERLAY_MAX_ROWS=2)
+    created = result["created"]
+    assert result["titles"][created[0]] == "Alterada"
+    assert created[1] not in result["titles"]
+    assert [result["titles"][task_id] for task_id in created[2:]] == ["Nova 2", "Nova 3", "Nova 4"]
+    assert result["one"] == "Nova 2"
+    assert result["stats"]["enabled"] and result["stats"]["segment_rows"] > 0
+    assert "tasks.csv.seg" in result["segments"]
+
+    # outro processo usa os segmentos já publicados e vê as mesmas linhas
+    again = isolated("""
+auth = login("usuario@gmail.com", register=False)
+tasks = client.get("/user/projects/1/lists/1/tasks/", headers=auth).json["data"]["tasks"]
+print(json.dumps({t["task_id"]: t["title"] for t in tasks}))
+""", DB_PATH=seed_db, CSV_READ_MODE="shared")
+    assert again == result["titles"]
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from services import csv_service
+
+
+def _run_concurrently(count, target):
+    results = [None] * count
+    errors = []
+
+    def call(index):
+        try:
+            results[index] = target()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def _wait_for_waiters(key, count):
+    while csv_service._flights[key]["waiters"] < count:
+        time.sleep(0.001)
+
+
+def test_identical_calls_share_one_execution():
+    started = threading.Event()
+    release = threading.Event()
+    executions = []
+
+    def load():
+        executions.append(1)
+        started.set()
+        release.wait(5)
+        return [{"id": "1"}]
+
+    leader, leader_result, _ = _run_concurrently(1, lambda: csv_service._single_flight(("teste", "a"), load))
+    assert started.wait(5)
+    followers, results, errors = _run_concurrently(5, lambda: csv_service._single_flight(("teste", "a"), load))
+    _wait_for_waiters(("teste", "a"), 5)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert not errors
+    assert len(executions) == 1
+    assert results == [[{"id": "1"}]] * 5
+    # cada chamador recebe a sua cópia
+    assert len({id(rows[0]) for rows in results + leader_result}) == 6
+
+
+def test_errors_reach_every_waiter():
+    started = threading.Event()
+    release = threading.Event()
+
+    def load():
+        started.set()
+        release.wait(5)
+        raise ValueError("falhou")
+
+    leader, _, leader_errors = _run_concurrently(1, lambda: csv_service._single_flight(("teste", "b"), load))
+    assert started.wait(5)
+    followers, _, errors = _run_concurrently(3, lambda: csv_service._single_flight(("teste", "b"), load))
+    _wait_for_waiters(("teste", "b"), 3)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert len(leader_errors + errors) == 4
+    with pytest.raises(ValueError):
+        csv_service._single_flight(("teste", "b"), load)
+
+
+def test_reads_after_a_write_are_not_coalesced(client, auth, board):
+    before = csv_service.find_tasks_by_list_id(board["list_id"])
+    client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Nova"})
+    after = csv_service.find_tasks_by_list_id(board["list_id"])
+    assert len(after) == len(before) + 1
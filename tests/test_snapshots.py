@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+import pytest
+
+from services import csv_service
+
+
+@pytest.fixture
+def tasks_table(monkeypatch, board):
+    # tabela pequena o bastante para os testes, mas acima do mínimo do snapshot
+    monkeypatch.setattr(csv_service, "SNAPSHOT_MIN_ROWS", 1)
+    # cada teste começa como a primeira carga do processo
+    monkeypatch.setattr(csv_service, "_snapshot_loaded", set())
+    monkeypatch.setattr(csv_service, "_snapshot_timers", {})
+    arq = csv_service.TASKS
+    snapshot = csv_service._snapshot_path(arq)
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    yield arq
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+
+
+def _load(arq):
+    return csv_service._load_table_data(arq, csv_service._file_key(arq))
+
+
+def _parse_forbidden(monkeypatch):
+    def parse(arq):
+        raise AssertionError("o CSV não deveria ser lido")
+    monkeypatch.setattr(csv_service, "_parse_csv_file", parse)
+
+
+def test_second_load_comes_from_the_snapshot(tasks_table, monkeypatch):
+    table = _load(tasks_table)
+    assert os.path.exists(csv_service._snapshot_path(tasks_table))
+
+    _parse_forbidden(monkeypatch)
+    again = _load(tasks_table)
+    assert again["rows"] == table["rows"]
+    assert again["by_id"] == table["by_id"]
+    assert again["max_id"] == table["max_id"]
+
+
+def test_stale_snapshot_is_ignored(tasks_table, client, auth, board):
+    _load(tasks_table)
+    client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Depois do snapshot"})
+
+    titles = [row["title"] for row in _load(tasks_table)["rows"]]
+    assert "Depois do snapshot" in titles
+
+
+def test_writes_refresh_the_snapshot_in_the_background(tasks_table, monkeypatch, client, auth, board):
+    monkeypatch.setattr(csv_service, "SNAPSHOT_INTERVAL_SECONDS", 0.05)
+    _load(tasks_table)
+    saved = []
+    save = csv_service._save_snapshot
+    monkeypatch.setattr(csv_service, "_save_snapshot", lambda *args: saved.append(threading.current_thread()) or save(*args))
+
+    # a recarga depois da escrita não grava o snapshot na requisição...
+    client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Escrita"})
+    _load(tasks_table)
+    assert threading.current_thread() not in saved
+
+    # ...um timer relê o CSV e grava um snapshot atual
+    deadline = time.monotonic() + 5
+    while not saved and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert saved
+    _parse_forbidden(monkeypatch)
+    assert "Escrita" in [row["title"] for row in _load(tasks_table)["rows"]]
+
+
+def test_corrupted_snapshot_falls_back_to_the_csv(tasks_table, monkeypatch):
+    table = _load(tasks_table)
+    snapshot = csv_service._snapshot_path(tasks_table)
+    with open(snapshot, "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        last = file.read(1)
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last[0] ^ 0xFF]))
+
+    parsed = []
+    parse = csv_service._parse_csv_file
+    monkeypatch.setattr(csv_service, "_parse_csv_file", lambda arq: parsed.append(arq) or parse(arq))
+    assert _load(tasks_table)["rows"] == table["rows"]
+    assert parsed == [tasks_table]
+
+
+def test_concurrent_snapshot_writers(tasks_table):
+    table = _load(tasks_table)
+    stat = os.stat(tasks_table)
+    errors = []
+
+    def save():
+        try:
+            for _ in range(20):
+                csv_service._save_snapshot(tasks_table, table, stat)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert csv_service._load_snapshot(tasks_table, csv_service._file_key(tasks_table), os.stat(tasks_table))["rows"] == table["rows"]
+    folder = os.path.dirname(tasks_table)
+    assert [name for name in os.listdir(folder) if name.endswith(".tmp")] == []
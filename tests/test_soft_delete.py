@@ -0,0 +1,64 @@
+import pytest
+
+from services import csv_service
+from services.purger import purger_status
+
+
+@pytest.fixture
+def soft_delete(monkeypatch):
+    monkeypatch.setattr(csv_service, "SOFT_DELETE", True)
+    # só as lápides deste teste são apagadas pelo purge
+    while csv_service.purge_deleted():
+        pass
+
+
+def _task_ids():
+    return {task["task_id"] for task in csv_service.read_csv(csv_service.TASKS, fresh=True)}
+
+
+def test_deleted_project_is_hidden_then_purged(client, auth, board, soft_delete):
+    project_url = f"/user/projects/{board['project_id']}"
+    assert client.delete(project_url, headers=auth).status_code == 200
+
+    # escondido na hora, mas as linhas continuam no arquivo até o purge
+    assert client.get(project_url, headers=auth).status_code == 404
+    assert client.get(f"{board['tasks_url']}/{board['task_id']}", headers=auth).status_code == 404
+    assert csv_service.find_task_by_id(board["task_id"]) is None
+    assert board["task_id"] in _task_ids()
+    assert csv_service.pending_purges() == 1
+
+    assert csv_service.purge_deleted() == 1
+    assert csv_service.pending_purges() == 0
+    assert board["task_id"] not in _task_ids()
+    assert board["list_id"] not in {lista["list_id"] for lista in csv_service.read_csv(csv_service.LISTS, fresh=True)}
+    assert client.get(project_url, headers=auth).status_code == 404
+
+
+def test_deleted_task_hides_its_comments(client, auth, board, soft_delete):
+    task_url = f"{board['tasks_url']}/{board['task_id']}"
+    comment = client.post(f"{task_url}/comments/", headers=auth, json={"content": "oi"}).json["data"]
+    assert client.delete(task_url, headers=auth).status_code == 200
+
+    assert csv_service.find_comment_by_id(comment["comment_id"]) is None
+    assert csv_service.find_task_by_id(board["task_id"]) is None
+
+    csv_service.purge_deleted()
+    comment_ids = {row["comment_id"] for row in csv_service.read_csv(csv_service.COMMENTS, fresh=True)}
+    assert comment["comment_id"] not in comment_ids
+    assert board["task_id"] not in _task_ids()
+
+
+def test_delete_inside_transaction_is_physical(client, auth, board, soft_delete):
+    response = client.post("/batch/", headers=auth, json={"atomic": True, "requests": [
+        {"method": "DELETE", "path": f"{board['tasks_url']}/{board['task_id']}"},
+    ]})
+    assert response.status_code == 200
+    assert csv_service.pending_purges() == 0
+    assert board["task_id"] not in _task_ids()
+
+
+def test_purger_status_counts_pending_tombstones(client, auth, board, soft_delete):
+    client.delete(f"{board['tasks_url']}/{board['task_id']}", headers=auth)
+    assert purger_status()["pending"] == 1
+    csv_service.purge_deleted()
+    assert purger_status()["pending"] == 0
@@ -0,0 +1,86 @@
+import pytest
+
+from services import csv_service
+from services.generations import generations
+
+
+def _user_tasks(client, auth, **params):
+    response = client.get("/user/tasks", headers=auth, query_string=params)
+    assert response.status_code == 200
+    return response.json["data"]
+
+
+def test_lists_tasks_from_every_project(client, auth, make_board):
+    first = make_board("Primeiro")
+    second = make_board("Segundo")
+
+    data = _user_tasks(client, auth)
+    assert [(t["task_id"], t["project_title"], t["list_name"]) for t in data["tasks"]] == [
+        (first["task_id"], "Primeiro", "A Fazer"),
+        (second["task_id"], "Segundo", "A Fazer"),
+    ]
+    assert data["pagination"]["total"] == 2
+
+
+def test_only_the_users_own_tasks(client, auth, board, new_user):
+    assert _user_tasks(client, new_user())["tasks"] == []
+    assert [t["task_id"] for t in _user_tasks(client, auth)["tasks"]] == [board["task_id"]]
+
+
+def test_index_follows_writes(client, auth, board):
+    created = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Segunda"}).json["data"]
+    client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": "Task", "completed": True})
+
+    assert [t["task_id"] for t in _user_tasks(client, auth, completed="false")["tasks"]] == [created["task_id"]]
+    assert [t["task_id"] for t in _user_tasks(client, auth, completed="true")["tasks"]] == [board["task_id"]]
+
+    client.delete(f"{board['tasks_url']}/{created['task_id']}", headers=auth)
+    assert [t["task_id"] for t in _user_tasks(client, auth)["tasks"]] == [board["task_id"]]
+
+
+def test_pagination_and_order(client, auth, board):
+    for title in ("b", "c", "d"):
+        client.post(f"{board['tasks_url']}/", headers=auth, json={"title": title})
+
+    page = _user_tasks(client, auth, page=2, per_page=3, order="desc")
+    assert [t["title"] for t in page["tasks"]] == ["Task"]
+    assert page["pagination"] == {"page": 2, "per_page": 3, "total": 4, "pages": 2}
+
+    assert client.get("/user/tasks", headers=auth, query_string={"page": 0}).status_code == 400
+    assert client.get("/user/tasks", headers=auth, query_string={"completed": "talvez"}).status_code == 400
+
+
+@pytest.mark.skipif(not generations.shared, reason="sem contadores compartilhados, qualquer escrita invalida todos")
+def test_writes_of_other_users_keep_the_entry(client, auth, board, new_user):
+    user_id = client.get("/user", headers=auth).json["data"]["user_id"]
+    entry = csv_service.get_user_tasks(user_id)
+
+    # a escrita no quadro de outro usuário não invalida as tasks deste
+    other = new_user()
+    project_id = client.post("/user/projects/", headers=other, json={"project_title": "Outro"}).json["data"]["project_id"]
+    client.post(f"/user/projects/{project_id}/lists/", headers=other, json={"list_name": "L"})
+    assert csv_service.get_user_tasks(user_id) is entry
+
+    client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": "Minha"})
+    assert csv_service.get_user_tasks(user_id) is not entry
+    assert [t["title"] for t in _user_tasks(client, auth)["tasks"]] == ["Minha"]
+
+
+def test_entry_follows_writes_of_other_workers(client, isolated):
+    user_id, tasks_url = isolated("""
+auth = login("tarefas-worker@example.com")
+project_id = client.post("/user/projects/", headers=auth, json={"project_title": "P"}).json["data"]["project_id"]
+list_id = client.post(f"/user/projects/{project_id}/lists/", headers=auth, json={"list_name": "L"}).json["data"]["list_id"]
+tasks_url = f"/user/projects/{project_id}/lists/{list_id}/tasks/"
+client.post(tasks_url, headers=auth, json={"title": "Primeira"})
+print(json.dumps([client.get("/user", headers=auth).json["data"]["user_id"], tasks_url]))
+""")
+    assert [t["title"] for t in csv_service.find_tasks_by_user_id(user_id)] == ["Primeira"]
+
+    # a task criada por outro worker aparece aqui (contadores compartilhados)
+    isolated(f"""
+auth = login("tarefas-worker@example.com", register=False)
+client.post({tasks_url!r}, headers=auth, json={{"title": "Segunda"}})
+print(json.dumps(None))
+""")
+    assert [t["title"] for t in csv_service.find_tasks_by_user_id(user_id)] == ["Primeira", "Segunda"]
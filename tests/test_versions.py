@@ -0,0 +1,119 @@
+import threading
+
+from services import csv_service
+
+
+def test_seed_tables_are_migrated_at_startup():
+    # os CSVs de exemplo não têm a coluna: a aplicação a acrescenta ao subir
+    for arq in (csv_service.USERS, csv_service.PROJECTS, csv_service.LISTS, csv_service.TASKS, csv_service.COMMENTS):
+        assert csv_service._csv_header(arq)[-1] == csv_service.VERSION_FIELD
+    assert all(row["version"] for row in csv_service.read_csv(csv_service.TASKS, fresh=True))
+
+
+def test_if_match_with_the_row_version(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+
+    response = client.put(url, headers={**auth, "If-Match": '"1"'}, json={"title": "Primeira"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"2"'
+
+    # quem ainda tem a versão 1 não sobrescreve a alteração
+    response = client.put(url, headers={**auth, "If-Match": '"1"'}, json={"title": "Atrasada"})
+    assert response.status_code == 412
+    assert response.json["version"] == 2
+
+    # ETags fracas nunca conferem; "*" não confere nada
+    response = client.put(url, headers={**auth, "If-Match": 'W/"2"'}, json={"title": "Fraca"})
+    assert response.status_code == 412
+    response = client.put(url, headers={**auth, "If-Match": "*"}, json={"title": "Qualquer"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"3"'
+
+    task = client.get(url, headers=auth).json["data"]["task"]
+    assert (task["title"], task["version"]) == ("Qualquer", "3")
+
+
+def test_stale_item_rejects_the_whole_batch(client, auth, board):
+    other = client.post(f"{board['tasks_url']}/", headers=auth, json={"title": "Outra", "description": ""}).json["data"]
+    client.put(f"{board['tasks_url']}/{board['task_id']}", headers=auth, json={"title": "Mudou"})
+
+    url = f"/user/projects/{board['project_id']}/tasks"
+    response = client.patch(url, headers=auth, json={"tasks": [
+        {"task_id": other["task_id"], "title": "Lote", "version": "1"},
+        {"task_id": board["task_id"], "title": "Lote", "version": "1"},
+    ]})
+    assert response.status_code == 412
+    assert response.json["task_id"] == board["task_id"]
+    assert csv_service.find_task_by_id(other["task_id"])["title"] == "Outra"
+
+
+def test_concurrent_writers_with_the_same_version(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    statuses = []
+    start = threading.Barrier(10)
+
+    def write(index):
+        start.wait()
+        response = client.put(url, headers={**auth, "If-Match": '"1"'}, json={"title": f"Escritor {index}"})
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200] + [412] * 9
+    assert csv_service.find_task_by_id(board["task_id"])["version"] == "2"
+
+
+def test_if_match_with_the_etag_of_the_get(client, auth, board):
+    url = f"{board['tasks_url']}/{board['task_id']}"
+    etag = client.get(url, headers=auth).headers["ETag"]
+    assert etag.startswith('"1.')
+
+    response = client.put(url, headers={**auth, "If-Match": etag}, json={"title": "Com a ETag do GET"})
+    assert response.status_code == 200
+
+    # a ETag do GET ficou velha para os dois cabeçalhos
+    assert client.get(url, headers={**auth, "If-None-Match": etag}).status_code == 200
+    response = client.put(url, headers={**auth, "If-Match": etag}, json={"title": "Atrasada"})
+    assert response.status_code == 412
+
+    user = client.get("/user", headers=auth)
+    assert user.headers["ETag"] == '"1"'
+
+
+def test_concurrent_updates_and_deletes(client, auth, board):
+    # deletes releem e reescrevem a tabela sob a mesma trava das alterações:
+    # nenhuma alteração se perde e nenhuma task apagada volta
+    tasks = [client.post(f"{board['tasks_url']}/", headers=auth, json={"title": f"Task {i}", "description": ""}).json["data"]
+             for i in range(12)]
+    kept, removed = tasks[::2], tasks[1::2]
+    for task in tasks:
+        url = f"{board['tasks_url']}/{task['task_id']}/comments/"
+        client.post(url, headers=auth, json={"content": "Comentário"})
+    start = threading.Barrier(len(tasks))
+
+    def update(task):
+        start.wait()
+        for round in range(5):
+            client.put(f"{board['tasks_url']}/{task['task_id']}", headers=auth, json={"title": f"Editada {round}"})
+
+    def delete(task):
+        start.wait()
+        client.delete(f"{board['tasks_url']}/{task['task_id']}", headers=auth)
+
+    threads = [threading.Thread(target=update, args=(task,)) for task in kept]
+    threads += [threading.Thread(target=delete, args=(task,)) for task in removed]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rows = {t["task_id"]: t for t in csv_service.read_csv(csv_service.TASKS, fresh=True)}
+    assert all(rows[task["task_id"]]["title"] == "Editada 4" for task in kept)
+    assert not any(task["task_id"] in rows for task in removed)
+    comments = {c["task_id"] for c in csv_service.read_csv(csv_service.COMMENTS, fresh=True)}
+    assert not any(task["task_id"] in comments for task in removed)
+    assert all(task["task_id"] in comments for task in kept)
@@ -0,0 +1,47 @@
+from services import warmup
+
+
+def test_ready_after_warmup(client):
+    warmup.run_warmup()
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    status = response.json
+    assert status["ready"] is True and status["running"] is False
+    assert status["steps_done"] == status["steps_total"]
+    assert status["rows"] > 0
+
+
+def test_not_ready_while_warming_up(client, monkeypatch):
+    monkeypatch.setitem(warmup._state, "ready", False)
+    monkeypatch.setitem(warmup._state, "running", True)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json["running"] is True
+
+
+def test_failed_warmup_is_reported(client, monkeypatch):
+    def broken(arq):
+        raise OSError("disco indisponível")
+
+    monkeypatch.setattr(warmup, "warm_table", broken)
+    warmup.run_warmup()
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json["error"] == "disco indisponível"
+
+    monkeypatch.undo()
+    warmup.run_warmup()
+    assert client.get("/ready").status_code == 200
+
+
+def test_ready_without_warmup_on_start(isolated):
+    # com WARMUP_ON_START=False (o padrão dos testes) nada é pré-carregado
+    # e o worker nasce pronto
+    result = isolated("""
+response = client.get("/ready")
+print(json.dumps([response.status_code, response.json["enabled"]]))
+""")
+    assert result == [200, False]
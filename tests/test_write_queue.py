@@ -0,0 +1,105 @@
+import csv
+import os
+import threading
+
+import pytest
+
+from services.write_queue import WriteQueue
+
+FIELDNAMES = ["id", "value"]
+
+
+def _rows(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        return list(csv.DictReader(file))
+
+
+def _concurrently(count, target):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_appends_are_grouped(tmp_path):
+    path = str(tmp_path / "dados.csv")
+    queue = WriteQueue(True, "batch", window_ms=20, max_batch=500)
+
+    _concurrently(20, lambda index: queue.write("append", path, FIELDNAMES, [{"id": index, "value": "x"}]))
+
+    assert sorted(int(row["id"]) for row in _rows(path)) == list(range(20))
+    stats = queue.stats()
+    assert stats["writes"] == 20
+    assert stats["batches"] < 20
+    # um fsync por arquivo a cada lote
+    assert stats["fsyncs"] == stats["batches"]
+
+
+def test_overwrite_keeps_the_order_of_the_batch(tmp_path):
+    path = str(tmp_path / "dados.csv")
+    queue = WriteQueue(True, "none", window_ms=20, max_batch=500)
+
+    first = queue.submit("append", path, FIELDNAMES, [{"id": 1, "value": "a"}])
+    second = queue.submit("overwrite", path, FIELDNAMES, [{"id": 2, "value": "b"}])
+    third = queue.submit("append", path, FIELDNAMES, [{"id": 3, "value": "c"}])
+    for entry in (first, second, third):
+        queue.wait(entry)
+
+    assert [row["id"] for row in _rows(path)] == ["2", "3"]
+    assert queue.stats()["fsyncs"] == 0
+
+
+def test_write_durability_syncs_every_write(tmp_path):
+    path = str(tmp_path / "dados.csv")
+    queue = WriteQueue(True, "write", window_ms=0, max_batch=500)
+    for index in range(3):
+        queue.write("append", path, FIELDNAMES, [{"id": index, "value": "x"}])
+    assert queue.stats()["fsyncs"] == 3
+
+
+def test_errors_reach_the_writer(tmp_path):
+    queue = WriteQueue(True, "none", window_ms=0, max_batch=500)
+    with pytest.raises(OSError):
+        queue.write("append", str(tmp_path / "nao-existe" / "dados.csv"), FIELDNAMES, [{"id": 1}])
+
+    path = str(tmp_path / "dados.csv")
+    queue.write("append", path, FIELDNAMES, [{"id": 1, "value": "x"}])
+    assert len(_rows(path)) == 1
+
+
+def test_disabled_queue_writes_directly(tmp_path):
+    path = str(tmp_path / "dados.csv")
+    queue = WriteQueue(False, "none", window_ms=20, max_batch=500)
+    queue.write("append", path, FIELDNAMES, [{"id": 1, "value": "x"}])
+    assert len(_rows(path)) == 1
+    assert queue.thread is None
+
+
+def test_invalid_durability():
+    with pytest.raises(ValueError):
+        WriteQueue(True, "sempre", window_ms=0, max_batch=500)
+
+
+def test_concurrent_api_writes_all_land(app, auth, board):
+    def create(index):
+        response = app.test_client().post(f"{board['tasks_url']}/", headers=auth, json={"title": f"t{index}"})
+        assert response.status_code == 201
+
+    _concurrently(20, create)
+
+    tasks = app.test_client().get(f"{board['tasks_url']}/", headers=auth).json["data"]["tasks"]
+    assert sorted(task["title"] for task in tasks if task["title"] != "Task") == sorted(f"t{index}" for index in range(20))
+
+
+def test_failed_overwrite_keeps_the_table(tmp_path):
+    path = str(tmp_path / "dados.csv")
+    queue = WriteQueue(True, "batch", window_ms=0, max_batch=500)
+    queue.write("overwrite", path, FIELDNAMES, [{"id": 1, "value": "a"}])
+
+    # a linha com um campo desconhecido faz o DictWriter falhar no meio
+    with pytest.raises(ValueError):
+        queue.write("overwrite", path, FIELDNAMES, [{"id": 2, "value": "b"}, {"id": 3, "outro": "c"}])
+
+    assert _rows(path) == [{"id": "1", "value": "a"}]
+    assert sorted(os.listdir(tmp_path)) == ["dados.csv"]